@@ -5,352 +5,247 @@
 # TODO(ICU-20301): Remove this.
 from __future__ import print_function
 
-import argparse
+import contextlib
 import glob as pyglob
+import hashlib
 import io as pyio
-import json
+import multiprocessing
 import os
 import sys
 
 from . import *
-from .comment_stripper import CommentStripper
-from .request_types import CopyRequest
-from .renderers import makefile, common_exec
+from .renderers import ExecConfig, makefile, common_exec, graph, ninja
 from . import filtration, utils
+from .explain import explain_filters, write_explanation
+from .flags import flag_parser
+from .planning import IO, generate_requests, get_config_args, load_buildrules
+from .planning import read_pickle, write_pickle
+from .trace import Tracer
 
-flag_parser = argparse.ArgumentParser(
-    description = """Generates rules for building ICU binary data files from text
-and other input files in source control.
 
-Use the --mode option to declare how to execute those rules, either exporting
-the rules to a Makefile or spawning child processes to run them immediately:
-
-  --mode=gnumake prints a Makefile to standard out.
-  --mode=unix-exec spawns child processes in a Unix-like environment.
-  --mode=windows-exec spawns child processes in a Windows-like environment.
-
-Tips for --mode=unix-exec
-=========================
-
-Create two empty directories for out_dir and tmp_dir. They will get filled
-with a lot of intermediate files.
-
-Set LD_LIBRARY_PATH to include the lib directory. e.g., from icu4c/source:
-
-  $ LD_LIBRARY_PATH=lib PYTHONPATH=python python3 -m icutools.databuilder ...
-
-Once icutools.databuilder finishes, you have compiled the data, but you have
-not packaged it into a .dat or .so file. This is done by the separate pkgdata
-tool in bin. Read the docs of pkgdata:
-
-  $ LD_LIBRARY_PATH=lib ./bin/pkgdata --help
-
-Example command line to call pkgdata:
-
-  $ LD_LIBRARY_PATH=lib ./bin/pkgdata -m common -p icudt63l -c \\
-      -O data/icupkg.inc -s $OUTDIR -d $TMPDIR $TMPDIR/icudata.lst
-
-where $OUTDIR and $TMPDIR are your out and tmp directories, respectively.
-The above command will create icudt63l.dat in the tmpdir.
-
-Command-Line Arguments
-======================
-""",
-    formatter_class = argparse.RawDescriptionHelpFormatter
-)
-
-arg_group_required = flag_parser.add_argument_group("required arguments")
-arg_group_required.add_argument(
-    "--mode",
-    help = "What to do with the generated rules.",
-    choices = ["gnumake", "unix-exec", "windows-exec", "bazel-exec"],
-    required = True
-)
-
-flag_parser.add_argument(
-    "--src_dir",
-    help = "Path to data source folder (icu4c/source/data).",
-    default = "."
-)
-flag_parser.add_argument(
-    "--filter_file",
-    metavar = "PATH",
-    help = "Path to an ICU data filter JSON file.",
-    default = None
-)
-flag_parser.add_argument(
-    "--include_uni_core_data",
-    help = "Include the full Unicode core data in the dat file.",
-    default = False,
-    action = "store_true"
-)
-flag_parser.add_argument(
-    "--seqmode",
-    help = "Whether to optimize rules to be run sequentially (fewer threads) or in parallel (many threads). Defaults to 'sequential', which is better for unix-exec and windows-exec modes. 'parallel' is often better for massively parallel build systems.",
-    choices = ["sequential", "parallel"],
-    default = "sequential"
-)
-flag_parser.add_argument(
-    "--verbose",
-    help = "Print more verbose output (default false).",
-    default = False,
-    action = "store_true"
-)
-
-arg_group_exec = flag_parser.add_argument_group("arguments for unix-exec and windows-exec modes")
-arg_group_exec.add_argument(
-    "--out_dir",
-    help = "Path to where to save output data files.",
-    default = "icudata"
-)
-arg_group_exec.add_argument(
-    "--tmp_dir",
-    help = "Path to where to save temporary files.",
-    default = "icutmp"
-)
-arg_group_exec.add_argument(
-    "--tool_dir",
-    help = "Path to where to find binary tools (genrb, etc).",
-    default = "../bin"
-)
-arg_group_exec.add_argument(
-    "--tool_cfg",
-    help = "The build configuration of the tools. Used in 'windows-exec' mode only.",
-    default = "x86/Debug"
-)
-
-
-class Config(object):
-
-    def __init__(self, args):
-        # Process arguments
-        self.max_parallel = (args.seqmode == "parallel")
-
-        # Boolean: Whether to include core Unicode data files in the .dat file
-        self.include_uni_core_data = args.include_uni_core_data
-
-        # Default fields before processing filter file
-        self.filters_json_data = {}
-        self.filter_dir = "ERROR_NO_FILTER_FILE"
-
-        # Process filter file
-        if args.filter_file:
-            try:
-                with open(args.filter_file, "r") as f:
-                    print("Note: Applying filters from %s." % args.filter_file, file=sys.stderr)
-                    self._parse_filter_file(f)
-            except IOError:
-                print("Error: Could not read filter file %s." % args.filter_file, file=sys.stderr)
-                exit(1)
-            self.filter_dir = os.path.abspath(os.path.dirname(args.filter_file))
-
-        # Either "unihan" or "implicithan"
-        self.coll_han_type = "unihan"
-        if "collationUCAData" in self.filters_json_data:
-            self.coll_han_type = self.filters_json_data["collationUCAData"]
-
-        # Either "additive" or "subtractive"
-        self.strategy = "subtractive"
-        if "strategy" in self.filters_json_data:
-            self.strategy = self.filters_json_data["strategy"]
-
-        # True or False (could be extended later to support enum/list)
-        self.use_pool_bundle = True
-        if "usePoolBundle" in self.filters_json_data:
-            self.use_pool_bundle = self.filters_json_data["usePoolBundle"]
-
-    def _parse_filter_file(self, f):
-        # Use the Hjson parser if it is available; otherwise, use vanilla JSON.
+def main(argv):
+    args = flag_parser.parse_args(argv)
+    try:
+        all_config_args = get_config_args(args)
+    except ValueError as e:
+        print("Error: %s" % e, file=sys.stderr)
+        return 1
+    tracer = Tracer(enabled = bool(args.trace_file))
+    if args.mode == "explain":
+        if args.from_graph:
+            print("Error: --from_graph cannot be used in explain mode", file=sys.stderr)
+            return 1
+        return explain(all_config_args[0], tracer)
+    if args.from_graph:
         try:
-            import hjson
-            self.filters_json_data = hjson.load(f)
-        except ImportError:
-            self.filters_json_data = json.load(CommentStripper(f))
-
-        # Optionally pre-validate the JSON schema before further processing.
-        # Some schema errors will be caught later, but this step ensures
-        # maximal validity.
+            plans = [plan_from_graph(args)]
+        except (IOError, OSError, ValueError) as e:
+            print("Error: Could not read graph %s: %s" % (args.from_graph, e), file=sys.stderr)
+            return 1
+        return render_traced(args, plans, tracer)
+
+    plans = [
+        plan_cached(config_args, tracer)
+        for config_args in all_config_args
+    ]
+    return render_traced(args, plans, tracer)
+
+
+# Increase this when the cached plans become incompatible.
+PLAN_CACHE_VERSION = 1
+
+# The arguments that plan() depends on
+PLANNING_ARGS = ["mode", "src_dir", "filter_file", "out_dir", "tmp_dir", "seqmode",
+    "include_uni_core_data"]
+
+def get_plan_key(args):
+    """
+    Returns a hash of everything that plan() depends on, except for the
+    files that BUILDRULES.py and the filters look at through IO.
+    """
+    hasher = hashlib.sha1()
+    def add(value):
+        hasher.update(repr(value).encode("utf-8"))
+        hasher.update(b"\0")
+    def add_file(path):
+        add(path)
         try:
-            import jsonschema
-            schema_path = os.path.join(os.path.dirname(__file__), "filtration_schema.json")
-            with open(schema_path) as schema_f:
-                schema = json.load(CommentStripper(schema_f))
-            validator = jsonschema.Draft4Validator(schema)
-            for error in validator.iter_errors(self.filters_json_data, schema):
-                print("WARNING: ICU data filter JSON file:", error.message,
-                    "at", "".join(
-                        "[%d]" % part if isinstance(part, int) else ".%s" % part
-                        for part in error.absolute_path
-                    ),
-                    file=sys.stderr)
-        except ImportError:
-            print("Tip: to validate your filter file, install the Pip package 'jsonschema'", file=sys.stderr)
-            pass
-
-
-def add_copy_input_requests(requests, config, common_vars):
-    files_to_copy = set()
-    for request in requests:
-        request_files = request.all_input_files()
-        # Also add known dependency txt files as possible inputs.
-        # This is required for translit rule files.
-        if hasattr(request, "dep_targets"):
-            request_files += [
-                f for f in request.dep_targets if isinstance(f, InFile)
-            ]
-        for f in request_files:
-            if isinstance(f, InFile):
-                files_to_copy.add(f)
-
-    result = []
-    id = 0
-
-    json_data = config.filters_json_data["fileReplacements"]
-    dirname = json_data["directory"]
-    for directive in json_data["replacements"]:
-        if type(directive) == str:
-            input_file = LocalFile(dirname, directive)
-            output_file = InFile(directive)
-        else:
-            input_file = LocalFile(dirname, directive["src"])
-            output_file = InFile(directive["dest"])
-        result += [
-            CopyRequest(
-                name = "input_copy_%d" % id,
-                input_file = input_file,
-                output_file = output_file
-            )
-        ]
-        files_to_copy.remove(output_file)
-        id += 1
-
-    for f in files_to_copy:
-        result += [
-            CopyRequest(
-                name = "input_copy_%d" % id,
-                input_file = SrcFile(f.filename),
-                output_file = f
-            )
-        ]
-        id += 1
-
-    result += requests
+            with open(path, "rb") as f:
+                hasher.update(f.read())
+        except (IOError, OSError):
+            add(None)
+    add(PLAN_CACHE_VERSION)
+    add(tuple(sys.version_info[:2]))
+    add(os.getcwd())
+    for attr in PLANNING_ARGS:
+        add(getattr(args, attr))
+    if args.seqmode == "sharded":
+        add(multiprocessing.cpu_count())
+    add_file(os.path.join(args.src_dir, "BUILDRULES.py"))
+    if args.filter_file:
+        add_file(args.filter_file)
+    # The code that generates the requests
+    package_dir = os.path.dirname(os.path.abspath(__file__))
+    for path in sorted(pyglob.glob(os.path.join(package_dir, "*.py"))):
+        add_file(path)
+    return hasher.hexdigest()
+
+
+def plan_cached(args, tracer):
+    """
+    Returns the result of plan() for one filter file, from the planning
+    cache if possible.
+    """
+    io = IO(args.src_dir, args.planning_cache_dir)
+    if not args.planning_cache_dir:
+        return plan(args, io, load_buildrules(args.src_dir), tracer)
+    cache_path = os.path.join(args.planning_cache_dir, "plans", "%s.pickle" % get_plan_key(args))
+    with tracer.span("load_cached_plan", "planning"):
+        cached = read_pickle(cache_path)
+        if cached is not None and io.dependencies_unchanged(cached["dependencies"]):
+            if args.verbose:
+                print("Note: Using the cached plan %s" % cache_path, file=sys.stderr)
+            return cached["plan"]
+    result = plan(args, io, load_buildrules(args.src_dir), tracer)
+    with tracer.span("write_cached_plan", "planning"):
+        write_pickle(cache_path, {
+            "dependencies": io.dependencies,
+            "plan": result,
+        })
     return result
 
 
-class IO(object):
-    """I/O operations required when computing the build actions"""
-
-    def __init__(self, src_dir):
-        self.src_dir = src_dir
+def render_traced(args, plans, tracer):
+    with tracer.span("rendering", "rendering", {"mode": args.mode}):
+        status = render(args, plans, tracer)
+    tracer.write(args.trace_file)
+    return status
 
-    def glob(self, pattern):
-        absolute_paths = pyglob.glob(os.path.join(self.src_dir, pattern))
-        # Strip off the absolute path suffix so we are left with a relative path.
-        relative_paths = [v[len(self.src_dir)+1:] for v in sorted(absolute_paths)]
-        # For the purposes of icutools.databuilder, force Unix-style directory separators.
-        # Within the Python code, including BUILDRULES.py and user-provided config files,
-        # directory separators are normalized to '/', including on Windows platforms.
-        return [v.replace("\\", "/") for v in relative_paths]
 
-    def read_locale_deps(self, tree):
-        return self._read_json("%s/LOCALE_DEPS.json" % tree)
+def plan(args, io, BUILDRULES, tracer):
+    """Returns the build_dirs, requests, makefile_vars, and common_vars for one filter file."""
+    config, requests, makefile_vars, common = generate_requests(args, io, BUILDRULES, tracer)
 
-    def _read_json(self, filename):
-        with pyio.open(os.path.join(self.src_dir, filename), "r", encoding="utf-8-sig") as f:
-            return json.load(CommentStripper(f))
+    with tracer.span("apply_filters", "planning"):
+        requests = filtration.apply_filters(requests, config, io)
+    with tracer.span("flatten_requests", "planning"):
+        requests = utils.flatten_requests(requests, config, common)
 
+    build_dirs = utils.compute_directories(requests)
+    return build_dirs, requests, makefile_vars, common
 
-def main(argv):
-    args = flag_parser.parse_args(argv)
-    config = Config(args)
-
-    if args.mode == "gnumake":
-        makefile_vars = {
-            "SRC_DIR": "$(srcdir)",
-            "IN_DIR": "$(srcdir)",
-            "INDEX_NAME": "res_index"
-        }
-        makefile_env = ["ICUDATA_CHAR", "OUT_DIR", "TMP_DIR", "LIBRARY_DATA_DIR"]
-        common = {
-            key: "$(%s)" % key
-            for key in list(makefile_vars.keys()) + makefile_env
-        }
-        common["FILTERS_DIR"] = config.filter_dir
-        common["CWD_DIR"] = os.getcwd()
-    else:
-        makefile_vars = None
-        common = {
-            "SRC_DIR": args.src_dir,
-            "IN_DIR": args.src_dir,
-            "OUT_DIR": args.out_dir,
-            "TMP_DIR": args.tmp_dir,
-            "FILTERS_DIR": config.filter_dir,
-            "CWD_DIR": os.getcwd(),
-            "INDEX_NAME": "res_index",
-            # TODO: Pull this from configure script:
-            "ICUDATA_CHAR": "l",
-            "LIBRARY_DATA_DIR": os.path.join(args.out_dir, "build"),
-        }
-
-    # Automatically load BUILDRULES from the src_dir
-    sys.path.append(args.src_dir)
-    try:
-        import BUILDRULES
-    except ImportError:
-        print("Cannot find BUILDRULES! Did you set your --src_dir?", file=sys.stderr)
-        sys.exit(1)
 
-    io = IO(args.src_dir)
-    requests = BUILDRULES.generate(config, io, common)
 
-    if "fileReplacements" in config.filters_json_data:
-        tmp_in_dir = "{TMP_DIR}/in".format(**common)
-        if makefile_vars:
-            makefile_vars["IN_DIR"] = tmp_in_dir
-        else:
-            common["IN_DIR"] = tmp_in_dir
-        requests = add_copy_input_requests(requests, config, common)
+def explain(args, tracer):
+    """Writes what the filters keep and drop, instead of planning a build."""
+    io = IO(args.src_dir, args.planning_cache_dir)
+    config, requests, _, common = generate_requests(
+        args, io, load_buildrules(args.src_dir), tracer)
+    with tracer.span("explain_filters", "planning"):
+        explanation = explain_filters(requests, config, io, common, args.previous_out_dir)
+    with open_output(args.output) as out:
+        write_explanation(out, explanation, args.previous_out_dir)
+    tracer.write(args.trace_file)
+    return 0
 
-    requests = filtration.apply_filters(requests, config, io)
-    requests = utils.flatten_requests(requests, config, common)
 
+def plan_from_graph(args):
+    """Like plan(), but reads the requests from the --from_graph file."""
+    with pyio.open(args.from_graph, "r", encoding="utf-8") as f:
+        requests, common = graph.read_graph(f)
     build_dirs = utils.compute_directories(requests)
-
+    makefile_vars = {} if args.mode == "gnumake" else None
+    return build_dirs, requests, makefile_vars, common
+
+
+@contextlib.contextmanager
+def open_output(path):
+    """Opens path for writing, or yields standard out if path is None."""
+    if path is None:
+        yield sys.stdout
+        return
+    with pyio.open(path, "w", encoding="utf-8") as out:
+        yield out
+
+
+def render(args, plans, tracer):
+    build_dirs, requests, makefile_vars, common = plans[0]
+    exec_configs = [
+        ExecConfig(config_build_dirs, config_requests, config_common)
+        for config_build_dirs, config_requests, _, config_common in plans
+    ]
     if args.mode == "gnumake":
-        print(makefile.get_gnumake_rules(
-            build_dirs,
-            requests,
-            makefile_vars,
-            common_vars = common
-        ))
+        with open_output(args.output) as out:
+            makefile.write_gnumake_rules(
+                out,
+                build_dirs,
+                requests,
+                makefile_vars,
+                common_vars = common,
+                copy_strategy = args.copy_strategy,
+                string_vars = args.makefile_strings,
+                content_dir = args.makefile_content_dir
+            )
+            out.write("\n")
+    elif args.mode == "ninja":
+        with open_output(args.output) as out:
+            out.write(ninja.get_ninja_rules(
+                build_dirs,
+                requests,
+                common_vars = common,
+                tool_dir = args.tool_dir,
+                copy_strategy = args.copy_strategy
+            ))
+    elif args.mode == "graph":
+        with open_output(args.output) as out:
+            graph.write_graph(
+                out,
+                requests,
+                common_vars = common,
+                tool_dir = args.tool_dir,
+                graph_format = args.graph_format
+            )
     elif args.mode == "windows-exec":
-        return common_exec.run(
+        return common_exec.run_batch(
             platform = "windows",
-            build_dirs = build_dirs,
-            requests = requests,
-            common_vars = common,
+            configs = exec_configs,
             tool_dir = args.tool_dir,
             tool_cfg = args.tool_cfg,
             verbose = args.verbose,
+            incremental = args.incremental,
+            action_cache_dir = args.action_cache_dir,
+            action_cache_size = args.action_cache_size_mb * 1024 * 1024,
+            resource_report_file = args.resource_report,
+            copy_strategy = args.copy_strategy,
+            tracer = tracer,
         )
     elif args.mode == "unix-exec":
-        return common_exec.run(
+        return common_exec.run_batch(
             platform = "unix",
-            build_dirs = build_dirs,
-            requests = requests,
-            common_vars = common,
+            configs = exec_configs,
             tool_dir = args.tool_dir,
             verbose = args.verbose,
+            incremental = args.incremental,
+            action_cache_dir = args.action_cache_dir,
+            action_cache_size = args.action_cache_size_mb * 1024 * 1024,
+            resource_report_file = args.resource_report,
+            copy_strategy = args.copy_strategy,
+            jobs = args.jobs,
+            tracer = tracer,
         )
     elif args.mode == "bazel-exec":
-        return common_exec.run(
+        return common_exec.run_batch(
             platform = "bazel",
-            build_dirs = build_dirs,
-            requests = requests,
-            common_vars = common,
+            configs = exec_configs,
             tool_dir = args.tool_dir,
             verbose = args.verbose,
+            incremental = args.incremental,
+            action_cache_dir = args.action_cache_dir,
+            action_cache_size = args.action_cache_size_mb * 1024 * 1024,
+            resource_report_file = args.resource_report,
+            copy_strategy = args.copy_strategy,
+            jobs = args.jobs,
+            tracer = tracer,
         )
     else:
         print("Mode not supported: %s" % args.mode)
@@ -0,0 +1,156 @@
+# Copyright (C) 2018 and later: Unicode, Inc. and others.
+# License & terms of use: http://www.unicode.org/copyright.html
+
+# Python 2/3 Compatibility (ICU-20299)
+# TODO(ICU-20301): Remove this.
+from __future__ import print_function
+
+import hashlib
+import os
+import shutil
+import tempfile
+import threading
+
+
+class ActionCache(object):
+    """
+    Content-addressed on-disk cache for the output files of tool invocations.
+
+    The key of an entry is a digest of the tool binary, the fully formatted
+    command line, and the contents of every input file. Each entry is a
+    directory holding the output files by index. Entries are evicted in
+    least-recently-used order once the cache grows beyond max_size bytes.
+    """
+
+    def __init__(self, cache_dir, max_size):
+        self.cache_dir = cache_dir
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._digests = {}
+        self._lock = threading.Lock()
+        if not os.path.isdir(cache_dir):
+            os.makedirs(cache_dir)
+
+    def compute_key(self, tool_path, command_line, input_paths):
+        """Returns the cache key for a command, or None if an input is missing."""
+        hasher = hashlib.sha256()
+        tool_digest = self._file_digest(tool_path)
+        if tool_digest is None:
+            return None
+        hasher.update(("tool:%s\0" % tool_digest).encode("utf-8"))
+        hasher.update(("cmd:%s\0" % command_line).encode("utf-8"))
+        for path in sorted(set(input_paths)):
+            digest = self._file_digest(path)
+            if digest is None:
+                return None
+            hasher.update(("in:%s:%s\0" % (path, digest)).encode("utf-8"))
+        return hasher.hexdigest()
+
+    def restore(self, key, output_paths):
+        """Copies the cached outputs to output_paths; returns False on a miss."""
+        entry_dir = self._entry_dir(key)
+        cached_paths = [os.path.join(entry_dir, str(i)) for i in range(len(output_paths))]
+        if not all(os.path.isfile(path) for path in cached_paths):
+            with self._lock:
+                self.misses += 1
+            return False
+        try:
+            for cached_path, output_path in zip(cached_paths, output_paths):
+                # The output may be a link to a source file or to another
+                # cache entry; replace it instead of writing through it.
+                if os.path.lexists(output_path):
+                    os.remove(output_path)
+                shutil.copyfile(cached_path, output_path)
+            # Mark the entry as recently used.
+            os.utime(entry_dir, None)
+        except (IOError, OSError):
+            # The entry may have been evicted concurrently.
+            with self._lock:
+                self.misses += 1
+            return False
+        with self._lock:
+            self.hits += 1
+        return True
+
+    def store(self, key, output_paths):
+        """
+        Adds the outputs of a successful command to the cache. The entry gets
+        its own copies of the files, so that it never shares data with an
+        output that is later modified or replaced. Symbolic links are not
+        cached, since their content belongs to another file.
+        """
+        if not all(
+                os.path.isfile(path) and not os.path.islink(path)
+                for path in output_paths):
+            return
+        entry_dir = self._entry_dir(key)
+        parent_dir = os.path.dirname(entry_dir)
+        if not os.path.isdir(parent_dir):
+            try:
+                os.makedirs(parent_dir)
+            except OSError:
+                pass
+        # Populate a temporary directory first, so that other processes
+        # sharing the cache never see an incomplete entry.
+        tmp_dir = tempfile.mkdtemp(dir=parent_dir)
+        try:
+            for i, output_path in enumerate(output_paths):
+                shutil.copyfile(output_path, os.path.join(tmp_dir, str(i)))
+            os.rename(tmp_dir, entry_dir)
+        except OSError:
+            # Lost a race with another process storing the same entry.
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    def trim(self):
+        """Evicts least-recently-used entries until the cache fits max_size."""
+        entries = []
+        total_size = 0
+        for prefix in os.listdir(self.cache_dir):
+            prefix_dir = os.path.join(self.cache_dir, prefix)
+            if not os.path.isdir(prefix_dir):
+                continue
+            for name in os.listdir(prefix_dir):
+                entry_dir = os.path.join(prefix_dir, name)
+                size = sum(
+                    os.path.getsize(os.path.join(entry_dir, f))
+                    for f in os.listdir(entry_dir)
+                )
+                entries.append((os.path.getmtime(entry_dir), size, entry_dir))
+                total_size += size
+        entries.sort()
+        for _, size, entry_dir in entries:
+            if total_size <= self.max_size:
+                break
+            shutil.rmtree(entry_dir, ignore_errors=True)
+            total_size -= size
+        return total_size
+
+    def stats_string(self):
+        total = self.hits + self.misses
+        return "Action cache: %d hits, %d misses (%.1f%% hit rate)" % (
+            self.hits,
+            self.misses,
+            100.0 * self.hits / total if total else 0.0
+        )
+
+    def _entry_dir(self, key):
+        return os.path.join(self.cache_dir, key[:2], key)
+
+    def _file_digest(self, path):
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        stamp = (path, st.st_mtime, st.st_size)
+        with self._lock:
+            if stamp in self._digests:
+                return self._digests[stamp]
+        hasher = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 16), b""):
+                hasher.update(chunk)
+        digest = hasher.hexdigest()
+        with self._lock:
+            self._digests[stamp] = digest
+        return digest
@@ -4,48 +4,79 @@
 import io
 
 class CommentStripper(object):
-    """Removes lines starting with "//" from a file stream."""
+    """
+    Removes lines starting with "//" from a file stream.
+
+    A comment line is removed together with its line terminator. Lines are
+    processed a whole line at a time, so that most of the work is done by
+    str.find(). read(size) returns at most size characters, and fewer only at
+    the end of the stream.
+    """
+
+    # States at the end of the text processed so far.
+    START_OF_LINE = 0
+    IN_LINE = 1
+    IN_COMMENT = 2
 
     def __init__(self, f):
         self.f = f
-        self.state = 0
+        self.state = CommentStripper.START_OF_LINE
+        # Input that could not be classified yet: a "/" at the start of a line.
+        self.carry = ""
+        # Stripped text not yet returned by read(size).
+        self.buffer = ""
+        self.eof = False
 
     def read(self, size=-1):
-        bytes = self.f.read(size)
-        # TODO: Do we need to read more bytes if comments were stripped
-        # in order to obey the size request?
-        return "".join(self._strip_comments(bytes))
-
-    def _strip_comments(self, bytes):
-        for byte in bytes:
-            if self.state == 0:
-                # state 0: start of a line
-                if byte == "/":
-                    self.state = 1
-                elif byte == "\n":
-                    self.state = 0
-                    yield byte
-                else:
-                    self.state = 2
-                    yield byte
-            elif self.state == 1:
-                # state 1: read a single '/'
-                if byte == "/":
-                    self.state = 3
-                elif byte == "\n":
-                    self.state = 0
-                    yield "/"  # the one that was skipped
-                    yield "\n"
+        if size is None or size < 0:
+            result = self.buffer + self._strip_comments(self.f.read())
+            self.buffer = ""
+            self._set_eof()
+            return result
+        while len(self.buffer) < size and not self.eof:
+            chunk = self.f.read(size)
+            if chunk:
+                self.buffer += self._strip_comments(chunk)
+            else:
+                self._set_eof()
+        result = self.buffer[:size]
+        self.buffer = self.buffer[size:]
+        return result
+
+    def _set_eof(self):
+        # A single "/" at the very end of the stream is dropped.
+        self.carry = ""
+        self.eof = True
+
+    def _strip_comments(self, text):
+        if self.carry:
+            text = self.carry + text
+            self.carry = ""
+        result = []
+        pos = 0
+        limit = len(text)
+        while pos < limit:
+            if self.state == CommentStripper.START_OF_LINE:
+                if text[pos] != "/":
+                    self.state = CommentStripper.IN_LINE
+                elif pos + 1 == limit:
+                    # Need the next character to know if this is a comment.
+                    self.carry = "/"
+                    break
+                elif text[pos + 1] == "/":
+                    self.state = CommentStripper.IN_COMMENT
+                    pos += 2
                 else:
-                    self.state = 2
-                    yield "/"  # the one that was skipped
-                    yield byte
-            elif self.state == 2:
-                # state 2: middle of a line, no comment
-                if byte == "\n":
-                    self.state = 0
-                yield byte
-            elif self.state == 3:
-                # state 3: inside a comment
-                if byte == "\n":
-                    self.state = 0
+                    self.state = CommentStripper.IN_LINE
+                continue
+            end = text.find("\n", pos)
+            if end == -1:
+                end = limit
+            else:
+                end += 1
+            if self.state == CommentStripper.IN_LINE:
+                result.append(text[pos:end])
+            if text[end - 1] == "\n":
+                self.state = CommentStripper.START_OF_LINE
+            pos = end
+        return "".join(result)
@@ -0,0 +1,122 @@
+# Copyright (C) 2018 and later: Unicode, Inc. and others.
+# License & terms of use: http://www.unicode.org/copyright.html
+
+# Python 2/3 Compatibility (ICU-20299)
+# TODO(ICU-20301): Remove this.
+from __future__ import print_function
+
+import os
+import shutil
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# Ways to copy a file, from cheapest to most expensive. Each strategy falls
+# back to the next one if the platform or file system does not support it.
+#
+# hardlink: the output shares the data of the input (same inode).
+# reflink: the output is a copy-on-write clone (btrfs, XFS, APFS, ...).
+# copy_file_range: the kernel copies the data (Linux).
+# copy: shutil.copyfile.
+#
+# "auto" starts with reflink. Hard links are not used by default, since a
+# tool that writes into an existing output file would modify the input too.
+COPY_STRATEGIES = ["auto", "hardlink", "reflink", "copy_file_range", "copy"]
+
+FALLBACK_ORDER = ["hardlink", "reflink", "copy_file_range", "copy"]
+
+# From linux/fs.h: _IOW(0x94, 9, int)
+FICLONE = 0x40049409
+
+
+def copy_file(input_path, output_path, strategy="auto"):
+    """
+    Copies input_path to output_path, replacing output_path if it exists.
+    Returns the name of the strategy that was used.
+    """
+    if strategy == "auto":
+        strategy = "reflink"
+    # Never write through an existing output file; it may be a link.
+    if os.path.lexists(output_path):
+        os.remove(output_path)
+    for name in FALLBACK_ORDER[FALLBACK_ORDER.index(strategy):]:
+        if name == "copy":
+            shutil.copyfile(input_path, output_path)
+            return name
+        try:
+            if _COPY_FUNCTIONS[name](input_path, output_path):
+                return name
+        except (AttributeError, NotImplementedError, OSError, IOError):
+            pass
+        if os.path.lexists(output_path):
+            os.remove(output_path)
+    assert False
+
+
+def symlink_file(input_path, output_path, strategy="auto"):
+    """
+    Makes output_path a symbolic link to input_path, or a copy if links are
+    not supported. Returns "symlink" or the copy strategy that was used.
+    """
+    if os.path.lexists(output_path):
+        os.remove(output_path)
+    try:
+        os.symlink(os.path.abspath(input_path), output_path)
+        return "symlink"
+    except (AttributeError, NotImplementedError, OSError):
+        # For example, on Windows without the privilege to create links
+        return copy_file(input_path, output_path, strategy)
+
+
+def shell_copy_command(strategy, input_path, output_path):
+    """
+    Returns a POSIX shell command that copies a file with the given strategy.
+    Like copy_file, it removes the output file first, since cp would write
+    through it if it is a link.
+    """
+    remove = "rm -f %s" % output_path
+    copy = "cp %s %s" % (input_path, output_path)
+    if strategy == "hardlink":
+        return "%s && ln %s %s 2>/dev/null || %s" % (remove, input_path, output_path, copy)
+    if strategy == "reflink":
+        # --reflink is specific to GNU cp
+        return "%s && cp --reflink=auto %s %s 2>/dev/null || %s" % (
+            remove, input_path, output_path, copy)
+    # GNU cp uses copy_file_range where it can.
+    return "%s && %s" % (remove, copy)
+
+
+def _hardlink(input_path, output_path):
+    os.link(input_path, output_path)
+    return True
+
+
+def _reflink(input_path, output_path):
+    if fcntl is None:
+        return False
+    with open(input_path, "rb") as src, open(output_path, "wb") as dst:
+        fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+    return True
+
+
+def _copy_file_range(input_path, output_path):
+    if not hasattr(os, "copy_file_range"):
+        return False
+    with open(input_path, "rb") as src, open(output_path, "wb") as dst:
+        remaining = os.fstat(src.fileno()).st_size
+        while remaining > 0:
+            copied = os.copy_file_range(src.fileno(), dst.fileno(), remaining)
+            if copied == 0:
+                # The file shrank while copying
+                break
+            remaining -= copied
+    return True
+
+
+_COPY_FUNCTIONS = {
+    "hardlink": _hardlink,
+    "reflink": _reflink,
+    "copy_file_range": _copy_file_range,
+}
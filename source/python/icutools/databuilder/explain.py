@@ -0,0 +1,227 @@
+# Copyright (C) 2018 and later: Unicode, Inc. and others.
+# License & terms of use: http://www.unicode.org/copyright.html
+
+# Python 2/3 Compatibility (ICU-20299)
+# TODO(ICU-20301): Remove this.
+from __future__ import print_function
+
+from collections import namedtuple
+import copy
+import os
+
+from . import *
+from . import filtration, utils
+from .request_types import *
+
+
+# The effect of the filters on the input files of one category. kept and
+# dropped are lists of (file, rule) pairs, where rule names the setting of
+# the filter file that decided about the file.
+CategoryExplanation = namedtuple("CategoryExplanation", ["category", "kept", "dropped"])
+
+# The input files of genrb that the rules of a resourceFilters entry apply to
+ResourceFilterExplanation = namedtuple("ResourceFilterExplanation", [
+    "index", "categories", "rules", "files"])
+
+# The files of one category in the .dat file, with their sizes in a
+# previous build. Files that are not in the previous build are "missing".
+CategorySize = namedtuple("CategorySize", [
+    "category", "files", "size", "dropped_files", "dropped_size", "missing_files"])
+
+Explanation = namedtuple("Explanation", ["categories", "resource_filters", "sizes"])
+
+
+def explain_filters(requests, config, io, common_vars, previous_out_dir=None):
+    """
+    Applies the filters to the requests, like filtration.apply_filters, and
+    returns an Explanation of what they kept and dropped. The requests are
+    modified.
+
+    If previous_out_dir is given, the sizes of the files that go into the
+    .dat file are estimated from the files in it.
+    """
+    files_before = _input_files_by_category(requests)
+    unfiltered_requests = copy.deepcopy(requests) if previous_out_dir else None
+    requests = filtration.apply_filters(requests, config, io)
+    files_after = _input_files_by_category(requests)
+
+    categories = []
+    for category, files in sorted(files_before.items()):
+        filter_json, source = filtration.get_category_filter_json(category, config)
+        if filter_json in ("include", "exclude"):
+            filter = None
+        else:
+            filter = filtration.Filter.create_from_json(filter_json, io)
+        kept_files = set(files_after.get(category, []))
+        kept = []
+        dropped = []
+        for file in files:
+            rule = _get_rule(filter, source, file)
+            if file in kept_files:
+                kept.append((file, rule))
+            elif filter_json == "include" or filter is not None and filter.match(file):
+                # The resource filters exclude all of its resources.
+                dropped.append((file, "dropEmptyResourceFiles"))
+            else:
+                dropped.append((file, rule))
+        categories.append(CategoryExplanation(category, kept, dropped))
+
+    resource_filters = []
+    for i, entry in enumerate(config.filters_json_data.get("resourceFilters", [])):
+        if "files" in entry:
+            file_filter = filtration.Filter.create_from_json(entry["files"], io).compile()
+        else:
+            file_filter = filtration.InclusionFilter()
+        files = _genrb_input_files(requests, entry["categories"])
+        resource_filters.append(ResourceFilterExplanation(
+            index = i,
+            categories = entry["categories"],
+            rules = entry["rules"],
+            files = [
+                file
+                for file, matched in zip(files, file_filter.match_many(files))
+                if matched
+            ]
+        ))
+
+    sizes = None
+    if previous_out_dir:
+        sizes = estimate_sizes(
+            utils.flatten_requests(unfiltered_requests, config, common_vars),
+            utils.flatten_requests(requests, config, common_vars),
+            previous_out_dir)
+    return Explanation(categories, resource_filters, sizes)
+
+
+def estimate_sizes(unfiltered_requests, requests, previous_out_dir):
+    """
+    Returns a list of CategorySize, one per category of the files in the
+    .dat file, for the flat requests before and after filtering.
+    """
+    files_before = _output_files_by_category(unfiltered_requests)
+    files_after = _output_files_by_category(requests)
+    result = []
+    for category in sorted(set(files_before) | set(files_after), key = lambda c: c or ""):
+        files = files_after.get(category, [])
+        kept_files = set(files)
+        dropped_files = [
+            file
+            for file in files_before.get(category, [])
+            if file not in kept_files
+        ]
+        size, missing_files = _total_size(files, previous_out_dir)
+        dropped_size, _ = _total_size(dropped_files, previous_out_dir)
+        result.append(CategorySize(
+            category = category,
+            files = len(files),
+            size = size,
+            dropped_files = len(dropped_files),
+            dropped_size = dropped_size,
+            missing_files = missing_files
+        ))
+    return result
+
+
+def write_explanation(out, explanation, previous_out_dir=None):
+    """Writes an Explanation as text to the file-like object out."""
+    for category in explanation.categories:
+        total = len(category.kept) + len(category.dropped)
+        out.write("%s: kept %d of %d files\n" % (category.category, len(category.kept), total))
+        for file, rule in category.kept:
+            out.write("  + %s (%s)\n" % (file.filename, rule))
+        for file, rule in category.dropped:
+            out.write("  - %s (%s)\n" % (file.filename, rule))
+
+    for resource_filter in explanation.resource_filters:
+        out.write("\nresourceFilters[%d]: %d files in %s\n" % (
+            resource_filter.index,
+            len(resource_filter.files),
+            ", ".join(resource_filter.categories)))
+        for rule in resource_filter.rules:
+            out.write("  rule %s\n" % rule)
+        for file in resource_filter.files:
+            out.write("  %s\n" % file.filename)
+
+    if explanation.sizes is None:
+        return
+    out.write("\nEstimated size of the .dat file, from the files in %s:\n" % previous_out_dir)
+    out.write("  %-24s %8s %12s %14s %14s\n" % (
+        "category", "files", "bytes", "dropped files", "dropped bytes"))
+    for size in explanation.sizes:
+        out.write("  %-24s %8d %12d %14d %14d\n" % (
+            size.category or "(none)", size.files, size.size,
+            size.dropped_files, size.dropped_size))
+    out.write("  %-24s %8d %12d %14d %14d\n" % (
+        "total",
+        sum(size.files for size in explanation.sizes),
+        sum(size.size for size in explanation.sizes),
+        sum(size.dropped_files for size in explanation.sizes),
+        sum(size.dropped_size for size in explanation.sizes)))
+    missing_files = sum(size.missing_files for size in explanation.sizes)
+    if missing_files:
+        out.write("  %d files are not in the previous build and are not counted.\n" % missing_files)
+    if explanation.resource_filters:
+        out.write("  Resource filters make files smaller; their effect is not estimated.\n")
+
+
+def _get_rule(filter, source, file):
+    """Returns the setting that decided whether the file is kept."""
+    if isinstance(filter, filtration.UnionFilter):
+        for i, sub_filter in enumerate(filter.sub_filters):
+            if sub_filter.match(file):
+                return "%s.unionOf[%d]" % (source, i)
+    return source
+
+
+def _input_files_by_category(requests):
+    result = {}
+    seen = set()
+    for request in requests:
+        if request.category is None:
+            continue
+        files = result.setdefault(request.category, [])
+        for file in request.all_input_files():
+            if (request.category, file) not in seen:
+                seen.add((request.category, file))
+                files.append(file)
+    return result
+
+
+def _genrb_input_files(requests, categories):
+    # Like ResourceFilterInfo.apply_to_requests
+    result = []
+    seen = set()
+    for request in requests:
+        if request.category not in categories:
+            continue
+        if not isinstance(request, AbstractExecutionRequest):
+            continue
+        if request.tool != IcuTool("genrb"):
+            continue
+        for file in request.input_files:
+            if file not in seen:
+                seen.add(file)
+                result.append(file)
+    return result
+
+
+def _output_files_by_category(requests):
+    """Returns the files in the .dat file, by the category of their request."""
+    result = {}
+    for request in requests:
+        for file in request.all_output_files():
+            if isinstance(file, OutFile):
+                result.setdefault(request.category, []).append(file)
+    return result
+
+
+def _total_size(files, out_dir):
+    """Returns the total size of the files in out_dir and the number of missing files."""
+    size = 0
+    missing_files = 0
+    for file in files:
+        try:
+            size += os.path.getsize(os.path.join(out_dir, file.filename))
+        except OSError:
+            missing_files += 1
+    return size, missing_files
@@ -11,14 +11,17 @@ import re
 import sys
 
 from . import *
-from . import utils
 from .request_types import *
+from .request_types import _compact_list
 
 
 # Note: for this to be a proper abstract class, it should extend abc.ABC.
 # There is no nice way to do this that works in both Python 2 and 3.
 # TODO(ICU-20301): Make this inherit from abc.ABC.
 class Filter(object):
+    # Relative cost of match(), used to order the branches of a union.
+    match_cost = 3
+
     @staticmethod
     def create_from_json(json_data, io):
         assert io != None
@@ -46,8 +49,7 @@ class Filter(object):
     def filter(self, request):
         if not request.apply_file_filter(self):
             return []
-        for file in request.all_input_files():
-            assert self.match(file)
+        assert all(self.match_many(request.all_input_files()))
         return [request]
 
     @staticmethod
@@ -67,16 +69,37 @@ class Filter(object):
     def match(self, file):
         pass
 
+    def match_many(self, files):
+        """Returns a list with the result of match() for each of the files."""
+        return [self.match(file) for file in files]
+
+    def compile(self):
+        """
+        Returns a filter that matches the same files as this one, but is
+        faster to evaluate. Neither filter may be changed afterwards.
+        """
+        return self
+
 
 class InclusionFilter(Filter):
+    match_cost = 0
+
     def match(self, file):
         return True
 
+    def match_many(self, files):
+        return [True] * len(files)
+
 
 class ExclusionFilter(Filter):
+    match_cost = 0
+
     def match(self, file):
         return False
 
+    def match_many(self, files):
+        return [False] * len(files)
+
 
 class IncludeExcludeFilter(Filter):
     def __init__(self, json_data):
@@ -99,12 +122,25 @@ class IncludeExcludeFilter(Filter):
         file_stem = self._file_to_file_stem(file)
         return self._should_include(file_stem)
 
+    def _key_and_values(self):
+        if self.is_includelist:
+            return "includelist", self.includelist
+        else:
+            return "excludelist", self.excludelist
+
+    def compile(self):
+        # Sets instead of lists for the membership tests
+        key, values = self._key_and_values()
+        return type(self)({key: frozenset(values)})
+
     @abstractmethod
     def _should_include(self, file_stem):
         pass
 
 
 class FileStemFilter(IncludeExcludeFilter):
+    match_cost = 1
+
     def _should_include(self, file_stem):
         if self.is_includelist:
             return file_stem in self.includelist
@@ -113,6 +149,8 @@ class FileStemFilter(IncludeExcludeFilter):
 
 
 class LanguageFilter(IncludeExcludeFilter):
+    match_cost = 1
+
     def _should_include(self, file_stem):
         language = file_stem.split("_")[0]
         if language == "root":
@@ -125,6 +163,8 @@ class LanguageFilter(IncludeExcludeFilter):
 
 
 class RegexFilter(IncludeExcludeFilter):
+    match_cost = 2
+
     def __init__(self, *args):
         # TODO(ICU-20301): Change this to: super().__init__(*args)
         super(RegexFilter, self).__init__(*args)
@@ -145,6 +185,35 @@ class RegexFilter(IncludeExcludeFilter):
                     return False
             return True
 
+    def compile(self):
+        # One alternation instead of one match() per pattern
+        key, patterns = self._key_and_values()
+        combined = _combine_patterns(patterns)
+        if combined is None:
+            return self
+        return RegexFilter({key: [combined]})
+
+
+# The flags of a pattern without inline flags
+DEFAULT_REGEX_FLAGS = re.compile("").flags
+
+def _combine_patterns(patterns):
+    """
+    Returns one compiled pattern that matches where any of the patterns
+    matches, or None if they cannot be combined safely.
+    """
+    if len(patterns) <= 1:
+        return None
+    for pattern in patterns:
+        # Inline flags apply to the whole pattern, and group numbers would
+        # change, breaking backreferences.
+        if pattern.flags != DEFAULT_REGEX_FLAGS or pattern.groups:
+            return None
+    try:
+        return re.compile("|".join("(?:%s)" % pattern.pattern for pattern in patterns))
+    except re.error:
+        return None
+
 
 class UnionFilter(Filter):
     def __init__(self, json_data, io):
@@ -153,6 +222,43 @@ class UnionFilter(Filter):
         for filter_json in json_data["unionOf"]:
             self.sub_filters.append(Filter.create_from_json(filter_json, io))
 
+    def compile(self):
+        """
+        Flattens nested unions, merges the includelists of the same filter
+        type, and orders the branches so that the cheapest ones run first.
+        """
+        branches = []
+        for filter in self.sub_filters:
+            filter = filter.compile()
+            if isinstance(filter, UnionFilter):
+                branches += filter.sub_filters
+            else:
+                branches.append(filter)
+
+        # Includelists of the same filter type are merged into one filter.
+        merged = defaultdict(list)
+        sub_filters = []
+        for filter in branches:
+            if isinstance(filter, InclusionFilter):
+                return filter
+            if isinstance(filter, ExclusionFilter):
+                continue
+            if isinstance(filter, IncludeExcludeFilter) and filter.is_includelist:
+                merged[type(filter)] += filter.includelist
+            else:
+                sub_filters.append(filter)
+        for filter_type, values in merged.items():
+            sub_filters.append(filter_type({"includelist": values}).compile())
+
+        if not sub_filters:
+            return ExclusionFilter()
+        if len(sub_filters) == 1:
+            return sub_filters[0]
+        sub_filters.sort(key = lambda filter: filter.match_cost)
+        union = UnionFilter({"unionOf": []}, None)
+        union.sub_filters = sub_filters
+        return union
+
     def match(self, file):
         """Match iff any of the sub-filters match."""
         for filter in self.sub_filters:
@@ -160,11 +266,25 @@ class UnionFilter(Filter):
                 return True
         return False
 
+    def match_many(self, files):
+        mask = [False] * len(files)
+        for filter in self.sub_filters:
+            # Only the files that no previous sub-filter matched
+            indices = [i for i, matched in enumerate(mask) if not matched]
+            if not indices:
+                break
+            for i, matched in zip(indices, filter.match_many([files[i] for i in indices])):
+                mask[i] = matched
+        return mask
+
 
 LANGUAGE_SCRIPT_REGEX = re.compile(r"^([a-z]{2,3})_[A-Z][a-z]{3}$")
 LANGUAGE_ONLY_REGEX = re.compile(r"^[a-z]{2,3}$")
 
 class LocaleFilter(Filter):
+    # Reads the dependency data of the tree
+    match_cost = 4
+
     def __init__(self, json_data, io):
         if "whitelist" in json_data:
             self.locales_requested = list(json_data["whitelist"])
@@ -175,31 +295,50 @@ class LocaleFilter(Filter):
         self.include_children = json_data.get("includeChildren", True)
         self.include_scripts = json_data.get("includeScripts", False)
 
-        # Load the dependency graph from disk
-        self.dependency_data_by_tree = {
-            tree: io.read_locale_deps(tree)
-            for tree in utils.ALL_TREES
-        }
+        # The dependency graph of each tree is loaded from disk on first use.
+        # IO caches it, so it is shared with other filters and BUILDRULES.
+        self.io = io
+
+        # Results of match() by tree and locale. The *required* locales of a
+        # tree are computed when the tree is first used; other locales are
+        # added as they are matched.
+        self.locales_requested_set = set(self.locales_requested)
+        self.match_table_by_tree = {}
+        self._recursive_table_by_tree = {}
 
     def match(self, file):
         tree = self._file_to_subdir(file)
         assert tree is not None
         locale = self._file_to_file_stem(file)
-
-        # A locale is *required* if it is *requested* or an ancestor of a
-        # *requested* locale.
-        if locale in self._locales_required(tree):
-            return True
-
-        # Resolve include_scripts and include_children.
-        return self._match_recursive(locale, tree)
+        match_table = self._get_match_table(tree)
+        if locale not in match_table:
+            # Resolve include_scripts and include_children.
+            match_table[locale] = self._match_recursive(locale, tree)
+        return match_table[locale]
+
+    def _get_match_table(self, tree):
+        if tree not in self.match_table_by_tree:
+            # A locale is *required* if it is *requested* or an ancestor of a
+            # *requested* locale.
+            self.match_table_by_tree[tree] = {
+                locale: True
+                for locale in self._locales_required(tree)
+            }
+            self._recursive_table_by_tree[tree] = {}
+        return self.match_table_by_tree[tree]
 
     def _match_recursive(self, locale, tree):
-        # Base case: return True if we reached a *requested* locale,
-        # or False if we ascend out of the locale tree.
+        # Base case: return False if we ascend out of the locale tree.
         if locale is None:
             return False
-        if locale in self.locales_requested:
+        recursive_table = self._recursive_table_by_tree[tree]
+        if locale not in recursive_table:
+            recursive_table[locale] = self._match_recursive_uncached(locale, tree)
+        return recursive_table[locale]
+
+    def _match_recursive_uncached(self, locale, tree):
+        # Return True if we reached a *requested* locale.
+        if locale in self.locales_requested_set:
             return True
 
         # Check for alternative scripts.
@@ -220,7 +359,7 @@ class LocaleFilter(Filter):
 
     def _get_parent_locale(self, locale, tree):
         """Gets the parent locale in the given tree, according to dependency data."""
-        dependency_data = self.dependency_data_by_tree[tree]
+        dependency_data = self.io.read_locale_deps(tree)
         if "parents" in dependency_data and locale in dependency_data["parents"]:
             return dependency_data["parents"][locale]
         if "aliases" in dependency_data and locale in dependency_data["aliases"]:
@@ -261,6 +400,28 @@ def _apply_file_filters(old_requests, config, io):
     return new_requests
 
 
+def get_category_filter_json(category, config):
+    """
+    Returns the filter JSON for a category, which is "include", "exclude",
+    or a filter object, and the setting of the filter file it comes from.
+    """
+    json_data = config.filters_json_data
+    filter_json = "exclude" if config.strategy == "additive" else "include"
+    source = "strategy %s" % config.strategy
+    # Special default for category "brkitr_lstm" and "brkitr_adaboost" as "exclude" for now.
+    if "brkitr_lstm" == category or "brkitr_adaboost" == category:
+        filter_json = "exclude"
+        source = "default for %s" % category
+    # Figure out the correct filter to create for now.
+    if "featureFilters" in json_data and category in json_data["featureFilters"]:
+        filter_json = json_data["featureFilters"][category]
+        source = "featureFilters.%s" % category
+    if filter_json == "include" and "localeFilter" in json_data and category.endswith("_tree"):
+        filter_json = json_data["localeFilter"]
+        source = "localeFilter"
+    return filter_json, source
+
+
 def _preprocess_file_filters(requests, config, io):
     all_categories = set(
         request.category
@@ -270,24 +431,15 @@ def _preprocess_file_filters(requests, config, io):
     all_categories = list(sorted(all_categories))
     json_data = config.filters_json_data
     filters = {}
-    default_filter_json = "exclude" if config.strategy == "additive" else "include"
     for category in all_categories:
-        filter_json = default_filter_json
-        # Special default for category "brkitr_lstm" and "brkitr_adaboost" as "exclude" for now.
-        if "brkitr_lstm" == category or "brkitr_adaboost" == category:
-            filter_json = "exclude"
-        # Figure out the correct filter to create for now.
-        if "featureFilters" in json_data and category in json_data["featureFilters"]:
-            filter_json = json_data["featureFilters"][category]
-        if filter_json == "include" and "localeFilter" in json_data and category.endswith("_tree"):
-            filter_json = json_data["localeFilter"]
+        filter_json, _ = get_category_filter_json(category, config)
         # Resolve the filter JSON into a filter object
         if filter_json == "exclude":
             filters[category] = ExclusionFilter()
         elif filter_json == "include":
             pass  # no-op
         else:
-            filters[category] = Filter.create_from_json(filter_json, io)
+            filters[category] = Filter.create_from_json(filter_json, io).compile()
     if "featureFilters" in json_data:
         for category in json_data["featureFilters"]:
             if category not in all_categories:
@@ -356,10 +508,64 @@ class ResourceFilterInfo(object):
             ]
 
     def add_rules(self, file_filter, rules):
-        for file, rule_list in zip(self.input_files, self.rules_by_file):
-            if file_filter.match(file):
+        mask = file_filter.match_many(self.input_files)
+        for matched, rule_list in zip(mask, self.rules_by_file):
+            if matched:
                 rule_list += rules
 
+    def drop_empty_files(self, all_requests, io, keep_files=()):
+        """
+        Removes the locales whose top-level resources are all excluded by
+        their rules from the requests of the category, so that genrb does
+        not build empty bundles. Like locales dropped by a localeFilter, they
+        are not listed as installed locales.
+
+        Files in keep_files are kept, as are root and the parents and alias
+        targets of the other locales, so that fallback still finds them.
+        Returns the new list of requests.
+        """
+        if not self.category.endswith("_tree"):
+            return all_requests
+        empty_stems = set()
+        for file, rules in zip(self.input_files, self.rules_by_file):
+            file_stem = Filter._file_to_file_stem(file)
+            if file_stem == "root" or file in keep_files:
+                continue
+            if not _may_exclude_all(rules):
+                # Do not read the file
+                continue
+            keys = io.read_resource_keys(file.filename)
+            if keys and all(_is_key_excluded(rules, key) for key in keys):
+                empty_stems.add(file_stem)
+        if not empty_stems:
+            return all_requests
+
+        # Parents are resolved like in a locale filter.
+        parent_filter = LocaleFilter({"includelist": []}, io)
+        for file in self.input_files:
+            locale = Filter._file_to_file_stem(file)
+            if locale in empty_stems:
+                continue
+            tree = Filter._file_to_subdir(file)
+            locale = parent_filter._get_parent_locale(locale, tree)
+            while locale is not None:
+                empty_stems.discard(locale)
+                locale = parent_filter._get_parent_locale(locale, tree)
+        if not empty_stems:
+            return all_requests
+
+        file_filter = FileStemFilter({"excludelist": empty_stems}).compile()
+        new_requests = []
+        for request in all_requests:
+            if request.category == self.category:
+                new_requests += file_filter.filter(request)
+            else:
+                new_requests.append(request)
+        mask = file_filter.match_many(self.input_files)
+        for values in (self.input_files, self.filter_files, self.rules_by_file):
+            _compact_list(values, mask)
+        return new_requests
+
     def make_requests(self):
         # Map from rule list to filter files with that rule list
         unique_rules = defaultdict(list)
@@ -396,6 +602,80 @@ class ResourceFilterInfo(object):
         return result
 
 
+def _rule_segments(rule):
+    """Returns the inclusion and the path segments of a rule like "-/a/b"."""
+    path = rule[2:].strip("/")
+    return rule[0] == "+", path.split("/") if path else []
+
+
+def _may_exclude_all(rules):
+    """Returns whether the rules exclude the root or a top-level resource."""
+    for rule in rules:
+        inclusion, segments = _rule_segments(rule)
+        if not inclusion and len(segments) <= 1:
+            return True
+    return False
+
+
+def _is_key_excluded(rules, key):
+    """
+    Returns True if the rules exclude the top-level resource with the given
+    key and everything in it. If any inclusion rule applies to the resource
+    or to a resource in it, returns False, even if genrb would exclude it.
+    """
+    excluded = False
+    for rule in rules:
+        inclusion, segments = _rule_segments(rule)
+        if not segments:
+            excluded = not inclusion
+        elif segments[0] in (key, "*"):
+            if inclusion:
+                return False
+            if len(segments) == 1:
+                excluded = True
+    return excluded
+
+
+# Comments, braces, and the text between them, in which strings may contain
+# braces and slashes
+RESOURCE_TOKEN_REGEX = re.compile(
+    r'//[^\n]*|/\*.*?\*/|[{}]|(?:[^"{}/]+|"[^"\\]*(?:\\.[^"\\]*)*"|/(?![/*]))+', re.DOTALL)
+
+def get_resource_keys(text):
+    """
+    Returns the keys of the top-level resources in the text of a resource
+    bundle file, like ["%%Parent", "Currencies"], or None if the text is not
+    a resource bundle.
+    """
+    keys = []
+    depth = 0
+    seen_bundle = False
+    # The text since the last brace, without comments
+    key = ""
+    for match in RESOURCE_TOKEN_REGEX.finditer(text):
+        token = match.group()
+        if token == "{":
+            if depth == 1:
+                key = key.strip()
+                if key.startswith('"') and key.endswith('"'):
+                    key = key[1:-1]
+                # Without the type, like ":table" or ":alias"
+                keys.append(key.split(":")[0].strip())
+            depth += 1
+            seen_bundle = True
+            key = ""
+        elif token == "}":
+            depth -= 1
+            if depth < 0:
+                return None
+            key = ""
+        elif depth == 1 and not token.startswith("//") and not token.startswith("/*"):
+            key += token
+    if depth != 0 or not seen_bundle:
+        return None
+    return keys
+
+
 def _apply_resource_filters(all_requests, config, io):
     """Creates filters for looking within resource bundle files."""
     json_data = config.filters_json_data
@@ -405,7 +685,7 @@ def _apply_resource_filters(all_requests, config, io):
     collected = {}
     for entry in json_data["resourceFilters"]:
         if "files" in entry:
-            file_filter = Filter.create_from_json(entry["files"], io)
+            file_filter = Filter.create_from_json(entry["files"], io).compile()
         else:
             file_filter = InclusionFilter()
         for category in entry["categories"]:
@@ -418,6 +698,16 @@ def _apply_resource_filters(all_requests, config, io):
                 filter_info = collected[category]
             filter_info.add_rules(file_filter, entry["rules"])
 
+    if json_data.get("dropEmptyResourceFiles", False):
+        # Files that replace source files are not read.
+        replaced_files = set(
+            request.output_file
+            for request in all_requests
+            if isinstance(request, CopyRequest) and not isinstance(request.input_file, SrcFile)
+        )
+        for filter_info in collected.values():
+            all_requests = filter_info.drop_empty_files(all_requests, io, replaced_files)
+
     # Add the filter generation requests to the beginning so that by default
     # they are made before genrb gets run (order is required by windirect)
     new_requests = []
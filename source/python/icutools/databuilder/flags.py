@@ -0,0 +1,220 @@
+# Copyright (C) 2018 and later: Unicode, Inc. and others.
+# License & terms of use: http://www.unicode.org/copyright.html
+
+"""The command-line arguments of the data build tool."""
+
+import argparse
+
+from .copy_strategy import COPY_STRATEGIES
+from .renderers import graph
+
+flag_parser = argparse.ArgumentParser(
+    description = """Generates rules for building ICU binary data files from text
+and other input files in source control.
+
+Use the --mode option to declare how to execute those rules, either exporting
+the rules to a Makefile or spawning child processes to run them immediately:
+
+  --mode=gnumake prints a Makefile to standard out (or to --output).
+  --mode=unix-exec spawns child processes in a Unix-like environment.
+  --mode=windows-exec spawns child processes in a Windows-like environment.
+  --mode=ninja prints a build.ninja file to standard out (or to --output).
+    Running it needs ninja 1.7 or later, which is not part of ICU; install
+    it from your package manager or with "pip install ninja".
+  --mode=graph prints a JSON description of every command to standard out
+    (or to --output), for use by other build systems. The --from_graph
+    option reads it back instead of running BUILDRULES.py.
+  --mode=explain prints the input files that the filters keep and drop in
+    each category, and the files that each resource filter applies to,
+    without building anything.
+
+Tips for --mode=unix-exec
+=========================
+
+Create two empty directories for out_dir and tmp_dir. They will get filled
+with a lot of intermediate files.
+
+Set LD_LIBRARY_PATH to include the lib directory. e.g., from icu4c/source:
+
+  $ LD_LIBRARY_PATH=lib PYTHONPATH=python python3 -m icutools.databuilder ...
+
+Once icutools.databuilder finishes, you have compiled the data, but you have
+not packaged it into a .dat or .so file. This is done by the separate pkgdata
+tool in bin. Read the docs of pkgdata:
+
+  $ LD_LIBRARY_PATH=lib ./bin/pkgdata --help
+
+Example command line to call pkgdata:
+
+  $ LD_LIBRARY_PATH=lib ./bin/pkgdata -m common -p icudt63l -c \\
+      -O data/icupkg.inc -s $OUTDIR -d $TMPDIR $TMPDIR/icudata.lst
+
+where $OUTDIR and $TMPDIR are your out and tmp directories, respectively.
+The above command will create icudt63l.dat in the tmpdir.
+
+Command-Line Arguments
+======================
+""",
+    formatter_class = argparse.RawDescriptionHelpFormatter
+)
+
+arg_group_required = flag_parser.add_argument_group("required arguments")
+arg_group_required.add_argument(
+    "--mode",
+    help = "What to do with the generated rules.",
+    choices = ["gnumake", "unix-exec", "windows-exec", "bazel-exec", "ninja", "graph", "explain"],
+    required = True
+)
+
+flag_parser.add_argument(
+    "--src_dir",
+    help = "Path to data source folder (icu4c/source/data).",
+    default = "."
+)
+flag_parser.add_argument(
+    "--filter_file",
+    metavar = "PATH",
+    help = "Path to an ICU data filter JSON file. In exec modes, it can be given several times to build the data for each filter file in one invocation; commands that are identical for several filter files are run only once.",
+    action = "append",
+    default = None
+)
+flag_parser.add_argument(
+    "--include_uni_core_data",
+    help = "Include the full Unicode core data in the dat file.",
+    default = False,
+    action = "store_true"
+)
+def seqmode_type(value):
+    if value in ("sequential", "parallel", "sharded"):
+        return value
+    if value.startswith("sharded:") and value[8:].isdigit() and int(value[8:]) > 0:
+        return value
+    raise argparse.ArgumentTypeError(
+        "expected 'sequential', 'parallel', 'sharded', or 'sharded:K': %s" % value)
+
+flag_parser.add_argument(
+    "--seqmode",
+    help = "Whether to optimize rules to be run sequentially (fewer threads) or in parallel (many threads). Defaults to 'sequential', which is better for unix-exec and windows-exec modes. 'parallel' is often better for massively parallel build systems. 'sharded:K' is in between: it splits the input files into K shards of similar total size and runs one command per shard; 'sharded' uses one shard per CPU, and is supported only in exec modes.",
+    type = seqmode_type,
+    default = "sequential"
+)
+flag_parser.add_argument(
+    "--trace_file",
+    metavar = "PATH",
+    help = "Path to write a trace of the build phases and, in exec modes, of every command, in Chrome trace event format (open it in Perfetto or chrome://tracing).",
+    default = None
+)
+flag_parser.add_argument(
+    "--copy_strategy",
+    help = "How to copy files, for example the filter files of locales that share rules: 'hardlink', 'reflink' (copy-on-write clone), 'copy_file_range', or 'copy'. Each strategy falls back to the next one if the file system does not support it. 'auto' (the default) starts with 'reflink'. In gnumake and ninja modes, 'hardlink' uses 'ln -f' and 'reflink' uses 'cp --reflink=auto'; other strategies use 'cp'.",
+    choices = COPY_STRATEGIES,
+    default = "auto"
+)
+flag_parser.add_argument(
+    "--planning_cache_dir",
+    metavar = "PATH",
+    help = "Path to a directory for caching the planned requests and parsed input files, such as LOCALE_DEPS.json, between runs. A cached plan is used if BUILDRULES.py, the filter file, the arguments, and the files that planning looked at did not change.",
+    default = None
+)
+flag_parser.add_argument(
+    "--output",
+    metavar = "PATH",
+    help = "In gnumake, ninja, graph, and explain modes, path to write the output file to instead of standard out. The Makefile is written one rule at a time.",
+    default = None
+)
+flag_parser.add_argument(
+    "--from_graph",
+    metavar = "PATH",
+    help = "Path to a file written by --mode=graph. Its commands are run or rendered in the given mode instead of the rules from BUILDRULES.py, without applying filters again. The directories are the ones the graph was written with.",
+    default = None
+)
+flag_parser.add_argument(
+    "--verbose",
+    help = "Print more verbose output (default false).",
+    default = False,
+    action = "store_true"
+)
+
+arg_group_gnumake = flag_parser.add_argument_group("arguments for gnumake mode")
+arg_group_gnumake.add_argument(
+    "--makefile_strings",
+    help = "How to write the content of generated text files, such as filter rules and index files. 'export' (the default) defines a variable for each file and exports it, which puts all of them into the environment of every recipe. 'file' does not export them, and writes them with the $(file) function of GNU make 4.0. Unlike the echo command of some shells, such as dash, $(file) writes backslashes as they are, like the exec modes do.",
+    choices = ["export", "file"],
+    default = "export"
+)
+arg_group_gnumake.add_argument(
+    "--makefile_content_dir",
+    metavar = "PATH",
+    help = "Path to a directory to write the content of generated text files to while generating the Makefile, instead of putting it into Makefile variables. The Makefile copies them into place. Content that refers to Makefile variables is still handled as set by --makefile_strings.",
+    default = None
+)
+
+arg_group_graph = flag_parser.add_argument_group("arguments for graph mode")
+arg_group_graph.add_argument(
+    "--graph_format",
+    help = "'json' (the default) writes one JSON object; 'jsonl' writes a header line followed by one line per node. Each command node lists its fully formatted argv (using --tool_dir), its input and output files, its tool and filter category, and the ids of the nodes it depends on. Nodes of type 'variable' only name a list of files for the Makefile and do not run anything.",
+    choices = graph.GRAPH_FORMATS,
+    default = "json"
+)
+
+arg_group_explain = flag_parser.add_argument_group("arguments for explain mode")
+arg_group_explain.add_argument(
+    "--previous_out_dir",
+    metavar = "PATH",
+    help = "Path to the --out_dir of a previous build. The size of the .dat file is estimated from the sizes of the files in it, by category, along with the size of the files that the filters drop.",
+    default = None
+)
+
+arg_group_exec = flag_parser.add_argument_group("arguments for unix-exec and windows-exec modes")
+arg_group_exec.add_argument(
+    "--out_dir",
+    help = "Path to where to save output data files (default icudata). With several --filter_file arguments, give either one --out_dir per filter file, or a single one that gets a subdirectory per filter file.",
+    action = "append",
+    default = None
+)
+arg_group_exec.add_argument(
+    "--tmp_dir",
+    help = "Path to where to save temporary files (default icutmp). Like --out_dir, it can be given once per filter file.",
+    action = "append",
+    default = None
+)
+arg_group_exec.add_argument(
+    "--tool_dir",
+    help = "Path to where to find binary tools (genrb, etc).",
+    default = "../bin"
+)
+arg_group_exec.add_argument(
+    "--tool_cfg",
+    help = "The build configuration of the tools. Used in 'windows-exec' mode only.",
+    default = "x86/Debug"
+)
+arg_group_exec.add_argument(
+    "--incremental",
+    help = "Skip commands whose output files are newer than all of their input files, unless the command line changed since the previous run.",
+    default = False,
+    action = "store_true"
+)
+arg_group_exec.add_argument(
+    "--action_cache_dir",
+    metavar = "PATH",
+    help = "Path to a directory for caching the outputs of tool invocations. If a command with the same tool binary, command line, and input file contents ran before, its outputs are restored from the cache instead of running the tool.",
+    default = None
+)
+arg_group_exec.add_argument(
+    "--action_cache_size_mb",
+    help = "Maximum size of the action cache in megabytes; least recently used entries are evicted first (default 1024).",
+    type = int,
+    default = 1024
+)
+arg_group_exec.add_argument(
+    "--resource_report",
+    metavar = "PATH",
+    help = "Path to write a JSON report of the wall time, CPU time, and peak memory of every tool invocation, aggregated per request, category, and tool. A summary is printed at the end of the run.",
+    default = None
+)
+arg_group_exec.add_argument(
+    "-j", "--jobs",
+    help = "Number of commands to run concurrently. Commands are started as soon as the commands producing their input files have finished. Used in 'unix-exec' and 'bazel-exec' modes only.",
+    type = int,
+    default = 1
+)
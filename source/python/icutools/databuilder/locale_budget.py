@@ -0,0 +1,264 @@
+# Copyright (C) 2018 and later: Unicode, Inc. and others.
+# License & terms of use: http://www.unicode.org/copyright.html
+
+"""
+Chooses the locales of a filter file so that the locale data fits a size
+budget. Run it from the python directory:
+
+  $ python3 -m icutools.databuilder.locale_budget --src_dir ../data \\
+      --sizes_from icudata --budget 2M --languages_file languages.list \\
+      --base_filter_file filters/cast.json --output filters/cast_small.json
+
+The languages are added in priority order, as long as the locale data of
+a language, its parent locales, and (by default) its child locales still
+fits the budget. The sizes are those of the .res files in --sizes_from, the
+--out_dir of a reference build without locale filters. Only the trees to
+which the localeFilter applies count toward the budget.
+"""
+
+# Python 2/3 Compatibility (ICU-20299)
+# TODO(ICU-20301): Remove this.
+from __future__ import print_function
+
+from collections import namedtuple
+import argparse
+import io as pyio
+import json
+import os
+import sys
+
+from . import *
+from . import filtration
+from .comment_stripper import CommentStripper
+from .flags import flag_parser as build_flag_parser
+from .planning import IO, generate_requests, get_config_args, load_buildrules
+from .request_types import *
+from .trace import Tracer
+
+# The cost of adding one locale, in priority order. size is the number of
+# bytes that the locale adds to the ones selected before it, and total is
+# the number of bytes of all selected locales after it was considered.
+LocaleCost = namedtuple("LocaleCost", ["locale", "size", "total", "selected"])
+
+def budget_type(value):
+    """Parses a number of bytes, with an optional K or M suffix."""
+    units = {"K": 1024, "M": 1024 * 1024}
+    multiplier = units.get(value[-1:].upper(), 1)
+    number = value[:-1] if multiplier != 1 else value
+    if not number.isdigit():
+        raise argparse.ArgumentTypeError("expected a number of bytes, like 500000, 500K, or 2M: %s" % value)
+    return int(number) * multiplier
+
+flag_parser = argparse.ArgumentParser(
+    description = """Writes an ICU data filter file whose localeFilter selects
+as many of the given languages, in priority order, as fit into a size
+budget.""",
+)
+flag_parser.add_argument(
+    "--src_dir",
+    help = "Path to data source folder (icu4c/source/data).",
+    default = "."
+)
+flag_parser.add_argument(
+    "--sizes_from",
+    metavar = "PATH",
+    help = "Path to the --out_dir of a reference build, whose .res files give the size of each locale.",
+    required = True
+)
+flag_parser.add_argument(
+    "--budget",
+    help = "Maximum number of bytes for the locale data, like 500000, 500K, or 2M.",
+    type = budget_type,
+    required = True
+)
+flag_parser.add_argument(
+    "--languages",
+    metavar = "LOCALE",
+    help = "Languages or locales in priority order.",
+    nargs = "+",
+    default = []
+)
+flag_parser.add_argument(
+    "--languages_file",
+    metavar = "PATH",
+    help = "Path to a file with one language or locale per line, in priority order, after those of --languages. Lines starting with # are ignored.",
+    default = None
+)
+flag_parser.add_argument(
+    "--base_filter_file",
+    metavar = "PATH",
+    help = "Path to a filter file whose other settings are copied to the output. Its featureFilters and strategy decide to which trees the localeFilter applies.",
+    default = None
+)
+flag_parser.add_argument(
+    "--exclude_children",
+    help = "Do not include the child locales of the selected locales, like \"includeChildren\": false.",
+    default = False,
+    action = "store_true"
+)
+flag_parser.add_argument(
+    "--include_scripts",
+    help = "Include the locales of other scripts of the selected languages, like \"includeScripts\": true.",
+    default = False,
+    action = "store_true"
+)
+flag_parser.add_argument(
+    "--output",
+    metavar = "PATH",
+    help = "Path to write the filter file to instead of standard out.",
+    default = None
+)
+
+
+def get_locale_files(requests, config):
+    """
+    Returns a dict from the categories that the localeFilter applies to, to
+    a list of (input file, output file) pairs of the locales in the category.
+    """
+    result = {}
+    for request in requests:
+        if request.category is None or not request.category.endswith("_tree"):
+            continue
+        # The localeFilter replaces the filters of the included trees.
+        filter_json, source = filtration.get_category_filter_json(request.category, config)
+        if filter_json != "include" and source != "localeFilter":
+            continue
+        if not isinstance(request, AbstractExecutionRequest) or request.tool != IcuTool("genrb"):
+            continue
+        # One output file per input file, unlike the pool bundle
+        if len(request.input_files) != len(request.output_files):
+            continue
+        result.setdefault(request.category, []).extend(
+            zip(request.input_files, request.output_files))
+    return result
+
+
+def get_file_sizes(out_dir, files):
+    """Returns a dict from file to its size in out_dir, and a list of the missing files."""
+    sizes = {}
+    missing_files = []
+    for file in files:
+        try:
+            sizes[file] = os.path.getsize(os.path.join(out_dir, file.filename))
+        except OSError:
+            missing_files.append(file)
+    return sizes, missing_files
+
+
+def locale_filter_json(locales, include_children=True, include_scripts=False):
+    return {
+        "filterType": "locale",
+        "includeChildren": include_children,
+        "includeScripts": include_scripts,
+        "includelist": locales,
+    }
+
+
+def select_locales(locales, budget, locale_files, file_sizes, io,
+        include_children=True, include_scripts=False):
+    """
+    Adds the locales in priority order while the output files that a locale
+    filter keeps fit into the budget. Returns the selected locales and a
+    list of LocaleCost, one per locale.
+
+    A locale filter keeps the parents of each locale it selects, so the
+    cost of a locale includes those of its parents that were not selected
+    before. Missing files in file_sizes count as 0 bytes.
+    """
+    selected = []
+    selected_files = set()
+    total = 0
+    costs = []
+    for locale in locales:
+        filter = filtration.LocaleFilter(
+            locale_filter_json([locale], include_children, include_scripts), io)
+        new_files = set()
+        for pairs in locale_files.values():
+            mask = filter.match_many([input_file for input_file, _ in pairs])
+            for (_, output_file), matched in zip(pairs, mask):
+                if matched and output_file not in selected_files:
+                    new_files.add(output_file)
+        size = sum(file_sizes.get(file, 0) for file in new_files)
+        if total + size <= budget:
+            selected.append(locale)
+            selected_files |= new_files
+            total += size
+            costs.append(LocaleCost(locale, size, total, True))
+        else:
+            costs.append(LocaleCost(locale, size, total, False))
+    return selected, costs
+
+
+def read_languages(args):
+    languages = list(args.languages)
+    if args.languages_file:
+        with pyio.open(args.languages_file, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if line and not line.startswith("#"):
+                    languages.append(line)
+    return languages
+
+
+def main(argv):
+    args = flag_parser.parse_args(argv)
+    languages = read_languages(args)
+    if not languages:
+        print("Error: No languages given", file=sys.stderr)
+        return 1
+
+    # The requests of an unfiltered build, with the categories of the
+    # base filter file
+    build_argv = ["--mode=explain", "--src_dir", args.src_dir]
+    if args.base_filter_file:
+        build_argv += ["--filter_file", args.base_filter_file]
+    build_args = get_config_args(build_flag_parser.parse_args(build_argv))[0]
+    io = IO(args.src_dir)
+    config, requests, _, _ = generate_requests(
+        build_args, io, load_buildrules(args.src_dir), Tracer(enabled = False))
+
+    locale_files = get_locale_files(requests, config)
+    output_files = [
+        output_file
+        for pairs in locale_files.values()
+        for _, output_file in pairs
+    ]
+    file_sizes, missing_files = get_file_sizes(args.sizes_from, output_files)
+    if missing_files:
+        print("Warning: %d of %d locale files are not in %s and count as 0 bytes" % (
+            len(missing_files), len(output_files), args.sizes_from), file=sys.stderr)
+    all_locales = set(
+        filtration.Filter._file_to_file_stem(input_file)
+        for pairs in locale_files.values()
+        for input_file, _ in pairs
+    )
+    for language in languages:
+        if language not in all_locales:
+            print("Warning: %s is not a locale of any tree" % language, file=sys.stderr)
+
+    include_children = not args.exclude_children
+    selected, costs = select_locales(
+        languages, args.budget, locale_files, file_sizes, io,
+        include_children, args.include_scripts)
+    for cost in costs:
+        print("%s %-12s %10d bytes, total %d" % (
+            "+" if cost.selected else "-", cost.locale, cost.size, cost.total), file=sys.stderr)
+    print("Selected %d of %d languages, %d of %d bytes" % (
+        len(selected), len(languages), costs[-1].total, args.budget), file=sys.stderr)
+
+    # Comments of the base filter file are not kept.
+    json_data = {}
+    if args.base_filter_file:
+        with pyio.open(args.base_filter_file, "r", encoding="utf-8") as f:
+            json_data = json.load(CommentStripper(f))
+    json_data["localeFilter"] = locale_filter_json(selected, include_children, args.include_scripts)
+    output = json.dumps(json_data, indent = 2, sort_keys = True) + "\n"
+    if args.output:
+        with pyio.open(args.output, "w", encoding="utf-8") as f:
+            f.write(output)
+    else:
+        sys.stdout.write(output)
+    return 0
+
+if __name__ == "__main__":
+    exit(main(sys.argv[1:]))
@@ -0,0 +1,407 @@
+# Copyright (C) 2018 and later: Unicode, Inc. and others.
+# License & terms of use: http://www.unicode.org/copyright.html
+
+"""
+Generates the requests of one filter file from BUILDRULES.py, and the I/O
+operations and arguments that this needs. This is shared by the data build
+tool and the tools built on top of it, such as locale_budget.
+"""
+
+# Python 2/3 Compatibility (ICU-20299)
+# TODO(ICU-20301): Remove this.
+from __future__ import print_function
+
+import copy
+import glob as pyglob
+import hashlib
+import io as pyio
+import json
+import multiprocessing
+import os
+import pickle
+import sys
+
+from . import *
+from .comment_stripper import CommentStripper
+from .request_types import CopyRequest
+from . import filtration
+from .renderers import common_exec
+
+EXEC_MODES = ["unix-exec", "windows-exec", "bazel-exec"]
+
+
+class Config(object):
+
+    def __init__(self, args, io):
+        self.io = io
+
+        # Process arguments
+        self.max_parallel = (args.seqmode == "parallel")
+
+        # Number of commands to split sequential requests into, or None
+        self.num_shards = None
+        if args.seqmode == "sharded":
+            # The number of CPUs is known only where the commands run, so
+            # Makefiles and other build files need an explicit shard count.
+            if args.mode not in EXEC_MODES:
+                print("Error: --seqmode=sharded needs a shard count in %s mode, such as sharded:8." % args.mode, file=sys.stderr)
+                exit(1)
+            self.num_shards = multiprocessing.cpu_count()
+        elif args.seqmode.startswith("sharded:"):
+            self.num_shards = int(args.seqmode[8:])
+
+        # Boolean: Whether to include core Unicode data files in the .dat file
+        self.include_uni_core_data = args.include_uni_core_data
+
+        # Default fields before processing filter file
+        self.filters_json_data = {}
+        self.filter_dir = "ERROR_NO_FILTER_FILE"
+
+        # Process filter file
+        if args.filter_file:
+            try:
+                with open(args.filter_file, "r") as f:
+                    print("Note: Applying filters from %s." % args.filter_file, file=sys.stderr)
+                    self._parse_filter_file(f)
+            except IOError:
+                print("Error: Could not read filter file %s." % args.filter_file, file=sys.stderr)
+                exit(1)
+            self.filter_dir = os.path.abspath(os.path.dirname(args.filter_file))
+
+        # Either "unihan" or "implicithan"
+        self.coll_han_type = "unihan"
+        if "collationUCAData" in self.filters_json_data:
+            self.coll_han_type = self.filters_json_data["collationUCAData"]
+
+        # Either "additive" or "subtractive"
+        self.strategy = "subtractive"
+        if "strategy" in self.filters_json_data:
+            self.strategy = self.filters_json_data["strategy"]
+
+        # True or False (could be extended later to support enum/list)
+        self.use_pool_bundle = True
+        if "usePoolBundle" in self.filters_json_data:
+            self.use_pool_bundle = self.filters_json_data["usePoolBundle"]
+
+    def _parse_filter_file(self, f):
+        # Use the Hjson parser if it is available; otherwise, use vanilla JSON.
+        try:
+            import hjson
+            self.filters_json_data = hjson.load(f)
+        except ImportError:
+            self.filters_json_data = json.load(CommentStripper(f))
+
+        # Optionally pre-validate the JSON schema before further processing.
+        # Some schema errors will be caught later, but this step ensures
+        # maximal validity.
+        try:
+            import jsonschema
+            schema_path = os.path.join(os.path.dirname(__file__), "filtration_schema.json")
+            with open(schema_path) as schema_f:
+                schema = json.load(CommentStripper(schema_f))
+            validator = jsonschema.Draft4Validator(schema)
+            for error in validator.iter_errors(self.filters_json_data, schema):
+                print("WARNING: ICU data filter JSON file:", error.message,
+                    "at", "".join(
+                        "[%d]" % part if isinstance(part, int) else ".%s" % part
+                        for part in error.absolute_path
+                    ),
+                    file=sys.stderr)
+        except ImportError:
+            print("Tip: to validate your filter file, install the Pip package 'jsonschema'", file=sys.stderr)
+            pass
+
+
+def add_copy_input_requests(requests, config, common_vars):
+    files_to_copy = set()
+    for request in requests:
+        request_files = request.all_input_files()
+        # Also add known dependency txt files as possible inputs.
+        # This is required for translit rule files.
+        if hasattr(request, "dep_targets"):
+            request_files += [
+                f for f in request.dep_targets if isinstance(f, InFile)
+            ]
+        for f in request_files:
+            if isinstance(f, InFile):
+                files_to_copy.add(f)
+
+    result = []
+    id = 0
+
+    json_data = config.filters_json_data["fileReplacements"]
+    dirname = json_data["directory"]
+    for directive in json_data["replacements"]:
+        if type(directive) == str:
+            input_file = LocalFile(dirname, directive)
+            output_file = InFile(directive)
+        else:
+            input_file = LocalFile(dirname, directive["src"])
+            output_file = InFile(directive["dest"])
+        result += [
+            CopyRequest(
+                name = "input_copy_%d" % id,
+                input_file = input_file,
+                output_file = output_file
+            )
+        ]
+        files_to_copy.remove(output_file)
+        id += 1
+
+    # Only the replaced files need to be written to the new IN_DIR; with
+    # "unreplacedFiles": "symlink", the other files are symbolic links to
+    # the originals instead of copies.
+    symlink = json_data.get("unreplacedFiles", "copy") == "symlink"
+    for f in files_to_copy:
+        result += [
+            CopyRequest(
+                name = "input_copy_%d" % id,
+                input_file = SrcFile(f.filename),
+                output_file = f,
+                symlink = symlink
+            )
+        ]
+        id += 1
+
+    result += requests
+    return result
+
+
+class IO(object):
+    """I/O operations required when computing the build actions"""
+
+    # The modification time and size, SHA-1 digest, and parsed content of
+    # files by kind ("json" or "resource_keys") and absolute path, shared by
+    # all IO objects in the process, such as those of several filter files.
+    # An entry is used only while the file has the same modification time
+    # and size; each IO object checks this once, on its first read of the
+    # file. Callers must not modify the returned data.
+    _parsed_cache = {}
+
+    # Functions that parse the text of a file, by kind
+    _PARSERS = {
+        "json": lambda text: json.load(CommentStripper(pyio.StringIO(text))),
+        "resource_keys": filtration.get_resource_keys,
+    }
+
+    def __init__(self, src_dir, cache_dir=None):
+        self.src_dir = src_dir
+        self.cache_dir = cache_dir
+        # The result of every operation, keyed by (method name, argument), so
+        # that a cached plan can be checked against the current files. Parsed
+        # files are recorded by the digest of their content.
+        self.dependencies = {}
+        # The keys of the entries of _parsed_cache checked by this object
+        self._checked = set()
+
+    def glob(self, pattern):
+        result = self._glob(pattern)
+        self.dependencies[("glob", pattern)] = result
+        return result
+
+    def _glob(self, pattern):
+        absolute_paths = pyglob.glob(os.path.join(self.src_dir, pattern))
+        # Strip off the absolute path suffix so we are left with a relative path.
+        relative_paths = [v[len(self.src_dir)+1:] for v in sorted(absolute_paths)]
+        # For the purposes of icutools.databuilder, force Unix-style directory separators.
+        # Within the Python code, including BUILDRULES.py and user-provided config files,
+        # directory separators are normalized to '/', including on Windows platforms.
+        return [v.replace("\\", "/") for v in relative_paths]
+
+    def file_size(self, filename):
+        """Returns the size of a file in src_dir, or 0 if it does not exist."""
+        result = self._file_size(filename)
+        self.dependencies[("file_size", filename)] = result
+        return result
+
+    def _file_size(self, filename):
+        try:
+            return os.path.getsize(os.path.join(self.src_dir, filename))
+        except OSError:
+            return 0
+
+    def read_locale_deps(self, tree):
+        return self._read_parsed("json", "%s/LOCALE_DEPS.json" % tree)
+
+    def read_resource_keys(self, filename):
+        """
+        Returns the keys of the top-level resources in a resource bundle
+        text file in src_dir, or None if it is not a resource bundle.
+        """
+        return self._read_parsed("resource_keys", filename)
+
+    def dependencies_unchanged(self, dependencies):
+        """Returns whether the recorded operations still give the same results."""
+        for (method, argument), value in dependencies.items():
+            if method == "glob":
+                current = self._glob(argument)
+            elif method == "file_size":
+                current = self._file_size(argument)
+            else:
+                assert method in IO._PARSERS
+                current = self._file_digest(argument)
+            if current != value:
+                return False
+        return True
+
+    def _file_digest(self, filename):
+        path = os.path.abspath(os.path.join(self.src_dir, filename))
+        try:
+            with open(path, "rb") as f:
+                return hashlib.sha1(f.read()).hexdigest()
+        except (IOError, OSError):
+            return None
+
+    def _read_parsed(self, kind, filename):
+        key = (kind, os.path.abspath(os.path.join(self.src_dir, filename)))
+        if key not in self._checked:
+            try:
+                st = os.stat(key[1])
+                stamp = (st.st_mtime, st.st_size)
+                cached = IO._parsed_cache.get(key)
+                if cached is None or cached[0] != stamp:
+                    IO._parsed_cache[key] = (stamp,) + self._load_parsed(kind, key[1])
+            except (IOError, OSError):
+                # A file that appears later must invalidate cached plans.
+                self.dependencies[(kind, filename)] = None
+                raise
+            self._checked.add(key)
+        _, digest, data = IO._parsed_cache[key]
+        self.dependencies[(kind, filename)] = digest
+        return data
+
+    def _load_parsed(self, kind, path):
+        """Returns the SHA-1 digest and the parsed content of a file."""
+        with open(path, "rb") as f:
+            raw = f.read()
+        digest = hashlib.sha1(raw).hexdigest()
+        # The on-disk cache is keyed by the hash of the file content, so
+        # that it does not need to be invalidated.
+        cache_path = None
+        if self.cache_dir:
+            cache_path = os.path.join(self.cache_dir, kind, "%s.pickle" % digest)
+            data = read_pickle(cache_path)
+            if data is not None:
+                return digest, data
+        data = IO._PARSERS[kind](raw.decode("utf-8-sig"))
+        # None means that the file could not be parsed; it is not cached.
+        if cache_path and data is not None:
+            write_pickle(cache_path, data)
+        return digest, data
+
+
+def read_pickle(path):
+    """Returns the data in a file written by write_pickle, or None."""
+    try:
+        with open(path, "rb") as f:
+            return pickle.load(f)
+    except (IOError, OSError, EOFError, AttributeError, ImportError, pickle.UnpicklingError):
+        return None
+
+
+def write_pickle(path, data):
+    """Writes data to path atomically, ignoring errors."""
+    try:
+        common_exec.makedirs(os.path.dirname(path))
+        tmp_path = "%s.%d.tmp" % (path, os.getpid())
+        with open(tmp_path, "wb") as f:
+            pickle.dump(data, f, 2)
+        os.rename(tmp_path, path)
+    except (IOError, OSError) as e:
+        print("Warning: Could not write cache file %s: %s" % (path, e), file=sys.stderr)
+
+
+def get_config_args(args):
+    """
+    Returns a copy of args for each filter file, in which filter_file,
+    out_dir, and tmp_dir are single values instead of lists.
+
+    Raises ValueError if the arguments do not fit together.
+    """
+    filter_files = args.filter_file or [None]
+    if len(filter_files) > 1 and args.mode not in EXEC_MODES:
+        raise ValueError("Several --filter_file arguments are supported only in exec modes")
+    names = [
+        os.path.splitext(os.path.basename(filter_file))[0]
+        for filter_file in filter_files
+        if filter_file is not None
+    ]
+    dirs_by_attr = {}
+    for attr, default in (("out_dir", "icudata"), ("tmp_dir", "icutmp")):
+        dirs = getattr(args, attr) or [default]
+        if len(filter_files) > 1 and len(dirs) == 1:
+            if len(set(names)) != len(names):
+                raise ValueError("Filter files need different names to share --%s" % attr)
+            dirs = [os.path.join(dirs[0], name) for name in names]
+        if len(dirs) != len(filter_files):
+            raise ValueError("Expected 1 or %d --%s arguments, got %d" % (
+                len(filter_files), attr, len(dirs)))
+        dirs_by_attr[attr] = dirs
+    all_dirs = dirs_by_attr["out_dir"] + dirs_by_attr["tmp_dir"]
+    if len(filter_files) > 1 and len(set(all_dirs)) != len(all_dirs):
+        raise ValueError("Each filter file needs its own --out_dir and --tmp_dir")
+
+    result = []
+    for i, filter_file in enumerate(filter_files):
+        config_args = copy.copy(args)
+        config_args.filter_file = filter_file
+        config_args.out_dir = dirs_by_attr["out_dir"][i]
+        config_args.tmp_dir = dirs_by_attr["tmp_dir"][i]
+        result.append(config_args)
+    return result
+
+
+def load_buildrules(src_dir):
+    # Automatically load BUILDRULES from the src_dir
+    sys.path.append(src_dir)
+    try:
+        import BUILDRULES
+    except ImportError:
+        print("Cannot find BUILDRULES! Did you set your --src_dir?", file=sys.stderr)
+        sys.exit(1)
+    return BUILDRULES
+
+
+def generate_requests(args, io, BUILDRULES, tracer):
+    """Returns the config, unfiltered requests, makefile_vars, and common_vars for one filter file."""
+    config = Config(args, io)
+
+    if args.mode == "gnumake":
+        makefile_vars = {
+            "SRC_DIR": "$(srcdir)",
+            "IN_DIR": "$(srcdir)",
+            "INDEX_NAME": "res_index"
+        }
+        makefile_env = ["ICUDATA_CHAR", "OUT_DIR", "TMP_DIR", "LIBRARY_DATA_DIR"]
+        common = {
+            key: "$(%s)" % key
+            for key in list(makefile_vars.keys()) + makefile_env
+        }
+        common["FILTERS_DIR"] = config.filter_dir
+        common["CWD_DIR"] = os.getcwd()
+    else:
+        makefile_vars = None
+        common = {
+            "SRC_DIR": args.src_dir,
+            "IN_DIR": args.src_dir,
+            "OUT_DIR": args.out_dir,
+            "TMP_DIR": args.tmp_dir,
+            "FILTERS_DIR": config.filter_dir,
+            "CWD_DIR": os.getcwd(),
+            "INDEX_NAME": "res_index",
+            # TODO: Pull this from configure script:
+            "ICUDATA_CHAR": "l",
+            "LIBRARY_DATA_DIR": os.path.join(args.out_dir, "build"),
+        }
+
+    with tracer.span("BUILDRULES.generate", "planning"):
+        requests = BUILDRULES.generate(config, io, common)
+
+    if "fileReplacements" in config.filters_json_data:
+        tmp_in_dir = "{TMP_DIR}/in".format(**common)
+        if makefile_vars:
+            makefile_vars["IN_DIR"] = tmp_in_dir
+        else:
+            common["IN_DIR"] = tmp_in_dir
+        requests = add_copy_input_requests(requests, config, common)
+    return config, requests, makefile_vars, common
@@ -5,6 +5,36 @@ from collections import namedtuple
 
 MakeRule = namedtuple("MakeRule", ["name", "dep_literals", "dep_files", "output_file", "cmds"])
 
+# A GNU make static pattern rule: "targets: target_pattern: dep_patterns"
+MakePatternRule = namedtuple("MakePatternRule", ["name", "targets", "target_pattern", "dep_patterns", "dep_literals", "cmds"])
+
 MakeFilesVar = namedtuple("MakeFilesVar", ["name", "files"])
 
 MakeStringVar = namedtuple("MakeStringVar", ["name", "content"])
+
+# A single unit of work in the exec renderers: one PrintFileRequest,
+# CopyRequest, or SingleExecutionRequest, or one iteration of a
+# RepeatedExecutionRequest (in which case loop_vars is set). input_paths and
+# output_paths are the files resolved with common_vars. If shared_from is set,
+# the action is identical to that action of another configuration, and its
+# outputs are copied from there instead of running it again.
+class ExecAction(namedtuple("ExecAction", ["request", "loop_vars", "input_files", "output_files",
+        "common_vars", "input_paths", "output_paths", "shared_from"])):
+    __slots__ = ()
+
+    # The methods below allow ExecActions to be nodes in a RequestGraph.
+
+    @property
+    def name(self):
+        return self.request.name
+
+    def all_input_files(self):
+        if self.shared_from is not None:
+            return self.shared_from.output_paths
+        return self.input_paths
+
+    def all_output_files(self):
+        return self.output_paths
+
+# The requests of one configuration in the exec renderers.
+ExecConfig = namedtuple("ExecConfig", ["build_dirs", "requests", "common_vars"])
@@ -8,21 +8,75 @@ from __future__ import print_function
 from . import *
 from .. import *
 from .. import utils
+from ..action_cache import ActionCache
+from ..copy_strategy import copy_file, symlink_file
+from ..request_graph import RequestGraph
 from ..request_types import *
+from ..resource_report import ResourceReport, ResourceUsage
 
+import errno
+import hashlib
+import io
+import json
 import os
-import shutil
 import subprocess
 import sys
+import tempfile
+import threading
+import time
 
-def run(build_dirs, requests, common_vars, verbose=True, **kwargs):
-    for bd in build_dirs:
-        makedirs(bd.format(**common_vars))
-    for request in requests:
-        status = run_helper(request, common_vars, verbose=verbose, **kwargs)
-        if status != 0:
-            print("!!! ERROR executing above command line: exit code %d" % status)
-            return 1
+def run(build_dirs, requests, common_vars, **kwargs):
+    return run_batch([ExecConfig(build_dirs, requests, common_vars)], **kwargs)
+
+def run_batch(configs, verbose=True, jobs=1, incremental=False, action_cache_dir=None,
+        action_cache_size=None, resource_report_file=None, **kwargs):
+    """
+    Runs the requests of one or more configurations. Actions that are
+    identical in several configurations are run only once; see
+    share_identical_actions().
+
+    Additional state files are kept in the TMP_DIR of the first configuration.
+    """
+    actions = []
+    for config in configs:
+        for bd in config.build_dirs:
+            makedirs(bd.format(**config.common_vars))
+        actions += get_actions(config.requests, config.common_vars)
+    if len(configs) > 1:
+        actions = share_identical_actions(actions, configs, **kwargs)
+        if verbose:
+            num_shared = sum(1 for action in actions if action.shared_from is not None)
+            print("Sharing %d of %d commands between %d configurations" % (
+                num_shared, len(actions), len(configs)))
+    common_vars = configs[0].common_vars
+    state = None
+    if incremental:
+        state = IncrementalState("{TMP_DIR}/exec_state.json".format(**common_vars))
+    cache = None
+    if action_cache_dir:
+        cache = ActionCache(action_cache_dir, action_cache_size)
+    report = None
+    if resource_report_file:
+        report = ResourceReport()
+    if jobs > 1:
+        status = run_parallel(actions, jobs, verbose=verbose, state=state, cache=cache,
+            report=report, **kwargs)
+    else:
+        status = run_sequential(actions, verbose=verbose, state=state, cache=cache,
+            report=report, **kwargs)
+    if state is not None:
+        state.save()
+        if verbose:
+            print("Skipped %d up-to-date commands" % state.num_skipped)
+    if cache is not None:
+        cache.trim()
+        print(cache.stats_string())
+    if report is not None:
+        report.write_json(resource_report_file)
+        print(report.format_text())
+    if status != 0:
+        print("!!! ERROR executing above command line: exit code %d" % status)
+        return 1
     if verbose:
         print("All data build commands executed")
     return 0
@@ -40,86 +94,414 @@ def makedirs(dirs):
             if e.errno != errno.EEXIST:
                 raise e
 
-def run_helper(request, common_vars, platform, tool_dir, verbose, tool_cfg=None, **kwargs):
-    if isinstance(request, PrintFileRequest):
-        output_path = "{DIRNAME}/{FILENAME}".format(
-            DIRNAME = utils.dir_for(request.output_file).format(**common_vars),
-            FILENAME = request.output_file.filename,
-        )
-        if verbose:
-            print("Printing to file: %s" % output_path)
-        with open(output_path, "w") as f:
-            f.write(request.content)
-        return 0
-    if isinstance(request, CopyRequest):
-        input_path = "{DIRNAME}/{FILENAME}".format(
-            DIRNAME = utils.dir_for(request.input_file).format(**common_vars),
-            FILENAME = request.input_file.filename,
-        )
-        output_path = "{DIRNAME}/{FILENAME}".format(
-            DIRNAME = utils.dir_for(request.output_file).format(**common_vars),
-            FILENAME = request.output_file.filename,
-        )
+def get_actions(requests, common_vars):
+    """Splits the requests into ExecActions, one per command to run."""
+    actions = []
+    for request in requests:
+        if isinstance(request, VariableRequest):
+            # No-op
+            continue
+        if isinstance(request, RepeatedExecutionRequest):
+            for loop_vars in utils.repeated_execution_request_looper(request):
+                (_, specific_dep_files, input_file, output_file) = loop_vars
+                actions.append(_make_action(
+                    request,
+                    loop_vars,
+                    request.common_dep_files + specific_dep_files + [input_file],
+                    [output_file],
+                    common_vars
+                ))
+            continue
+        actions.append(_make_action(
+            request,
+            None,
+            request.all_input_files(),
+            request.all_output_files(),
+            common_vars
+        ))
+    return actions
+
+def _make_action(request, loop_vars, input_files, output_files, common_vars):
+    return ExecAction(
+        request = request,
+        loop_vars = loop_vars,
+        input_files = input_files,
+        output_files = output_files,
+        common_vars = common_vars,
+        # Compare files by path, since OutFile and TmpFile with the same
+        # name are equal.
+        input_paths = [file_path(file, common_vars) for file in input_files],
+        output_paths = [file_path(file, common_vars) for file in output_files],
+        shared_from = None
+    )
+
+def get_action_dependencies(actions):
+    """
+    Returns a list parallel to actions. Each entry is the list of indices of
+    the actions producing the input files of the corresponding action.
+    """
+    return RequestGraph(actions).dependency_indices()
+
+def share_identical_actions(actions, configs, platform, tool_dir, tool_cfg=None, **kwargs):
+    """
+    Returns a copy of actions in which each action that is identical to an
+    action of an earlier configuration has shared_from set to that action.
+
+    Two actions are identical if they run the same command, after replacing
+    the directories that differ between the configurations with placeholders,
+    on identical input files. An input file is identical in two
+    configurations if it is the same source file, or if it is the same output
+    of identical actions.
+    """
+    varying_keys = set()
+    for config in configs[1:]:
+        for key, value in config.common_vars.items():
+            if configs[0].common_vars.get(key) != value:
+                varying_keys.add(key)
+    placeholders = {key: "$(%s)" % key for key in varying_keys}
+
+    graph = RequestGraph(actions)
+    result = list(actions)
+    # The identity of each output file, by path
+    file_keys = {}
+    primary_by_key = {}
+    for i in graph.topological_order():
+        action = actions[i]
+        normalized_vars = dict(action.common_vars, **placeholders)
+        normalized = action._replace(common_vars=normalized_vars)
+        request = action.request
+        if isinstance(request, PrintFileRequest):
+            parts = ["print", request.content]
+        elif isinstance(request, CopyRequest):
+            parts = ["symlink" if request.symlink else "copy"]
+        else:
+            parts = ["exec", get_command_line(normalized, platform, tool_dir, tool_cfg)]
+        parts += [file_keys.get(path, "src:%s" % path) for path in action.input_paths]
+        parts += [file_path(file, normalized_vars) for file in action.output_files]
+        key = hashlib.sha1(json.dumps(parts).encode("utf-8")).hexdigest()
+        for file, path in zip(action.output_files, action.output_paths):
+            file_keys[path] = "%s:%s" % (key, file_path(file, normalized_vars))
+
+        primary = primary_by_key.get(key)
+        if primary is None:
+            primary_by_key[key] = action
+        elif primary.common_vars is not action.common_vars:
+            result[i] = action._replace(shared_from=primary)
+    return result
+
+def file_path(file, common_vars):
+    return "{DIRNAME}/{FILENAME}".format(
+        DIRNAME = utils.dir_for(file).format(**common_vars),
+        FILENAME = file.filename,
+    )
+
+def run_sequential(actions, **kwargs):
+    for action in actions:
+        status = run_traced(action, **kwargs)
+        if status != 0:
+            return status
+    return 0
+
+def run_parallel(actions, jobs, tracer=None, **kwargs):
+    """
+    Runs the actions on a pool of worker threads, starting each action once
+    all of the actions producing its input files have finished.
+
+    Output of each action is buffered and printed after the action completes.
+    After the first failure, no new actions are started; actions that are
+    already running are allowed to finish.
+    """
+    graph = RequestGraph(actions)
+    dependents = graph.dependent_indices()
+    pending_deps = [len(d) for d in graph.dependency_indices()]
+    # Keep the original request order among ready actions.
+    ready = [i for i, n in enumerate(pending_deps) if n == 0]
+    ready.reverse()
+    progress = {
+        "running": 0,
+        "remaining": len(actions),
+        "status": 0,
+    }
+    cond = threading.Condition()
+
+    def worker(worker_id):
+        if tracer is not None:
+            tracer.set_thread_name(worker_id, "worker %d" % worker_id)
+        while True:
+            with cond:
+                while not ready and progress["running"] > 0 and progress["status"] == 0:
+                    cond.wait()
+                if not ready or progress["status"] != 0:
+                    cond.notify_all()
+                    return
+                i = ready.pop()
+                progress["running"] += 1
+            out = io.StringIO()
+            try:
+                status = run_traced(actions[i], out=out, tracer=tracer, **kwargs)
+            except Exception as e:
+                print("Error: %s" % e, file=out)
+                status = 1
+            with cond:
+                sys.stdout.write(out.getvalue())
+                sys.stdout.flush()
+                progress["running"] -= 1
+                progress["remaining"] -= 1
+                if status != 0:
+                    if progress["status"] == 0:
+                        progress["status"] = status
+                else:
+                    for j in reversed(dependents[i]):
+                        pending_deps[j] -= 1
+                        if pending_deps[j] == 0:
+                            ready.append(j)
+                cond.notify_all()
+
+    threads = [
+        threading.Thread(target=worker, args=(worker_id + 1,))
+        for worker_id in range(min(jobs, len(actions)))
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    if progress["status"] == 0 and progress["remaining"] > 0:
+        print("Error: %d actions could not be run due to a dependency cycle" % progress["remaining"],
+            file=sys.stderr)
+        return 1
+    return progress["status"]
+
+def run_traced(action, tracer=None, **kwargs):
+    """Calls run_helper, recording a trace event if a tracer is given."""
+    if tracer is None:
+        return run_helper(action, **kwargs)
+    request = action.request
+    name = request.name
+    trace_args = {"request": request.name}
+    if isinstance(request, AbstractExecutionRequest):
+        trace_args["tool"] = request.tool.name
+    if action.loop_vars is not None:
+        input_file = action.loop_vars[2]
+        name = "%s %s" % (request.name, input_file.filename)
+        trace_args["input_file"] = input_file.filename
+    elif len(action.input_files) == 1:
+        trace_args["input_file"] = action.input_files[0].filename
+    if action.shared_from is not None:
+        trace_args["shared"] = True
+    category = request.category or type(request).__name__
+    with tracer.span(name, category, trace_args):
+        return run_helper(action, **kwargs)
+
+def run_helper(action, platform, tool_dir, verbose, tool_cfg=None, out=None, state=None,
+        cache=None, report=None, copy_strategy="auto", **kwargs):
+    request = action.request
+    common_vars = action.common_vars
+    if action.shared_from is not None:
+        signature = "shared:%s" % " ".join(action.shared_from.output_paths)
+    elif isinstance(request, PrintFileRequest):
+        signature = "print:%s" % request.content
+    elif isinstance(request, CopyRequest):
+        signature = "%s:%s" % (
+            "symlink" if request.symlink else "copy",
+            file_path(request.input_file, common_vars))
+    else:
+        command_line = get_command_line(action, platform, tool_dir, tool_cfg)
+        signature = command_line
+
+    input_paths = action.all_input_files()
+    output_paths = action.output_paths
+    if state is not None:
+        if state.is_up_to_date(input_paths, output_paths, signature):
+            return 0
+        # Forget the old signature first, so that partial outputs of a
+        # failed command are not considered up to date in the next run.
+        state.invalidate(output_paths)
+
+    if action.shared_from is not None:
         if verbose:
-            print("Copying file to: %s" % output_path)
-        shutil.copyfile(input_path, output_path)
-        return 0
-    if isinstance(request, VariableRequest):
-        # No-op
-        return 0
-
-    assert isinstance(request.tool, IcuTool)
+            print("Copying shared output files to: %s" % " ".join(output_paths), file=out)
+        for input_path, output_path in zip(input_paths, output_paths):
+            copy_file(input_path, output_path, copy_strategy)
+        returncode = 0
+    elif isinstance(request, PrintFileRequest):
+        output_path = file_path(request.output_file, common_vars)
+        # Leave unchanged files alone, so that their dependents are not
+        # considered out of date.
+        if utils.write_file_if_changed(output_path, request.content):
+            if verbose:
+                print("Printing to file: %s" % output_path, file=out)
+        elif verbose:
+            print("File is unchanged: %s" % output_path, file=out)
+        returncode = 0
+    elif isinstance(request, CopyRequest):
+        input_path = file_path(request.input_file, common_vars)
+        output_path = file_path(request.output_file, common_vars)
+        if request.symlink:
+            if verbose:
+                print("Linking file to: %s" % output_path, file=out)
+            symlink_file(input_path, output_path, copy_strategy)
+        else:
+            if verbose:
+                print("Copying file to: %s" % output_path, file=out)
+            copy_file(input_path, output_path, copy_strategy)
+        returncode = 0
+    else:
+        cache_key = None
+        if cache is not None:
+            cache_key = cache.compute_key(
+                get_tool_path(request.tool, platform, tool_dir, tool_cfg),
+                command_line,
+                input_paths
+            )
+        if cache_key is not None and cache.restore(cache_key, output_paths):
+            if verbose:
+                print("Restored from action cache: %s" % command_line, file=out)
+            returncode = 0
+        else:
+            returncode = run_shell_command(command_line, platform, verbose, out=out,
+                report=report, request=request)
+            if returncode == 0 and cache_key is not None:
+                cache.store(cache_key, output_paths)
+
+    if returncode == 0 and state is not None:
+        state.record(output_paths, signature)
+    return returncode
+
+class IncrementalState(object):
+    """
+    Tracks which command last produced each output file, so that commands
+    can be skipped if their outputs are up to date.
+
+    An action is up to date if all of its output files exist, none of its
+    input files is newer than any of its output files, and the signature
+    (for example, the command line) is the same as in the previous run.
+    """
+
+    VERSION = 1
+
+    def __init__(self, path):
+        self.path = path
+        self.signatures = {}
+        self.num_skipped = 0
+        self._mtimes = {}
+        self._lock = threading.Lock()
+        try:
+            with open(path, "r") as f:
+                json_data = json.load(f)
+            if json_data.get("version") == self.VERSION:
+                self.signatures = json_data["signatures"]
+        except (IOError, OSError, ValueError):
+            pass
+
+    def is_up_to_date(self, input_paths, output_paths, signature):
+        digest = self._digest(signature)
+        with self._lock:
+            for path in output_paths:
+                if self.signatures.get(path) != digest:
+                    return False
+            output_mtimes = [self._mtime(path) for path in output_paths]
+            if None in output_mtimes:
+                return False
+            oldest_output = min(output_mtimes) if output_mtimes else None
+            for path in input_paths:
+                mtime = self._mtime(path)
+                if mtime is None:
+                    return False
+                if oldest_output is not None and mtime > oldest_output:
+                    return False
+            self.num_skipped += 1
+            return True
+
+    def invalidate(self, output_paths):
+        with self._lock:
+            for path in output_paths:
+                self.signatures.pop(path, None)
+                self._mtimes.pop(path, None)
+
+    def record(self, output_paths, signature):
+        digest = self._digest(signature)
+        with self._lock:
+            for path in output_paths:
+                self.signatures[path] = digest
+                self._mtimes.pop(path, None)
+
+    def save(self):
+        with self._lock:
+            with open(self.path, "w") as f:
+                json.dump({
+                    "version": self.VERSION,
+                    "signatures": self.signatures
+                }, f, indent=0, sort_keys=True)
+
+    def _mtime(self, path):
+        if path not in self._mtimes:
+            try:
+                self._mtimes[path] = os.stat(path).st_mtime
+            except OSError:
+                self._mtimes[path] = None
+        return self._mtimes[path]
+
+    @staticmethod
+    def _digest(signature):
+        return hashlib.sha1(signature.encode("utf-8")).hexdigest()
+
+def get_tool_path(tool, platform, tool_dir, tool_cfg=None):
+    assert isinstance(tool, IcuTool)
     if platform == "windows":
-        cmd_template = "{TOOL_DIR}/{TOOL}/{TOOL_CFG}/{TOOL}.exe {{ARGS}}".format(
+        return "{TOOL_DIR}/{TOOL}/{TOOL_CFG}/{TOOL}.exe".format(
             TOOL_DIR = tool_dir,
             TOOL_CFG = tool_cfg,
-            TOOL = request.tool.name,
-            **common_vars
+            TOOL = tool.name
         )
     elif platform == "unix":
-        cmd_template = "{TOOL_DIR}/{TOOL} {{ARGS}}".format(
+        return "{TOOL_DIR}/{TOOL}".format(
             TOOL_DIR = tool_dir,
-            TOOL = request.tool.name,
-            **common_vars
+            TOOL = tool.name
         )
     elif platform == "bazel":
-        cmd_template = "{TOOL_DIR}/{TOOL}/{TOOL} {{ARGS}}".format(
+        return "{TOOL_DIR}/{TOOL}/{TOOL}".format(
             TOOL_DIR = tool_dir,
-            TOOL = request.tool.name,
-            **common_vars
+            TOOL = tool.name
         )
     else:
         raise ValueError("Unknown platform: %s" % platform)
 
+def get_command_line(action, platform, tool_dir, tool_cfg=None):
+    request = action.request
+    common_vars = action.common_vars
+    # Escape braces in the tool path, since the template is formatted again.
+    cmd_template = "%s {ARGS}" % get_tool_path(
+        request.tool, platform, tool_dir, tool_cfg
+    ).replace("{", "{{").replace("}", "}}")
+
     if isinstance(request, RepeatedExecutionRequest):
-        for loop_vars in utils.repeated_execution_request_looper(request):
-            command_line = utils.format_repeated_request_command(
-                request,
-                cmd_template,
-                loop_vars,
-                common_vars
-            )
-            if platform == "windows":
-                # Note: this / to \ substitution may be too aggressive?
-                command_line = command_line.replace("/", "\\")
-            returncode = run_shell_command(command_line, platform, verbose)
-            if returncode != 0:
-                return returncode
-        return 0
-    if isinstance(request, SingleExecutionRequest):
+        command_line = utils.format_repeated_request_command(
+            request,
+            cmd_template,
+            action.loop_vars,
+            common_vars
+        )
+    elif isinstance(request, SingleExecutionRequest):
         command_line = utils.format_single_request_command(
             request,
             cmd_template,
             common_vars
         )
-        if platform == "windows":
-            # Note: this / to \ substitution may be too aggressive?
-            command_line = command_line.replace("/", "\\")
-        returncode = run_shell_command(command_line, platform, verbose)
-        return returncode
-    assert False
-
-def run_shell_command(command_line, platform, verbose):
+    else:
+        assert False
+    if platform == "windows":
+        # Note: this / to \ substitution may be too aggressive?
+        command_line = command_line.replace("/", "\\")
+    return command_line
+
+def run_shell_command(command_line, platform, verbose, out=None, report=None, request=None):
+    """
+    Runs the command line in a shell and returns its exit code.
+
+    If out is given, the output of the command is captured and written to
+    out instead of going directly to standard out. If report is given, the
+    resource usage of the command is added to it.
+    """
     changed_windows_comspec = False
     # If the command line length on Windows exceeds the absolute maximum that CMD supports (8191), then
     # we temporarily switch over to use PowerShell for the command, and then switch back to CMD.
@@ -130,26 +512,69 @@ def run_shell_command(command_line, platform, verbose):
         # For example:  C:\WINDOWS\system32\cmd.exe /c "<command_line>"
         if ((len(previous_comspec) + len(command_line) + 7) > 8190):
             if verbose:
-                print("Command length exceeds the max length for CMD on Windows, using PowerShell instead.")
+                print("Command length exceeds the max length for CMD on Windows, using PowerShell instead.", file=out)
             os.environ["COMSPEC"] = 'powershell'
             changed_windows_comspec = True
     if verbose:
-        print("Running: %s" % command_line)
-        returncode = subprocess.call(
-            command_line,
-            shell = True
-        )
+        print("Running: %s" % command_line, file=out)
+    if verbose and out is not None:
+        with tempfile.TemporaryFile() as output:
+            returncode, resource_usage = call_shell_command(command_line, output)
+            output.seek(0)
+            out.write(output.read().decode("utf-8", "replace"))
+    elif verbose:
+        returncode, resource_usage = call_shell_command(command_line, None)
     else:
         # Pipe output to /dev/null in quiet mode
         with open(os.devnull, "w") as devnull:
-            returncode = subprocess.call(
-                command_line,
-                shell = True,
-                stdout = devnull,
-                stderr = devnull
-            )
+            returncode, resource_usage = call_shell_command(command_line, devnull)
+    if report is not None:
+        report.add(request, command_line, resource_usage)
     if changed_windows_comspec:
         os.environ["COMSPEC"] = previous_comspec
     if returncode != 0:
-        print("Command failed: %s" % command_line, file=sys.stderr)
+        # With --jobs, keep the message with the buffered output of the
+        # command instead of interleaving it with other commands.
+        print("Command failed: %s" % command_line, file=sys.stderr if out is None else out)
     return returncode
+
+def call_shell_command(command_line, stdout):
+    """
+    Runs the command line in a shell, sending both standard out and standard
+    error to stdout unless it is None. Returns the exit code and the
+    ResourceUsage of the command.
+    """
+    start_time = time.time()
+    proc = subprocess.Popen(
+        command_line,
+        shell = True,
+        stdout = stdout,
+        stderr = None if stdout is None else subprocess.STDOUT
+    )
+    if hasattr(os, "wait4"):
+        # Unlike Popen.wait(), wait4() also returns the CPU time and peak
+        # memory of the child, including the tool run by the shell.
+        _, status, rusage = os.wait4(proc.pid, 0)
+        if os.WIFSIGNALED(status):
+            proc.returncode = -os.WTERMSIG(status)
+        else:
+            proc.returncode = os.WEXITSTATUS(status)
+        max_rss = rusage.ru_maxrss
+        if sys.platform == "darwin":
+            # macOS reports bytes instead of kilobytes
+            max_rss //= 1024
+        resource_usage = ResourceUsage(
+            wall_time = time.time() - start_time,
+            user_time = rusage.ru_utime,
+            sys_time = rusage.ru_stime,
+            max_rss = max_rss
+        )
+    else:
+        proc.wait()
+        resource_usage = ResourceUsage(
+            wall_time = time.time() - start_time,
+            user_time = None,
+            sys_time = None,
+            max_rss = None
+        )
+    return proc.returncode, resource_usage
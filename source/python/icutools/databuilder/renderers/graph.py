@@ -0,0 +1,193 @@
+# Copyright (C) 2018 and later: Unicode, Inc. and others.
+# License & terms of use: http://www.unicode.org/copyright.html
+
+# Python 2/3 Compatibility (ICU-20299)
+# TODO(ICU-20301): Remove this.
+from __future__ import print_function
+
+from . import *
+from .. import *
+from .. import utils
+from ..request_types import *
+from .common_exec import file_path, get_action_dependencies, get_actions, get_command_line
+
+import json
+import os
+import shlex
+
+# The version of the graph format. Increase it when the meaning of an
+# existing field changes; readers reject versions they do not know.
+GRAPH_VERSION = 1
+
+GRAPH_FORMATS = ["json", "jsonl"]
+
+def get_graph_nodes(requests, common_vars, tool_dir):
+    """
+    Returns a list of JSON-compatible dicts, one per command to run and one
+    per VariableRequest, which only names a list of files for the Makefile.
+    Each node has an "id", its index in the list, and lists the ids of the
+    nodes that produce its input files in "deps", so the list is in
+    dependency order only if the requests were.
+    """
+    # Each node is either the index of an action or a VariableRequest.
+    actions = []
+    positions = []
+    for request in requests:
+        if isinstance(request, VariableRequest):
+            positions.append(request)
+            continue
+        for action in get_actions([request], common_vars):
+            positions.append(len(actions))
+            actions.append(action)
+    dependencies = get_action_dependencies(actions)
+    node_ids = [
+        i for i, position in enumerate(positions)
+        if not isinstance(position, VariableRequest)
+    ]
+    producers = {
+        path: node_ids[i]
+        for i, action in enumerate(actions)
+        for path in action.output_paths
+    }
+
+    nodes = []
+    for i, position in enumerate(positions):
+        if isinstance(position, VariableRequest):
+            inputs = [file_path(file, common_vars) for file in position.input_files]
+            nodes.append({
+                "id": i,
+                "name": position.name,
+                "category": position.category,
+                "type": "variable",
+                "inputs": inputs,
+                "outputs": [],
+                "deps": sorted(set(producers[path] for path in inputs if path in producers)),
+            })
+            continue
+        action = actions[position]
+        request = action.request
+        node = {
+            "id": i,
+            "name": _action_name(action),
+            "category": request.category,
+            "inputs": action.input_paths,
+            "outputs": action.output_paths,
+            "deps": [node_ids[j] for j in dependencies[position]],
+        }
+        if isinstance(request, PrintFileRequest):
+            node["type"] = "print"
+            node["content"] = request.content
+        elif isinstance(request, CopyRequest):
+            node["type"] = "copy"
+            node["symlink"] = request.symlink
+        else:
+            node["type"] = "exec"
+            node["tool"] = request.tool.name
+            node["args"] = _format_args(action)
+            node["argv"] = shlex.split(get_command_line(action, "unix", tool_dir))
+        nodes.append(node)
+    return nodes
+
+def write_graph(out, requests, common_vars, tool_dir, graph_format="json", **kwargs):
+    """
+    Writes the graph of the requests to the file-like object out.
+
+    In "json" format, the graph is one object with the header fields and a
+    "nodes" list. In "jsonl" format, the first line is the header and each
+    following line is one node.
+    """
+    header = {
+        "version": GRAPH_VERSION,
+        "common_vars": common_vars,
+    }
+    nodes = get_graph_nodes(requests, common_vars, tool_dir)
+    if graph_format == "jsonl":
+        out.write(json.dumps(header, sort_keys = True))
+        out.write("\n")
+        for node in nodes:
+            out.write(json.dumps(node, sort_keys = True))
+            out.write("\n")
+    else:
+        header["nodes"] = nodes
+        json.dump(header, out, indent = 2, sort_keys = True)
+        out.write("\n")
+
+def read_graph(f):
+    """
+    Reads a graph in either format from the file-like object f and returns
+    the requests and common_vars that it was written with. The requests are
+    flat, so they can be passed to any renderer. Raises ValueError if the
+    file is not a graph of a known version.
+    """
+    first_line = f.readline()
+    try:
+        header = json.loads(first_line)
+    except ValueError:
+        # Not JSON Lines: the whole file is one object
+        header = json.loads(first_line + f.read())
+    if "nodes" in header:
+        nodes = header["nodes"]
+    else:
+        nodes = [json.loads(line) for line in f if line.strip()]
+    if header.get("version") != GRAPH_VERSION:
+        raise ValueError("Unsupported graph version: %s" % header.get("version"))
+    common_vars = dict(header["common_vars"])
+    # Relative paths are relative to the current directory.
+    common_vars["CWD_DIR"] = os.getcwd()
+    return [_node_to_request(node) for node in nodes], common_vars
+
+def _action_name(action):
+    if action.loop_vars is None:
+        return action.name
+    input_file = action.loop_vars[2]
+    # Like the rule names in the Makefile
+    name_suffix = input_file.filename[input_file.filename.rfind("/")+1:input_file.filename.rfind(".")]
+    return "%s_%s" % (action.name, name_suffix)
+
+def _format_args(action):
+    if action.loop_vars is not None:
+        return utils.format_repeated_request_command(
+            action.request, "{ARGS}", action.loop_vars, action.common_vars)
+    return utils.format_single_request_command(action.request, "{ARGS}", action.common_vars)
+
+def _path_to_file(path):
+    dirname, filename = os.path.split(path)
+    if not os.path.isabs(dirname):
+        dirname = "$CWD/%s" % dirname if dirname else "$CWD"
+    return LocalFile(dirname, filename)
+
+def _node_to_request(node):
+    kwargs = {
+        "name": node["name"],
+        "category": node.get("category"),
+    }
+    if node["type"] == "print":
+        return PrintFileRequest(
+            output_file = _path_to_file(node["outputs"][0]),
+            content = node["content"],
+            **kwargs
+        )
+    if node["type"] == "copy":
+        return CopyRequest(
+            input_file = _path_to_file(node["inputs"][0]),
+            output_file = _path_to_file(node["outputs"][0]),
+            symlink = node.get("symlink", False),
+            **kwargs
+        )
+    if node["type"] == "variable":
+        return VariableRequest(
+            input_files = [_path_to_file(path) for path in node["inputs"]],
+            **kwargs
+        )
+    if node["type"] == "exec":
+        return SingleExecutionRequest(
+            dep_targets = [],
+            input_files = [_path_to_file(path) for path in node["inputs"]],
+            output_files = [_path_to_file(path) for path in node["outputs"]],
+            tool = IcuTool(node["tool"]),
+            # The arguments are already formatted.
+            args = node["args"].replace("{", "{{").replace("}", "}}"),
+            format_with = {},
+            **kwargs
+        )
+    raise ValueError("Unknown node type: %s" % node["type"])
@@ -8,73 +8,127 @@ from __future__ import print_function
 from . import *
 from .. import *
 from .. import utils
+from ..copy_strategy import shell_copy_command
 from ..request_types import *
+from .common_exec import makedirs
+
+import io
+import os
+import re
 
 def get_gnumake_rules(build_dirs, requests, makefile_vars, **kwargs):
-    makefile_string = ""
+    """Returns the content of a Makefile for the requests as a string."""
+    out = io.StringIO()
+    write_gnumake_rules(out, build_dirs, requests, makefile_vars, **kwargs)
+    return out.getvalue()
+
+def write_gnumake_rules(out, build_dirs, requests, makefile_vars, string_vars="export",
+        content_dir=None, **kwargs):
+    """
+    Writes a Makefile for the requests to the file-like object out, one rule
+    at a time, so that the whole Makefile is never held in memory.
+
+    The content of PrintFileRequests is put into the Makefile as variables,
+    which are exported to the environment of the recipes if string_vars is
+    "export", or written with the $(file) function of GNU make 4.0 if it is
+    "file". The recipes of "export" write the content with echo, which
+    interprets backslash escapes in some shells, such as dash; $(file)
+    writes it as it is. If content_dir is set, the content is written to
+    files in that directory right away instead, and the recipes copy them
+    into place; this does not apply to content that refers to Makefile
+    variables.
+    """
+    if content_dir is not None:
+        # The Makefile may be run from a different directory
+        content_dir = os.path.abspath(content_dir)
+        makedirs(content_dir)
+    # Directory prefixes by file type, shared by all rules
+    kwargs["dir_cache"] = {}
 
     # Common Variables
     common_vars = kwargs["common_vars"]
     for key, value in sorted(makefile_vars.items()):
-        makefile_string += "{KEY} = {VALUE}\n".format(
+        out.write("{KEY} = {VALUE}\n".format(
             KEY = key,
             VALUE = value
-        )
-    makefile_string += "\n"
+        ))
+    out.write("\n")
 
     # Directories
     dirs_timestamp_file = "{TMP_DIR}/dirs.timestamp".format(**common_vars)
-    makefile_string += "DIRS = {TIMESTAMP_FILE}\n\n".format(
+    out.write("DIRS = {TIMESTAMP_FILE}\n\n".format(
         TIMESTAMP_FILE = dirs_timestamp_file
-    )
-    makefile_string += "{TIMESTAMP_FILE}:\n\t$(MKINSTALLDIRS) {ALL_DIRS}\n\techo timestamp > {TIMESTAMP_FILE}\n\n".format(
+    ))
+    out.write("{TIMESTAMP_FILE}:\n\t$(MKINSTALLDIRS) {ALL_DIRS}\n\techo timestamp > {TIMESTAMP_FILE}\n\n".format(
         TIMESTAMP_FILE = dirs_timestamp_file,
         ALL_DIRS = " ".join(build_dirs).format(**common_vars)
-    )
+    ))
 
-    # Generate Rules
-    make_rules = []
+    # Main Commands
     for request in requests:
-        make_rules += get_gnumake_rules_helper(request, **kwargs)
+        for rule in get_gnumake_rules_helper(request, string_vars=string_vars,
+                content_dir=content_dir, **kwargs):
+            write_rule(out, rule, string_vars, **kwargs)
 
-    # Main Commands
-    for rule in make_rules:
-        if isinstance(rule, MakeFilesVar):
-            makefile_string += "{NAME} = {FILE_LIST}\n\n".format(
-                NAME = rule.name,
-                FILE_LIST = files_to_makefile(rule.files, wrap = True, **kwargs),
-            )
-            continue
+def write_rule(out, rule, string_vars, **kwargs):
+    if isinstance(rule, MakeFilesVar):
+        out.write("{NAME} = {FILE_LIST}\n\n".format(
+            NAME = rule.name,
+            FILE_LIST = files_to_makefile(rule.files, wrap = True, **kwargs),
+        ))
+        return
 
-        if isinstance(rule, MakeStringVar):
-            makefile_string += "define {NAME}\n{CONTENT}\nendef\nexport {NAME}\n\n".format(
-                NAME = rule.name,
-                CONTENT = rule.content
-            )
-            continue
+    if isinstance(rule, MakeStringVar):
+        out.write("define {NAME}\n{CONTENT}\nendef\n".format(
+            NAME = rule.name,
+            CONTENT = rule.content
+        ))
+        if string_vars == "export":
+            out.write("export {NAME}\n".format(NAME = rule.name))
+        out.write("\n")
+        return
 
-        assert isinstance(rule, MakeRule)
-        header_line = "{OUT_FILE}: {DEP_FILES} {DEP_LITERALS} | $(DIRS)".format(
-            OUT_FILE = files_to_makefile([rule.output_file], **kwargs),
-            DEP_FILES = files_to_makefile(rule.dep_files, wrap = True, **kwargs),
-            DEP_LITERALS = " ".join(rule.dep_literals)
-        )
+    if isinstance(rule, MakePatternRule):
+        out.write("{TARGETS}: {TARGET_PATTERN}: {DEP_PATTERNS} {DEP_LITERALS} | $(DIRS)\n{RULE_LINES}\n\n".format(
+            TARGETS = rule.targets,
+            TARGET_PATTERN = rule.target_pattern,
+            DEP_PATTERNS = " ".join(rule.dep_patterns),
+            DEP_LITERALS = " ".join(rule.dep_literals),
+            RULE_LINES = "\n".join("\t%s" % cmd for cmd in rule.cmds)
+        ))
+        return
 
-        if len(rule.cmds) == 0:
-            makefile_string += "%s\n\n" % header_line
-            continue
+    assert isinstance(rule, MakeRule)
+    header_line = "{OUT_FILE}: {DEP_FILES} {DEP_LITERALS} | $(DIRS)".format(
+        OUT_FILE = files_to_makefile([rule.output_file], **kwargs),
+        DEP_FILES = files_to_makefile(rule.dep_files, wrap = True, **kwargs),
+        DEP_LITERALS = " ".join(rule.dep_literals)
+    )
 
-        makefile_string += "{HEADER_LINE}\n{RULE_LINES}\n\n".format(
-            HEADER_LINE = header_line,
-            RULE_LINES = "\n".join("\t%s" % cmd for cmd in rule.cmds)
-        )
+    if len(rule.cmds) == 0:
+        out.write("%s\n\n" % header_line)
+        return
+
+    out.write("{HEADER_LINE}\n{RULE_LINES}\n\n".format(
+        HEADER_LINE = header_line,
+        RULE_LINES = "\n".join("\t%s" % cmd for cmd in rule.cmds)
+    ))
 
-    return makefile_string
+def dir_prefix(file, common_vars, dir_cache=None):
+    """Returns the formatted directory of file, memoized in dir_cache."""
+    if dir_cache is None:
+        return utils.dir_for(file).format(**common_vars)
+    key = (type(file), file.dirname) if isinstance(file, LocalFile) else type(file)
+    dirname = dir_cache.get(key)
+    if dirname is None:
+        dirname = utils.dir_for(file).format(**common_vars)
+        dir_cache[key] = dirname
+    return dirname
 
-def files_to_makefile(files, common_vars, wrap = False, **kwargs):
+def files_to_makefile(files, common_vars, wrap = False, dir_cache = None, **kwargs):
     if len(files) == 0:
         return ""
-    dirnames = [utils.dir_for(file).format(**common_vars) for file in files]
+    dirnames = [dir_prefix(file, common_vars, dir_cache) for file in files]
     join_str = " \\\n\t\t" if wrap and len(files) > 2 else " "
     if len(files) == 1:
         return "%s/%s" % (dirnames[0], files[0].filename)
@@ -83,10 +137,40 @@ def files_to_makefile(files, common_vars, wrap = False, **kwargs):
     else:
         return join_str.join("%s/%s" % (d, f.filename) for d,f in zip(dirnames, files))
 
-def get_gnumake_rules_helper(request, common_vars, **kwargs):
+def get_gnumake_rules_helper(request, common_vars, copy_strategy="auto", string_vars="export",
+        content_dir=None, dir_cache=None, **kwargs):
+
+    # Content that refers to Makefile variables, such as $(INDEX_NAME), has to
+    # be expanded by make, so it cannot be written to content_dir.
+    if (isinstance(request, PrintFileRequest) and content_dir is not None
+            and "$" not in request.content):
+        output_file = files_to_makefile([request.output_file], common_vars, dir_cache = dir_cache)
+        content_path = os.path.join(content_dir, "%s.txt" % request.name)
+        # Like echo, end the content with a newline
+        utils.write_file_if_changed(content_path, request.content + "\n")
+        return [
+            MakeRule(
+                name = request.name,
+                dep_literals = [content_path],
+                dep_files = [],
+                output_file = request.output_file,
+                cmds = [
+                    # The content file changes only with the content.
+                    "cp {CONTENT_PATH} {MAKEFILENAME}".format(
+                        CONTENT_PATH = content_path,
+                        MAKEFILENAME = output_file
+                    )
+                ]
+            )
+        ]
 
     if isinstance(request, PrintFileRequest):
         var_name = "%s_CONTENT" % request.name.upper()
+        output_file = files_to_makefile([request.output_file], common_vars, dir_cache = dir_cache)
+        if string_vars == "file":
+            print_cmd = "$(file >{MAKEFILENAME},$({VAR_NAME}))"
+        else:
+            print_cmd = "echo \"$${VAR_NAME}\" > {MAKEFILENAME}"
         return [
             MakeStringVar(
                 name = var_name,
@@ -98,9 +182,9 @@ def get_gnumake_rules_helper(request, common_vars, **kwargs):
                 dep_files = [],
                 output_file = request.output_file,
                 cmds = [
-                    "echo \"$${VAR_NAME}\" > {MAKEFILENAME}".format(
+                    print_cmd.format(
                         VAR_NAME = var_name,
-                        MAKEFILENAME = files_to_makefile([request.output_file], common_vars),
+                        MAKEFILENAME = output_file,
                         **common_vars
                     )
                 ]
@@ -109,16 +193,19 @@ def get_gnumake_rules_helper(request, common_vars, **kwargs):
 
 
     if isinstance(request, CopyRequest):
+        input_file = files_to_makefile([request.input_file], common_vars, dir_cache = dir_cache)
+        output_file = files_to_makefile([request.output_file], common_vars, dir_cache = dir_cache)
+        if request.symlink:
+            cmd = "ln -sf $(abspath %s) %s" % (input_file, output_file)
+        else:
+            cmd = shell_copy_command(copy_strategy, input_file, output_file)
         return [
             MakeRule(
                 name = request.name,
                 dep_literals = [],
                 dep_files = [request.input_file],
                 output_file = request.output_file,
-                cmds = ["cp %s %s" % (
-                    files_to_makefile([request.input_file], common_vars),
-                    files_to_makefile([request.output_file], common_vars))
-                ]
+                cmds = [cmd]
             )
         ]
 
@@ -163,7 +250,7 @@ def get_gnumake_rules_helper(request, common_vars, **kwargs):
                     cmds = [
                         cmd,
                         "echo timestamp > {MAKEFILENAME}".format(
-                            MAKEFILENAME = files_to_makefile([timestamp_file], common_vars)
+                            MAKEFILENAME = files_to_makefile([timestamp_file], common_vars, dir_cache = dir_cache)
                         )
                     ]
                 )
@@ -221,6 +308,18 @@ def get_gnumake_rules_helper(request, common_vars, **kwargs):
                     files = request.common_dep_files
                 )
             ]
+        # If the files differ only by their stem, use one static pattern rule.
+        pattern_rule = get_static_pattern_rule(request, cmd_template, dep_literals,
+            common_vars, dir_cache)
+        if pattern_rule is not None:
+            targets_var_name = "%s_OUTPUTS" % request.name.upper()
+            return rules + [
+                MakeFilesVar(
+                    name = targets_var_name,
+                    files = request.output_files
+                ),
+                pattern_rule._replace(targets = "$(%s)" % targets_var_name)
+            ]
         # Add a rule for each individual file.
         for loop_vars in utils.repeated_execution_request_looper(request):
             (_, specific_dep_files, input_file, output_file) = loop_vars
@@ -243,3 +342,78 @@ def get_gnumake_rules_helper(request, common_vars, **kwargs):
         return rules
 
     assert False
+
+def _base_name_bounds(path):
+    """Returns the start and end of the file name without directory and extension."""
+    start = path.rfind("/") + 1
+    end = path.rfind(".")
+    if end < start:
+        end = len(path)
+    return start, end
+
+# Stands for the stem while checking whether a request fits a pattern rule
+STEM_MARKER = "\x00STEM\x00"
+
+def get_static_pattern_rule(request, cmd_template, dep_literals, common_vars, dir_cache=None):
+    """
+    Returns a MakePatternRule for a RepeatedExecutionRequest, or None if the
+    iterations differ by more than the stem of their input file, which is the
+    file name without directory and extension. The targets of the returned
+    rule are left for the caller to fill in.
+    """
+    if len(request.input_files) < 2:
+        return None
+    result = None
+    for loop_vars in utils.repeated_execution_request_looper(request):
+        (iter_vars, specific_dep_files, input_file, output_file) = loop_vars
+        stem = _base_name_bounds(input_file.filename)
+        stem = input_file.filename[stem[0]:stem[1]]
+        if not stem or not all(isinstance(v, str) for v in iter_vars.values()):
+            return None
+
+        def to_pattern(file):
+            path = files_to_makefile([file], common_vars, dir_cache = dir_cache)
+            start, end = _base_name_bounds(path)
+            if "%" in path or path[start:end] != stem:
+                return path
+            return path[:start] + "%" + path[end:]
+        target_pattern = to_pattern(output_file)
+        dep_patterns = [to_pattern(file) for file in [input_file] + specific_dep_files]
+        if "%" not in target_pattern or "%" not in dep_patterns[0]:
+            return None
+
+        # Format the command with the stem marked in all per-file values.
+        stem_regex = re.compile(r"(?<![\w-])%s(?![\w-])" % re.escape(stem))
+        def mark_value(value):
+            return stem_regex.sub(lambda match: STEM_MARKER, value)
+        def mark(file):
+            return file._replace(filename = mark_value(file.filename))
+        marked_loop_vars = (
+            dict((k, mark_value(v)) for k, v in iter_vars.items()),
+            specific_dep_files,
+            mark(input_file),
+            mark(output_file)
+        )
+        cmd = utils.format_repeated_request_command(
+            request,
+            cmd_template,
+            marked_loop_vars,
+            common_vars
+        )
+        rule = (target_pattern, dep_patterns, cmd)
+        if result is None:
+            result = rule
+            # The automatic variables are easier to read than the marked paths.
+            cmd = cmd.replace(files_to_makefile([mark(input_file)], common_vars), "$<")
+            cmd = cmd.replace(files_to_makefile([mark(output_file)], common_vars), "$@")
+            pattern_cmd = cmd.replace(STEM_MARKER, "$*")
+        elif rule != result:
+            return None
+    return MakePatternRule(
+        name = request.name,
+        targets = None,
+        target_pattern = result[0],
+        dep_patterns = result[1],
+        dep_literals = dep_literals,
+        cmds = [pattern_cmd]
+    )
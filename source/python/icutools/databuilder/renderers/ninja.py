@@ -0,0 +1,172 @@
+# Copyright (C) 2018 and later: Unicode, Inc. and others.
+# License & terms of use: http://www.unicode.org/copyright.html
+
+# Python 2/3 Compatibility (ICU-20299)
+# TODO(ICU-20301): Remove this.
+from __future__ import print_function
+
+from . import *
+from .. import *
+from .. import utils
+from ..copy_strategy import shell_copy_command
+from ..request_types import *
+from .common_exec import file_path, get_tool_path, makedirs
+
+import os
+
+# Tools that can use a lot of memory get their own pool, so that ninja does
+# not run too many of them at once on machines with many cores.
+HEAVY_TOOLS = ["gendict"]
+HEAVY_POOL_DEPTH = 2
+
+# A batched command (as generated in "sequential" seqmode) with at least
+# this many input files is also put into the heavy pool.
+HEAVY_BATCH_SIZE = 50
+
+def get_ninja_rules(build_dirs, requests, common_vars, tool_dir, copy_strategy="auto", **kwargs):
+    """
+    Returns the content of a build.ninja file for the requests.
+
+    The content of PrintFileRequests is written to files under TMP_DIR
+    right away; the build.ninja copies them into place only if they changed,
+    and uses restat so that unchanged files do not trigger rebuilds.
+    """
+    content_dir = "{TMP_DIR}/ninja_content".format(**common_vars)
+    makedirs(content_dir)
+
+    tools = sorted(set(
+        request.tool.name
+        for request in requests
+        if isinstance(request, AbstractExecutionRequest)
+    ))
+
+    lines = [
+        "# Generated by icutools.databuilder; do not edit.",
+        "ninja_required_version = 1.7",
+        "",
+        "pool heavy",
+        "  depth = %d" % HEAVY_POOL_DEPTH,
+        "",
+        "rule print_file",
+        "  command = cmp -s $in $out || cp $in $out",
+        "  description = PRINT $out",
+        "  restat = 1",
+        "",
+        "rule copy",
+        "  command = %s" % shell_copy_command(copy_strategy, "$in", "$out"),
+        "  description = COPY $out",
+        "",
+        "rule symlink",
+        "  command = ln -sf $target $out",
+        "  description = SYMLINK $out",
+        "",
+    ]
+    for tool in tools:
+        lines += [
+            "rule %s" % tool,
+            "  command = %s $args" % _escape(get_tool_path(IcuTool(tool), "unix", tool_dir)),
+            "  description = %s $name" % tool.upper(),
+            "",
+        ]
+
+    for request in requests:
+        lines += get_ninja_rules_helper(request, common_vars, content_dir)
+
+    return "\n".join(lines) + "\n"
+
+def get_ninja_rules_helper(request, common_vars, content_dir):
+    if isinstance(request, PrintFileRequest):
+        content_path = "%s/%s.txt" % (content_dir, request.name)
+        utils.write_file_if_changed(content_path, request.content)
+        return [
+            "build %s: print_file %s" % (
+                _escape_path(file_path(request.output_file, common_vars)),
+                _escape_path(content_path)
+            ),
+            "",
+        ]
+
+    if isinstance(request, CopyRequest):
+        lines = [
+            "build %s: %s %s" % (
+                _files_to_ninja([request.output_file], common_vars),
+                "symlink" if request.symlink else "copy",
+                _files_to_ninja([request.input_file], common_vars)
+            ),
+        ]
+        if request.symlink:
+            lines += ["  target = %s" % _escape(
+                os.path.abspath(file_path(request.input_file, common_vars)))]
+        return lines + [""]
+
+    if isinstance(request, VariableRequest):
+        return [
+            "build %s: phony %s" % (
+                request.name,
+                _files_to_ninja(request.input_files, common_vars)
+            ),
+            "",
+        ]
+
+    assert isinstance(request.tool, IcuTool)
+    cmd_template = "{ARGS}"
+
+    if isinstance(request, SingleExecutionRequest):
+        heavy = (
+            request.tool.name in HEAVY_TOOLS or
+            len(request.input_files) >= HEAVY_BATCH_SIZE
+        )
+        return _build_statement(
+            name = request.name,
+            tool = request.tool.name,
+            output_files = request.output_files,
+            input_files = request.all_input_files(),
+            args = utils.format_single_request_command(request, cmd_template, common_vars),
+            heavy = heavy,
+            common_vars = common_vars
+        )
+
+    if isinstance(request, RepeatedExecutionRequest):
+        lines = []
+        for loop_vars in utils.repeated_execution_request_looper(request):
+            (_, specific_dep_files, input_file, output_file) = loop_vars
+            lines += _build_statement(
+                name = "%s %s" % (request.name, input_file.filename),
+                tool = request.tool.name,
+                output_files = [output_file],
+                input_files = request.common_dep_files + specific_dep_files + [input_file],
+                args = utils.format_repeated_request_command(
+                    request,
+                    cmd_template,
+                    loop_vars,
+                    common_vars
+                ),
+                heavy = request.tool.name in HEAVY_TOOLS,
+                common_vars = common_vars
+            )
+        return lines
+
+    assert False
+
+def _build_statement(name, tool, output_files, input_files, args, heavy, common_vars):
+    lines = [
+        "build %s: %s %s" % (
+            _files_to_ninja(output_files, common_vars),
+            tool,
+            _files_to_ninja(input_files, common_vars)
+        ),
+        "  name = %s" % _escape(name),
+        "  args = %s" % _escape(args),
+    ]
+    if heavy:
+        lines += ["  pool = heavy"]
+    return lines + [""]
+
+def _files_to_ninja(files, common_vars):
+    return " ".join(_escape_path(file_path(file, common_vars)) for file in files)
+
+def _escape(value):
+    return value.replace("$", "$$")
+
+def _escape_path(path):
+    return _escape(path).replace(" ", "$ ").replace(":", "$:")
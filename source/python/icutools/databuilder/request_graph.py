@@ -0,0 +1,130 @@
+# Copyright (C) 2018 and later: Unicode, Inc. and others.
+# License & terms of use: http://www.unicode.org/copyright.html
+
+# Python 2/3 Compatibility (ICU-20299)
+# TODO(ICU-20301): Remove this.
+from __future__ import print_function
+
+from . import *
+
+import heapq
+
+
+def default_file_key(file):
+    # OutFile("x") == TmpFile("x"), so the type must be part of the key.
+    return (type(file), file)
+
+
+class RequestGraph(object):
+    """
+    Indexes over a list of requests, for lookups in constant time.
+
+    The nodes may be requests or anything else with a name and the methods
+    all_input_files() and all_output_files(), such as ExecActions. Edges go
+    from the producer of a file to the nodes that have it as an input.
+
+    Build the graph once the list of requests is final; the indexes are not
+    updated if requests are added or change their output files.
+    """
+
+    def __init__(self, requests, file_key=default_file_key):
+        self.requests = list(requests)
+        self.file_key = file_key
+        self._index = {}
+        self._by_name = {}
+        self._producers = {}
+        for i, request in enumerate(self.requests):
+            self._index[id(request)] = i
+            self._by_name.setdefault(request.name, request)
+            for file in request.all_output_files():
+                self._producers.setdefault(file_key(file), i)
+        self._dependencies = None
+        self._dependents = None
+        self._output_files = {}
+
+    def __iter__(self):
+        return iter(self.requests)
+
+    def __len__(self):
+        return len(self.requests)
+
+    def find(self, name):
+        """Returns the first request with the given name, or None."""
+        return self._by_name.get(name)
+
+    def producer(self, file):
+        """Returns the request that outputs the given file, or None."""
+        i = self._producers.get(self.file_key(file))
+        return None if i is None else self.requests[i]
+
+    def dependency_indices(self):
+        """
+        Returns a list parallel to the requests. Each entry is the sorted
+        list of indices of the requests producing its input files.
+        """
+        if self._dependencies is None:
+            self._dependencies = []
+            for i, request in enumerate(self.requests):
+                deps = set()
+                for file in request.all_input_files():
+                    j = self._producers.get(self.file_key(file))
+                    if j is not None and j != i:
+                        deps.add(j)
+                self._dependencies.append(sorted(deps))
+        return self._dependencies
+
+    def dependent_indices(self):
+        """The reverse of dependency_indices()."""
+        if self._dependents is None:
+            self._dependents = [[] for _ in self.requests]
+            for i, deps in enumerate(self.dependency_indices()):
+                for j in deps:
+                    self._dependents[j].append(i)
+        return self._dependents
+
+    def dependencies(self, request):
+        return [self.requests[j] for j in self.dependency_indices()[self._index[id(request)]]]
+
+    def dependents(self, request):
+        return [self.requests[j] for j in self.dependent_indices()[self._index[id(request)]]]
+
+    def topological_order(self):
+        """
+        Returns the indices of the requests such that producers come before
+        their dependents, keeping the original order where possible.
+        Raises ValueError if the graph has a cycle.
+        """
+        # Kahn's algorithm; always take the earliest ready request.
+        pending = [len(deps) for deps in self.dependency_indices()]
+        dependents = self.dependent_indices()
+        ready = [i for i, n in enumerate(pending) if n == 0]
+        heapq.heapify(ready)
+        result = []
+        while ready:
+            i = heapq.heappop(ready)
+            result.append(i)
+            for j in dependents[i]:
+                pending[j] -= 1
+                if pending[j] == 0:
+                    heapq.heappush(ready, j)
+        if len(result) != len(self.requests):
+            raise ValueError("Dependency cycle among %d requests" % (len(self.requests) - len(result)))
+        return result
+
+    def get_all_output_files(self, include_tmp=False):
+        """
+        Returns the unique output files of all requests, computed only once.
+        Unless include_tmp is set, only files in OUT_DIR are returned.
+        """
+        if include_tmp not in self._output_files:
+            files = []
+            for request in self.requests:
+                files += request.all_output_files()
+            if include_tmp:
+                # Filter for unique values.  NOTE: Cannot use set() because we need to accept same
+                # filename as OutFile and TmpFile as different, and by default they evaluate as equal.
+                files = [f for _, f in set((type(f), f) for f in files)]
+            else:
+                files = list(set(file for file in files if isinstance(file, OutFile)))
+            self._output_files[include_tmp] = files
+        return list(self._output_files[include_tmp])
@@ -47,7 +47,7 @@ class AbstractRequest(object):
         """
         return True
 
-    def flatten(self, config, all_requests, common_vars):
+    def flatten(self, config, graph, common_vars):
         return [self]
 
     def all_input_files(self):
@@ -96,30 +96,29 @@ class AbstractExecutionRequest(AbstractRequest):
         super(AbstractExecutionRequest, self).__init__(**kwargs)
 
     def apply_file_filter(self, filter):
-        i = 0
-        while i < len(self.input_files):
-            if filter.match(self.input_files[i]):
-                i += 1
-            else:
-                self._del_at(i)
-        return i > 0
-
-    def _del_at(self, i):
-        del self.input_files[i]
+        mask = filter.match_many(self.input_files)
+        if not all(mask):
+            self._compact(mask)
+        return any(mask)
+
+    def _compact(self, mask):
+        """Keeps the input files, and the entries of lists parallel to them,
+        for which mask is true."""
         for _, v in self.format_with.items():
             if isinstance(v, list):
-                assert len(v) == len(self.input_files) + 1
-                del v[i]
+                assert len(v) == len(self.input_files)
+                _compact_list(v, mask)
         for v in self.dep_targets:
             if isinstance(v, list):
-                assert len(v) == len(self.input_files) + 1
-                del v[i]
+                assert len(v) == len(self.input_files)
+                _compact_list(v, mask)
+        _compact_list(self.input_files, mask)
 
-    def flatten(self, config, all_requests, common_vars):
-        self._dep_targets_to_files(all_requests)
-        return super(AbstractExecutionRequest, self).flatten(config, all_requests, common_vars)
+    def flatten(self, config, graph, common_vars):
+        self._dep_targets_to_files(graph)
+        return super(AbstractExecutionRequest, self).flatten(config, graph, common_vars)
 
-    def _dep_targets_to_files(self, all_requests):
+    def _dep_targets_to_files(self, graph):
         if not self.dep_targets:
             return
         for dep_target in self.dep_targets:
@@ -138,10 +137,9 @@ class AbstractExecutionRequest(AbstractRequest):
                 self.common_dep_files.append(dep_target)
                 continue
             # For DepTarget entries, search for the target.
-            for request in all_requests:
-                if request.name == dep_target.name:
-                    self.common_dep_files += request.all_output_files()
-                    break
+            request = graph.find(dep_target.name)
+            if request is not None:
+                self.common_dep_files += request.all_output_files()
             else:
                 print("Warning: Unable to find target %s, a dependency of %s" % (
                     dep_target.name,
@@ -173,13 +171,13 @@ class RepeatedExecutionRequest(AbstractExecutionRequest):
 
         super(RepeatedExecutionRequest, self).__init__(**kwargs)
 
-    def _del_at(self, i):
-        super(RepeatedExecutionRequest, self)._del_at(i)
-        del self.output_files[i]
-        del self.specific_dep_files[i]
+    def _compact(self, mask):
+        super(RepeatedExecutionRequest, self)._compact(mask)
+        _compact_list(self.output_files, mask)
+        _compact_list(self.specific_dep_files, mask)
         for _, v in self.repeat_with.items():
             if isinstance(v, list):
-                del v[i]
+                _compact_list(v, mask)
 
     def all_input_files(self):
         files = super(RepeatedExecutionRequest, self).all_input_files()
@@ -193,7 +191,9 @@ class RepeatedOrSingleExecutionRequest(AbstractExecutionRequest):
         self.repeat_with = {}
         super(RepeatedOrSingleExecutionRequest, self).__init__(**kwargs)
 
-    def flatten(self, config, all_requests, common_vars):
+    def flatten(self, config, graph, common_vars):
+        if config.num_shards and not config.max_parallel:
+            return self._flatten_sharded(config, graph, common_vars)
         if config.max_parallel:
             new_request = RepeatedExecutionRequest(
                 name = self.name,
@@ -217,14 +217,44 @@ class RepeatedOrSingleExecutionRequest(AbstractExecutionRequest):
                 args = self.args,
                 format_with = utils.concat_dicts(self.format_with, self.repeat_with)
             )
-        return new_request.flatten(config, all_requests, common_vars)
-
-    def _del_at(self, i):
-        super(RepeatedOrSingleExecutionRequest, self)._del_at(i)
-        del self.output_files[i]
+        return new_request.flatten(config, graph, common_vars)
+
+    def _flatten_sharded(self, config, graph, common_vars):
+        # Split into batched commands with a similar total input size.
+        sizes = [
+            config.io.file_size(file.filename) if isinstance(file, InFile) else 0
+            for file in self.input_files
+        ]
+        shards = utils.shard_indices(sizes, config.num_shards)
+
+        def take(value, indices):
+            if isinstance(value, list):
+                return type(value)(value[i] for i in indices)
+            return value
+
+        result = []
+        for shard_id, indices in enumerate(shards):
+            result += SingleExecutionRequest(
+                name = "%s_%d" % (self.name, shard_id) if len(shards) > 1 else self.name,
+                category = self.category,
+                dep_targets = [take(v, indices) for v in self.dep_targets],
+                input_files = take(self.input_files, indices),
+                output_files = take(self.output_files, indices),
+                tool = self.tool,
+                args = self.args,
+                format_with = {
+                    k: take(v, indices)
+                    for k, v in utils.concat_dicts(self.format_with, self.repeat_with).items()
+                }
+            ).flatten(config, graph, common_vars)
+        return result
+
+    def _compact(self, mask):
+        super(RepeatedOrSingleExecutionRequest, self)._compact(mask)
+        _compact_list(self.output_files, mask)
         for _, v in self.repeat_with.items():
             if isinstance(v, list):
-                del v[i]
+                _compact_list(v, mask)
 
 
 class PrintFileRequest(AbstractRequest):
@@ -241,6 +271,8 @@ class CopyRequest(AbstractRequest):
     def __init__(self, **kwargs):
         self.input_file = None
         self.output_file = None
+        # If True, the output may be a symbolic link to the input file.
+        self.symlink = False
         super(CopyRequest, self).__init__(**kwargs)
 
     def all_input_files(self):
@@ -266,10 +298,10 @@ class ListRequest(AbstractRequest):
         self.include_tmp = None
         super(ListRequest, self).__init__(**kwargs)
 
-    def flatten(self, config, all_requests, common_vars):
-        list_files = list(sorted(utils.get_all_output_files(all_requests)))
+    def flatten(self, config, graph, common_vars):
+        list_files = list(sorted(graph.get_all_output_files()))
         if self.include_tmp:
-            variable_files = list(sorted(utils.get_all_output_files(all_requests, include_tmp=True)))
+            variable_files = list(sorted(graph.get_all_output_files(include_tmp=True)))
         else:
             # Always include the list file itself
             variable_files = list_files + [self.output_file]
@@ -277,10 +309,10 @@ class ListRequest(AbstractRequest):
             name = self.name,
             output_file = self.output_file,
             content = "\n".join(file.filename for file in list_files)
-        ).flatten(config, all_requests, common_vars) + VariableRequest(
+        ).flatten(config, graph, common_vars) + VariableRequest(
             name = self.variable_name,
             input_files = variable_files
-        ).flatten(config, all_requests, common_vars)
+        ).flatten(config, graph, common_vars)
 
     def all_output_files(self):
         return [self.output_file]
@@ -298,27 +330,19 @@ class IndexRequest(AbstractRequest):
         super(IndexRequest, self).__init__(**kwargs)
 
     def apply_file_filter(self, filter):
-        i = 0
-        while i < len(self.installed_files):
-            if filter.match(self.installed_files[i]):
-                i += 1
-            else:
-                del self.installed_files[i]
-        j = 0
-        while j < len(self.alias_files):
-            if filter.match(self.alias_files[j]):
-                j += 1
-            else:
-                del self.alias_files[j]
-        return i + j > 0
+        installed_mask = filter.match_many(self.installed_files)
+        _compact_list(self.installed_files, installed_mask)
+        alias_mask = filter.match_many(self.alias_files)
+        _compact_list(self.alias_files, alias_mask)
+        return any(installed_mask) or any(alias_mask)
 
-    def flatten(self, config, all_requests, common_vars):
+    def flatten(self, config, graph, common_vars):
         return (
             PrintFileRequest(
                 name = self.name,
                 output_file = self.txt_file,
                 content = self._generate_index_file(common_vars)
-            ).flatten(config, all_requests, common_vars) +
+            ).flatten(config, graph, common_vars) +
             SingleExecutionRequest(
                 name = "%s_res" % self.name,
                 category = self.category,
@@ -327,7 +351,7 @@ class IndexRequest(AbstractRequest):
                 tool = IcuTool("genrb"),
                 args = self.args,
                 format_with = self.format_with
-            ).flatten(config, all_requests, common_vars)
+            ).flatten(config, graph, common_vars)
         )
 
     def _generate_index_file(self, common_vars):
@@ -362,3 +386,8 @@ class IndexRequest(AbstractRequest):
     @staticmethod
     def locale_file_stem(f):
         return f.filename[f.filename.rfind("/")+1:-4]
+
+
+def _compact_list(values, mask):
+    """Removes the entries of values for which mask is false, in place."""
+    values[:] = [value for value, keep in zip(values, mask) if keep]
@@ -0,0 +1,84 @@
+# Copyright (C) 2018 and later: Unicode, Inc. and others.
+# License & terms of use: http://www.unicode.org/copyright.html
+
+# Python 2/3 Compatibility (ICU-20299)
+# TODO(ICU-20301): Remove this.
+from __future__ import print_function
+
+from collections import namedtuple
+import json
+import threading
+
+# Resource usage of one child process. Times are in seconds and max_rss is in
+# kilobytes. user_time, sys_time, and max_rss are None where the platform
+# does not report them.
+ResourceUsage = namedtuple("ResourceUsage", ["wall_time", "user_time", "sys_time", "max_rss"])
+
+
+class ResourceReport(object):
+    """Aggregates the resource usage of tool invocations."""
+
+    GROUPINGS = ["tool", "category", "request"]
+
+    def __init__(self):
+        self.commands = []
+        self._lock = threading.Lock()
+
+    def add(self, request, command_line, usage):
+        with self._lock:
+            self.commands.append({
+                "request": request.name,
+                "category": request.category,
+                "tool": request.tool.name,
+                "command": command_line,
+                "wall_time": usage.wall_time,
+                "user_time": usage.user_time,
+                "sys_time": usage.sys_time,
+                "max_rss": usage.max_rss,
+            })
+
+    def aggregate(self, grouping):
+        """Returns a dict from group name to the totals for that group."""
+        result = {}
+        for command in self.commands:
+            key = str(command[grouping])
+            if key not in result:
+                result[key] = {
+                    "count": 0,
+                    "wall_time": 0.0,
+                    "user_time": 0.0,
+                    "sys_time": 0.0,
+                    "max_rss": 0,
+                }
+            totals = result[key]
+            totals["count"] += 1
+            totals["wall_time"] += command["wall_time"]
+            totals["user_time"] += command["user_time"] or 0.0
+            totals["sys_time"] += command["sys_time"] or 0.0
+            totals["max_rss"] = max(totals["max_rss"], command["max_rss"] or 0)
+        return result
+
+    def write_json(self, path):
+        json_data = {
+            "version": 1,
+            "units": {"time": "seconds", "max_rss": "kilobytes"},
+            "commands": self.commands,
+        }
+        for grouping in self.GROUPINGS:
+            json_data["by_%s" % grouping] = self.aggregate(grouping)
+        with open(path, "w") as f:
+            json.dump(json_data, f, indent=2, sort_keys=True)
+
+    def format_text(self, limit=15):
+        lines = []
+        for grouping in self.GROUPINGS:
+            totals = self.aggregate(grouping)
+            lines.append("Resource usage by %s (top %d by wall time):" % (grouping, limit))
+            lines.append("  %-32s %6s %10s %10s %10s %12s" % (
+                grouping, "count", "wall(s)", "user(s)", "sys(s)", "maxrss(KB)"))
+            ordered = sorted(totals.items(), key=lambda item: -item[1]["wall_time"])
+            for key, t in ordered[:limit]:
+                lines.append("  %-32s %6d %10.2f %10.2f %10.2f %12d" % (
+                    key, t["count"], t["wall_time"], t["user_time"], t["sys_time"], t["max_rss"]))
+            lines.append("")
+        return "\n".join(lines)
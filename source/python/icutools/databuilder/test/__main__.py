@@ -3,11 +3,37 @@
 
 import unittest
 
+from . import comment_stripper_test
+from . import common_exec_test
+from . import copy_strategy_test
+from . import explain_test
+from . import file_replacements_test
 from . import filtration_test
+from . import graph_test
+from . import locale_budget_test
+from . import makefile_test
+from . import ninja_test
+from . import planning_cache_test
+from . import request_types_test
+from . import resource_report_test
+from . import utils_test
 
 def load_tests(loader, tests, pattern):
     suite = unittest.TestSuite()
+    suite.addTest(comment_stripper_test.suite)
+    suite.addTest(common_exec_test.suite)
+    suite.addTest(copy_strategy_test.suite)
+    suite.addTest(explain_test.suite)
+    suite.addTest(file_replacements_test.suite)
     suite.addTest(filtration_test.suite)
+    suite.addTest(graph_test.suite)
+    suite.addTest(locale_budget_test.suite)
+    suite.addTest(makefile_test.suite)
+    suite.addTest(ninja_test.suite)
+    suite.addTest(planning_cache_test.suite)
+    suite.addTest(request_types_test.suite)
+    suite.addTest(resource_report_test.suite)
+    suite.addTest(utils_test.suite)
     return suite
 
 if __name__ == '__main__':
@@ -0,0 +1,469 @@
+# Copyright (C) 2018 and later: Unicode, Inc. and others.
+# License & terms of use: http://www.unicode.org/copyright.html
+
+# Micro-benchmarks for the data build tool. They are not part of the test
+# suite. Run them from the source/python directory with:
+#
+#     python3 -m icutools.databuilder.test.benchmark [name ...]
+
+# Python 2/3 Compatibility (ICU-20299)
+# TODO(ICU-20301): Remove this.
+from __future__ import print_function
+
+import argparse
+import glob
+import io
+import json
+import os
+import re
+import sys
+import timeit
+
+try:
+    import tracemalloc
+except ImportError:
+    # Python 2
+    tracemalloc = None
+
+from .. import *
+from .. import utils
+from ..comment_stripper import CommentStripper
+from ..filtration import Filter, LANGUAGE_ONLY_REGEX, LANGUAGE_SCRIPT_REGEX
+from ..planning import IO
+from ..renderers import MakeFilesVar, MakeRule, MakeStringVar, makefile
+from ..request_types import *
+
+LOCALE_REGEX = re.compile(r"^(root|[a-z]{2,3}(_[A-Za-z0-9]+)*)$")
+
+DEFAULT_SRC_DIR = os.path.join(os.path.dirname(__file__), "..", "..", "..", "..", "data")
+DEFAULT_FILTERS_DIR = os.path.join(os.path.dirname(__file__), "..", "..", "..", "..", "..", "filters")
+
+flag_parser = argparse.ArgumentParser(
+    description = "Runs micro-benchmarks of the ICU data build tool."
+)
+flag_parser.add_argument(
+    "benchmarks",
+    nargs = "*",
+    help = "Names of the benchmarks to run; default is all of them"
+)
+flag_parser.add_argument(
+    "--src_dir",
+    help = "Path to data source folder (icu4c/source/data).",
+    default = DEFAULT_SRC_DIR
+)
+flag_parser.add_argument(
+    "--filters_dir",
+    help = "Path to a folder of filter JSON files.",
+    default = DEFAULT_FILTERS_DIR
+)
+flag_parser.add_argument(
+    "--rules",
+    help = "Number of rules in the synthetic graph of the makefile benchmark.",
+    type = int,
+    default = 10000
+)
+flag_parser.add_argument(
+    "--repeat",
+    help = "Number of times to repeat each measurement; the minimum is reported.",
+    type = int,
+    default = 5
+)
+
+
+def measure(fn, repeat):
+    """Returns the minimum time in seconds of calling fn()."""
+    return min(timeit.repeat(fn, number=1, repeat=repeat))
+
+
+def measure_peak_memory(fn):
+    """Returns the peak memory in bytes allocated while calling fn()."""
+    if tracemalloc is None:
+        return None
+    tracemalloc.start()
+    try:
+        fn()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def report(name, seconds, count=None):
+    if count:
+        print("  %-40s %9.3f ms  (%.2f us each)" % (name, seconds * 1e3, seconds * 1e6 / count))
+    else:
+        print("  %-40s %9.3f ms" % (name, seconds * 1e3))
+
+
+class LegacyLocaleFilter(Filter):
+    """The previous LocaleFilter, which does not memoize matches, for comparison."""
+
+    def __init__(self, json_data, io):
+        self.locales_requested = list(json_data["includelist"])
+        self.include_children = json_data.get("includeChildren", True)
+        self.include_scripts = json_data.get("includeScripts", False)
+        self.dependency_data_by_tree = {
+            tree: io.read_locale_deps(tree)
+            for tree in utils.ALL_TREES
+        }
+
+    def match(self, file):
+        tree = self._file_to_subdir(file)
+        locale = self._file_to_file_stem(file)
+        if locale in self._locales_required(tree):
+            return True
+        return self._match_recursive(locale, tree)
+
+    def _match_recursive(self, locale, tree):
+        if locale is None:
+            return False
+        if locale in self.locales_requested:
+            return True
+        if self.include_scripts:
+            match = LANGUAGE_SCRIPT_REGEX.match(locale)
+            if match and self._match_recursive(match.group(1), tree):
+                return True
+        if self.include_children:
+            parent = self._get_parent_locale(locale, tree)
+            if self._match_recursive(parent, tree):
+                return True
+        return False
+
+    def _get_parent_locale(self, locale, tree):
+        dependency_data = self.dependency_data_by_tree[tree]
+        if "parents" in dependency_data and locale in dependency_data["parents"]:
+            return dependency_data["parents"][locale]
+        if "aliases" in dependency_data and locale in dependency_data["aliases"]:
+            return dependency_data["aliases"][locale]
+        if LANGUAGE_ONLY_REGEX.match(locale):
+            return "root"
+        i = locale.rfind("_")
+        if i < 0:
+            return None
+        return locale[:i]
+
+    def _locales_required(self, tree):
+        for locale in self.locales_requested:
+            while locale is not None:
+                yield locale
+                locale = self._get_parent_locale(locale, tree)
+
+
+def bench_locale_filter(args):
+    """LocaleFilter over every locale file of all trees in utils.ALL_TREES."""
+    io = IO(args.src_dir)
+    files = [
+        InFile(filename)
+        for tree in utils.ALL_TREES
+        for filename in io.glob("%s/*.txt" % tree)
+    ]
+    # Skip files such as pool.txt, which are not in the locale trees.
+    files = [file for file in files if LOCALE_REGEX.match(Filter._file_to_file_stem(file))]
+    # A large includelist: every language, plus every locale with a region.
+    stems = set(Filter._file_to_file_stem(file) for file in files)
+    locales = sorted(stem for stem in stems if stem != "root" and stem.count("_") != 1)
+    json_data = {
+        "filterType": "locale",
+        "includelist": locales,
+        "includeScripts": True,
+    }
+    print("%d files in %d trees, %d requested locales" % (
+        len(files), len(utils.ALL_TREES), len(locales)))
+
+    report("construct", measure(lambda: Filter.create_from_json(json_data, io), args.repeat))
+
+    def match_all(filter):
+        return [filter.match(file) for file in files]
+    assert match_all(LegacyLocaleFilter(json_data, io)) == match_all(
+        Filter.create_from_json(json_data, io))
+    legacy = measure(lambda: match_all(LegacyLocaleFilter(json_data, io)), args.repeat)
+    current = measure(lambda: match_all(Filter.create_from_json(json_data, io)), args.repeat)
+    report("legacy construct + match", legacy, len(files))
+    report("construct + match (cold, %.1fx)" % (legacy / current), current, len(files))
+    filter = Filter.create_from_json(json_data, io)
+    match_all(filter)
+    report("match (warm)", measure(lambda: match_all(filter), args.repeat), len(files))
+
+
+class LegacyCommentStripper(object):
+    """The previous character-by-character CommentStripper, for comparison."""
+
+    def __init__(self, f):
+        self.f = f
+        self.state = 0
+
+    def read(self, size=-1):
+        bytes = self.f.read(size)
+        return "".join(self._strip_comments(bytes))
+
+    def _strip_comments(self, bytes):
+        for byte in bytes:
+            if self.state == 0:
+                if byte == "/":
+                    self.state = 1
+                elif byte == "\n":
+                    self.state = 0
+                    yield byte
+                else:
+                    self.state = 2
+                    yield byte
+            elif self.state == 1:
+                if byte == "/":
+                    self.state = 3
+                elif byte == "\n":
+                    self.state = 0
+                    yield "/"
+                    yield "\n"
+                else:
+                    self.state = 2
+                    yield "/"
+                    yield byte
+            elif self.state == 2:
+                if byte == "\n":
+                    self.state = 0
+                yield byte
+            elif self.state == 3:
+                if byte == "\n":
+                    self.state = 0
+
+
+def bench_comment_stripper(args):
+    """CommentStripper compared to the legacy implementation on filters/*.json."""
+    for path in sorted(glob.glob(os.path.join(args.filters_dir, "*.json"))):
+        with io.open(path, "r", encoding="utf-8-sig") as f:
+            content = f.read()
+        def strip(cls):
+            return cls(io.StringIO(content)).read()
+        def parse(cls):
+            return json.load(cls(io.StringIO(content)))
+        assert strip(CommentStripper) == strip(LegacyCommentStripper), path
+        print("  %s (%d lines)" % (os.path.basename(path), content.count("\n")))
+        legacy = measure(lambda: parse(LegacyCommentStripper), args.repeat)
+        current = measure(lambda: parse(CommentStripper), args.repeat)
+        report("legacy + json.load", legacy)
+        report("current + json.load (%.1fx)" % (legacy / current), current)
+
+
+def legacy_apply_file_filter(request, filter):
+    """The previous RepeatedOrSingleExecutionRequest.apply_file_filter, for comparison."""
+    i = 0
+    while i < len(request.input_files):
+        if filter.match(request.input_files[i]):
+            i += 1
+            continue
+        del request.input_files[i]
+        for _, v in request.format_with.items():
+            if isinstance(v, list):
+                del v[i]
+        for v in request.dep_targets:
+            if isinstance(v, list):
+                del v[i]
+        del request.output_files[i]
+        for _, v in request.repeat_with.items():
+            if isinstance(v, list):
+                del v[i]
+    return i > 0
+
+
+def bench_file_filter(args):
+    """Applying file filters to a request over the locales tree."""
+    io = IO(args.src_dir)
+    filenames = io.glob("locales/*.txt")
+    stems = [Filter._file_to_file_stem(InFile(filename)) for filename in filenames]
+    print("%d files" % len(filenames))
+
+    def make_request():
+        return RepeatedOrSingleExecutionRequest(
+            name = "locales_res",
+            category = "locales_tree",
+            dep_targets = [[TmpFile("filters/%s" % filename) for filename in filenames]],
+            input_files = [InFile(filename) for filename in filenames],
+            output_files = [OutFile("%s.res" % stem) for stem in stems],
+            tool = IcuTool("genrb"),
+            args = "{INPUT_BASENAME}",
+            format_with = {},
+            repeat_with = {
+                "INPUT_BASENAME": utils.SpaceSeparatedList(filename[8:] for filename in filenames)
+            }
+        )
+
+    filters = [
+        ("language includelist", {"filterType": "language", "includelist": ["en", "de", "fr"]}),
+        ("file-stem excludelist", {"filterType": "file-stem", "excludelist": stems[::10]}),
+        ("locale includelist", {"filterType": "locale", "includelist": ["en", "de", "fr"]}),
+        ("regex includelist", {"filterType": "regex", "includelist": [
+            "^%s_" % language for language in ("en", "de", "fr", "es", "pt", "zh", "sr", "ar")]}),
+        ("union", {"filterType": "union", "unionOf": [
+            {"filterType": "file-stem", "includelist": stems[::20]},
+            {"filterType": "file-stem", "includelist": stems[5::20]},
+            {"filterType": "regex", "includelist": ["^de_", "^fr_"]},
+            {"filterType": "regex", "includelist": ["^es_", "^pt_"]},
+            {"filterType": "language", "includelist": ["ja", "ko"]},
+        ]}),
+    ]
+    report("construct request", measure(make_request, args.repeat))
+    for name, json_data in filters:
+        filter = Filter.create_from_json(json_data, io)
+        legacy = measure(lambda: legacy_apply_file_filter(make_request(), filter), args.repeat)
+        current = measure(lambda: make_request().apply_file_filter(filter), args.repeat)
+        compiled_filter = filter.compile()
+        compiled = measure(lambda: make_request().apply_file_filter(compiled_filter), args.repeat)
+        print("  %s (%d files kept)" % (name, sum(filter.match_many(make_request().input_files))))
+        report("legacy (construct + filter)", legacy)
+        report("current (construct + filter, %.1fx)" % (legacy / current), current)
+        report("compiled (construct + filter, %.1fx)" % (legacy / compiled), compiled)
+
+
+def _synthetic_requests(count):
+    """Returns requests that render to about count Makefile rules."""
+    requests = []
+    for i in range(count // 4):
+        requests += [
+            PrintFileRequest(
+                name = "filter_%d" % i,
+                output_file = TmpFile("filters/%d.txt" % i),
+                content = "-/\n+/Version\n+/%d" % i
+            ),
+            CopyRequest(
+                name = "copy_%d" % i,
+                input_file = InFile("locales/l%d.txt" % i),
+                output_file = TmpFile("locales/l%d.txt" % i)
+            ),
+            SingleExecutionRequest(
+                name = "genrb_%d" % i,
+                input_files = [TmpFile("locales/l%d.txt" % i), LocalFile("$SRC/pool", "pool.res")],
+                output_files = [OutFile("l%d.res" % i)],
+                tool = IcuTool("genrb"),
+                args = "-s {TMP_DIR}/locales -d {OUT_DIR} {INPUT_FILES[0]}",
+                format_with = {}
+            ),
+        ]
+    requests.append(VariableRequest(
+        name = "all_res",
+        input_files = [OutFile("l%d.res" % i) for i in range(count // 4)]
+    ))
+    return requests
+
+
+def legacy_get_gnumake_rules(build_dirs, requests, makefile_vars, common_vars):
+    """
+    The previous makefile.get_gnumake_rules, for comparison: it collects all
+    rules first and concatenates the Makefile into one string, formatting
+    the directory of every file again. Pattern rules are not supported.
+    """
+    makefile_string = ""
+    for key, value in sorted(makefile_vars.items()):
+        makefile_string += "{KEY} = {VALUE}\n".format(
+            KEY = key,
+            VALUE = value
+        )
+    makefile_string += "\n"
+
+    dirs_timestamp_file = "{TMP_DIR}/dirs.timestamp".format(**common_vars)
+    makefile_string += "DIRS = {TIMESTAMP_FILE}\n\n".format(
+        TIMESTAMP_FILE = dirs_timestamp_file
+    )
+    makefile_string += "{TIMESTAMP_FILE}:\n\t$(MKINSTALLDIRS) {ALL_DIRS}\n\techo timestamp > {TIMESTAMP_FILE}\n\n".format(
+        TIMESTAMP_FILE = dirs_timestamp_file,
+        ALL_DIRS = " ".join(build_dirs).format(**common_vars)
+    )
+
+    make_rules = []
+    for request in requests:
+        make_rules += makefile.get_gnumake_rules_helper(request, common_vars = common_vars)
+
+    for rule in make_rules:
+        if isinstance(rule, MakeFilesVar):
+            makefile_string += "{NAME} = {FILE_LIST}\n\n".format(
+                NAME = rule.name,
+                FILE_LIST = makefile.files_to_makefile(rule.files, common_vars, wrap = True),
+            )
+            continue
+
+        if isinstance(rule, MakeStringVar):
+            makefile_string += "define {NAME}\n{CONTENT}\nendef\n".format(
+                NAME = rule.name,
+                CONTENT = rule.content
+            )
+            makefile_string += "export {NAME}\n".format(NAME = rule.name)
+            makefile_string += "\n"
+            continue
+
+        assert isinstance(rule, MakeRule)
+        header_line = "{OUT_FILE}: {DEP_FILES} {DEP_LITERALS} | $(DIRS)".format(
+            OUT_FILE = makefile.files_to_makefile([rule.output_file], common_vars),
+            DEP_FILES = makefile.files_to_makefile(rule.dep_files, common_vars, wrap = True),
+            DEP_LITERALS = " ".join(rule.dep_literals)
+        )
+
+        if len(rule.cmds) == 0:
+            makefile_string += "%s\n\n" % header_line
+            continue
+
+        makefile_string += "{HEADER_LINE}\n{RULE_LINES}\n\n".format(
+            HEADER_LINE = header_line,
+            RULE_LINES = "\n".join("\t%s" % cmd for cmd in rule.cmds)
+        )
+
+    return makefile_string
+
+
+def bench_makefile(args):
+    """Rendering a Makefile for a synthetic graph, with the previous and the current renderer."""
+    common_vars = {
+        "SRC_DIR": "$(srcdir)",
+        "IN_DIR": "$(srcdir)",
+        "OUT_DIR": "$(OUT_DIR)",
+        "TMP_DIR": "$(TMP_DIR)",
+        "INDEX_NAME": "res_index",
+    }
+    requests = _synthetic_requests(args.rules)
+    build_dirs = utils.compute_directories(requests)
+    makefile_vars = {"SRCDIR": "$(srcdir)"}
+    print("%d requests" % len(requests))
+
+    def render_legacy():
+        return legacy_get_gnumake_rules(build_dirs, requests, makefile_vars, common_vars)
+    def render_string():
+        return makefile.get_gnumake_rules(
+            build_dirs, requests, makefile_vars, common_vars = common_vars)
+    def render_stream():
+        with io.open(os.devnull, "w") as out:
+            makefile.write_gnumake_rules(
+                out, build_dirs, requests, makefile_vars, common_vars = common_vars)
+    assert render_legacy() == render_string()
+    legacy = measure(render_legacy, args.repeat)
+    for name, fn in [("legacy string", render_legacy), ("string", render_string), ("stream", render_stream)]:
+        seconds = legacy if fn is render_legacy else measure(fn, args.repeat)
+        if fn is render_legacy:
+            report(name, seconds, len(requests))
+        else:
+            report("%s (%.1fx)" % (name, legacy / seconds), seconds, len(requests))
+        peak = measure_peak_memory(fn)
+        if peak is not None:
+            print("  %-40s %9.1f MB" % ("peak memory (%s)" % name, peak / 1e6))
+
+
+BENCHMARKS = [
+    ("locale_filter", bench_locale_filter),
+    ("comment_stripper", bench_comment_stripper),
+    ("makefile", bench_makefile),
+    ("file_filter", bench_file_filter),
+]
+
+
+def main(argv):
+    args = flag_parser.parse_args(argv)
+    names = args.benchmarks or [name for name, _ in BENCHMARKS]
+    for name, fn in BENCHMARKS:
+        if name in names:
+            print("%s: %s" % (name, fn.__doc__))
+            fn(args)
+            print()
+    unknown = set(names) - set(name for name, _ in BENCHMARKS)
+    if unknown:
+        print("Error: Unknown benchmarks: %s" % ", ".join(sorted(unknown)), file=sys.stderr)
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    exit(main(sys.argv[1:]))
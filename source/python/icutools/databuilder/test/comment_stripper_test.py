@@ -0,0 +1,54 @@
+# Copyright (C) 2018 and later: Unicode, Inc. and others.
+# License & terms of use: http://www.unicode.org/copyright.html
+
+import io
+import json
+import unittest
+
+from ..comment_stripper import CommentStripper
+
+SAMPLE_INPUT = """// Copyright
+{
+// comment
+  "a": "//x", // not a comment
+  // indented, not a comment either
+/"b": 1
+}
+/"""
+
+SAMPLE_OUTPUT = """{
+  "a": "//x", // not a comment
+  // indented, not a comment either
+/"b": 1
+}
+"""
+
+
+class CommentStripperTest(unittest.TestCase):
+
+    def test_read_all(self):
+        stripper = CommentStripper(io.StringIO(SAMPLE_INPUT))
+        self.assertEqual(SAMPLE_OUTPUT, stripper.read())
+        self.assertEqual("", stripper.read())
+
+    def test_read_size(self):
+        for size in range(1, len(SAMPLE_INPUT) + 2):
+            stripper = CommentStripper(io.StringIO(SAMPLE_INPUT))
+            chunks = []
+            while True:
+                chunk = stripper.read(size)
+                if not chunk:
+                    break
+                chunks.append(chunk)
+            self.assertEqual(SAMPLE_OUTPUT, "".join(chunks))
+            # Every chunk but the last one has the requested size.
+            for chunk in chunks[:-1]:
+                self.assertEqual(size, len(chunk))
+
+    def test_json(self):
+        stripper = CommentStripper(io.StringIO("// header\n{\"a\": [1, 2]}\n// footer"))
+        self.assertEqual({"a": [1, 2]}, json.load(stripper))
+
+
+# Export the test for the runner
+suite = unittest.makeSuite(CommentStripperTest)
@@ -0,0 +1,346 @@
+# Copyright (C) 2018 and later: Unicode, Inc. and others.
+# License & terms of use: http://www.unicode.org/copyright.html
+
+import contextlib
+import io
+import json
+import os
+import shutil
+import stat
+import tempfile
+import unittest
+
+from .. import *
+from ..action_cache import ActionCache
+from ..request_types import *
+from ..renderers import ExecConfig, common_exec
+from ..trace import Tracer
+from .fixtures import flat_sample_requests, sample_requests
+
+COMMON_VARS = {
+    "SRC_DIR": "in",
+    "IN_DIR": "in",
+    "OUT_DIR": "out",
+    "TMP_DIR": "tmp",
+}
+
+
+class CommonExecTest(unittest.TestCase):
+
+    def test_actions(self):
+        requests = flat_sample_requests(COMMON_VARS)
+        actions = common_exec.get_actions(requests, COMMON_VARS)
+        self.assertEqual(
+            ["print", "pool", "res", "res", "copy", "link"],
+            [action.request.name for action in actions])
+        self.assertEqual([OutFile("a.res")], actions[2].output_files)
+        self.assertEqual(
+            [TmpFile("filter.txt"), OutFile("pool.res"), InFile("b.txt")],
+            actions[3].input_files)
+
+    def test_dependencies(self):
+        requests = flat_sample_requests(COMMON_VARS)
+        actions = common_exec.get_actions(requests, COMMON_VARS)
+        self.assertEqual(
+            [[], [], [0, 1], [0, 1], [], [2]],
+            common_exec.get_action_dependencies(actions))
+
+    def test_share_identical_actions(self):
+        configs = []
+        for i, content in enumerate(["+/", "+/", "-/"]):
+            requests = sample_requests()
+            requests[0].content = content
+            common_vars = dict(COMMON_VARS, OUT_DIR="out%d" % i, TMP_DIR="tmp%d" % i)
+            configs.append(ExecConfig(
+                build_dirs = [],
+                requests = flat_sample_requests(common_vars, requests),
+                common_vars = common_vars
+            ))
+        actions = []
+        for config in configs:
+            actions += common_exec.get_actions(config.requests, config.common_vars)
+        actions = common_exec.share_identical_actions(actions, configs, "unix", "bin")
+        shared = [action.shared_from for action in actions]
+        # The second configuration has the same filter.txt and shares all
+        # commands with the first one. The copy is not shared since its input
+        # is not the output of a shared action; the link is. The third
+        # configuration shares only pool.res.
+        self.assertEqual(
+            [None] * 6 + actions[:4] + [None, actions[5]] + [None, actions[1]] + [None] * 4,
+            shared)
+        self.assertEqual(["out0/pool.res"], actions[13].all_input_files())
+        self.assertEqual(["out2/pool.res"], actions[13].all_output_files())
+
+    def test_share_identical_actions_symlink(self):
+        configs = []
+        for i, symlink in enumerate([True, False]):
+            requests = sample_requests()
+            requests[5].symlink = symlink
+            common_vars = dict(COMMON_VARS, OUT_DIR="out%d" % i, TMP_DIR="tmp%d" % i)
+            configs.append(ExecConfig(
+                build_dirs = [],
+                requests = flat_sample_requests(common_vars, requests),
+                common_vars = common_vars
+            ))
+        actions = []
+        for config in configs:
+            actions += common_exec.get_actions(config.requests, config.common_vars)
+        actions = common_exec.share_identical_actions(actions, configs, "unix", "bin")
+        # A copy is not shared with a link of the same file.
+        self.assertEqual(
+            [None] * 6 + actions[:4] + [None, None],
+            [action.shared_from for action in actions])
+
+    def test_incremental_state(self):
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            in_path = os.path.join(tmp_dir, "in.txt")
+            out_path = os.path.join(tmp_dir, "out.res")
+            state_path = os.path.join(tmp_dir, "state.json")
+            for path in (in_path, out_path):
+                with open(path, "w") as f:
+                    f.write("x")
+            os.utime(in_path, (1000, 1000))
+            os.utime(out_path, (2000, 2000))
+
+            state = common_exec.IncrementalState(state_path)
+            self.assertFalse(state.is_up_to_date([in_path], [out_path], "cmd"))
+            state.record([out_path], "cmd")
+            state.save()
+
+            state = common_exec.IncrementalState(state_path)
+            self.assertTrue(state.is_up_to_date([in_path], [out_path], "cmd"))
+            self.assertFalse(state.is_up_to_date([in_path], [out_path], "cmd2"))
+
+            os.utime(in_path, (3000, 3000))
+            state = common_exec.IncrementalState(state_path)
+            self.assertFalse(state.is_up_to_date([in_path], [out_path], "cmd"))
+        finally:
+            shutil.rmtree(tmp_dir)
+
+    def test_action_cache(self):
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            tool_path = os.path.join(tmp_dir, "tool")
+            in_path = os.path.join(tmp_dir, "in.txt")
+            out_path = os.path.join(tmp_dir, "out.res")
+            for path, content in ((tool_path, "tool"), (in_path, "in"), (out_path, "out")):
+                with open(path, "w") as f:
+                    f.write(content)
+
+            cache = ActionCache(os.path.join(tmp_dir, "cache"), 1024)
+            key = cache.compute_key(tool_path, "tool in.txt", [in_path])
+            self.assertFalse(cache.restore(key, [out_path]))
+            cache.store(key, [out_path])
+            os.remove(out_path)
+            self.assertTrue(cache.restore(key, [out_path]))
+            with open(out_path) as f:
+                self.assertEqual("out", f.read())
+            self.assertEqual((1, 1), (cache.hits, cache.misses))
+
+            # Different command line or input contents give a different key
+            self.assertNotEqual(key, cache.compute_key(tool_path, "tool -k in.txt", [in_path]))
+            with open(in_path, "w") as f:
+                f.write("in2")
+            os.utime(in_path, (5000, 5000))
+            self.assertNotEqual(key, cache.compute_key(tool_path, "tool in.txt", [in_path]))
+            self.assertIsNone(cache.compute_key(tool_path, "tool", [in_path + ".missing"]))
+
+            cache.max_size = 0
+            self.assertEqual(0, cache.trim())
+            self.assertFalse(cache.restore(key, [out_path]))
+        finally:
+            shutil.rmtree(tmp_dir)
+
+    def test_action_cache_links(self):
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            src_path = os.path.join(tmp_dir, "src.txt")
+            out_path = os.path.join(tmp_dir, "out.res")
+            with open(src_path, "w") as f:
+                f.write("src")
+            cache = ActionCache(os.path.join(tmp_dir, "cache"), 1024)
+
+            # A symbolic link is not cached.
+            os.symlink(src_path, out_path)
+            cache.store("aa", [out_path])
+            self.assertFalse(cache.restore("aa", [out_path]))
+
+            # Restoring replaces a link instead of writing through it.
+            os.remove(out_path)
+            with open(out_path, "w") as f:
+                f.write("out")
+            cache.store("bb", [out_path])
+            os.remove(out_path)
+            os.link(src_path, out_path)
+            self.assertTrue(cache.restore("bb", [out_path]))
+            with open(src_path) as f:
+                self.assertEqual("src", f.read())
+            with open(out_path) as f:
+                self.assertEqual("out", f.read())
+
+            # The cache entry does not change with the restored output.
+            with open(out_path, "w") as f:
+                f.write("changed")
+            os.remove(out_path)
+            self.assertTrue(cache.restore("bb", [out_path]))
+            with open(out_path) as f:
+                self.assertEqual("out", f.read())
+        finally:
+            shutil.rmtree(tmp_dir)
+
+
+# Writes start and end lines to a log file around two lines of output, and
+# creates its output file unless it is given an exit status. The last
+# argument is the number of seconds between the lines.
+FAKE_TOOL = """#!/bin/sh
+echo "start $2" >> "$1"
+echo "$2 output 1"
+sleep "$5"
+echo "$2 output 2"
+echo "end $2" >> "$1"
+if [ -n "$4" ]; then exit "$4"; fi
+touch "$3"
+"""
+
+
+@unittest.skipIf(os.name != "posix", "needs a POSIX shell")
+class RunParallelTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.common_vars = {
+            "SRC_DIR": self.tmp_dir,
+            "IN_DIR": self.tmp_dir,
+            "OUT_DIR": os.path.join(self.tmp_dir, "out"),
+            "TMP_DIR": self.tmp_dir,
+        }
+        os.mkdir(self.common_vars["OUT_DIR"])
+        tool_path = os.path.join(self.tmp_dir, "genrb")
+        with open(tool_path, "w") as f:
+            f.write(FAKE_TOOL)
+        os.chmod(tool_path, os.stat(tool_path).st_mode | stat.S_IEXEC)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def _request(self, name, deps=(), status=0, seconds=0.05):
+        return SingleExecutionRequest(
+            name = name,
+            input_files = [OutFile("%s.res" % dep) for dep in deps],
+            output_files = [OutFile("%s.res" % name)],
+            tool = IcuTool("genrb"),
+            args = "{TMP_DIR}/log.txt %s {OUT_DIR}/%s.res %s %s" % (
+                name, name, status or "''", seconds),
+            format_with = {}
+        )
+
+    def _run(self, requests, jobs):
+        actions = common_exec.get_actions(requests, self.common_vars)
+        out = io.StringIO()
+        with contextlib.redirect_stdout(out):
+            status = common_exec.run_parallel(
+                actions, jobs, platform = "unix", tool_dir = self.tmp_dir, verbose = True)
+        try:
+            with open(os.path.join(self.tmp_dir, "log.txt")) as f:
+                log = f.read().splitlines()
+        except IOError:
+            log = []
+        return status, log, out.getvalue()
+
+    def test_order(self):
+        status, log, _ = self._run([
+            self._request("d", deps = ["b", "c"]),
+            self._request("b", deps = ["a"]),
+            self._request("c", deps = ["a"]),
+            self._request("a"),
+        ], 4)
+        self.assertEqual(0, status)
+        self.assertEqual(8, len(log))
+        self.assertEqual(["start a", "end a"], log[:2])
+        self.assertEqual(["start d", "end d"], log[-2:])
+        self.assertEqual({"start b", "end b", "start c", "end c"}, set(log[2:6]))
+
+    def test_failure(self):
+        # After "a" fails, neither its dependent nor the other ready
+        # requests are started.
+        status, log, _ = self._run([
+            self._request("a", status = 3),
+            self._request("b", deps = ["a"]),
+            self._request("c"),
+            self._request("d"),
+        ], 1)
+        self.assertEqual(3, status)
+        self.assertEqual(["start a", "end a"], log)
+        self.assertFalse(os.path.exists(os.path.join(self.common_vars["OUT_DIR"], "c.res")))
+
+    def test_failure_running(self):
+        # Requests that are already running finish.
+        status, log, _ = self._run([
+            self._request("a", status = 2, seconds = 0),
+            self._request("b", seconds = 0.5),
+            self._request("c", deps = ["b"]),
+        ], 2)
+        self.assertEqual(2, status)
+        self.assertEqual({"start a", "end a", "start b", "end b"}, set(log))
+
+    def test_buffered_output(self):
+        requests = [self._request(name) for name in "abcd"]
+        requests.append(self._request("e", status = 1))
+        status, _, output = self._run(requests, 5)
+        self.assertEqual(1, status)
+        lines = output.splitlines()
+        for name in "abcde":
+            i = lines.index("%s output 1" % name)
+            self.assertTrue(lines[i - 1].startswith("Running: "), lines)
+            self.assertTrue(lines[i - 1].endswith(" %s %s/%s.res %s" % (
+                name, self.common_vars["OUT_DIR"], name, "1 0.05" if name == "e" else "'' 0.05")), lines)
+            self.assertEqual("%s output 2" % name, lines[i + 1])
+        i = lines.index("e output 2")
+        self.assertTrue(lines[i + 1].startswith("Command failed: "), lines)
+
+    def test_trace(self):
+        tracer = Tracer(enabled = True)
+        out = io.StringIO()
+        with contextlib.redirect_stdout(out):
+            status = common_exec.run(
+                [],
+                [self._request("b", deps = ["a"]), self._request("a"), self._request("c")],
+                self.common_vars,
+                platform = "unix",
+                tool_dir = self.tmp_dir,
+                verbose = False,
+                jobs = 2,
+                tracer = tracer)
+        self.assertEqual(0, status)
+        trace_path = os.path.join(self.tmp_dir, "trace.json")
+        tracer.write(trace_path)
+        with open(trace_path) as f:
+            events = json.load(f)["traceEvents"]
+
+        thread_names = {
+            event["tid"]: event["args"]["name"]
+            for event in events
+            if event["ph"] == "M" and event["name"] == "thread_name"
+        }
+        self.assertEqual({0: "main", 1: "worker 1", 2: "worker 2"}, thread_names)
+        spans = sorted(
+            (event for event in events if event["ph"] == "X"),
+            key = lambda event: event["name"])
+        self.assertEqual(["a", "b", "c"], [span["name"] for span in spans])
+        for span in spans:
+            self.assertIn(span["tid"], (1, 2))
+            self.assertEqual("SingleExecutionRequest", span["cat"])
+            self.assertEqual(span["name"], span["args"]["request"])
+            self.assertEqual("genrb", span["args"]["tool"])
+            self.assertGreaterEqual(span["dur"], 0)
+        self.assertEqual("a.res", spans[1]["args"]["input_file"])
+        # "b" starts after "a" ends.
+        self.assertGreaterEqual(spans[1]["ts"], spans[0]["ts"] + spans[0]["dur"])
+
+
+# Export the test for the runner
+suite = unittest.TestSuite([
+    unittest.makeSuite(CommonExecTest),
+    unittest.makeSuite(RunParallelTest),
+])
@@ -0,0 +1,67 @@
+# Copyright (C) 2018 and later: Unicode, Inc. and others.
+# License & terms of use: http://www.unicode.org/copyright.html
+
+import os
+import shutil
+import subprocess
+import tempfile
+import unittest
+
+from .. import copy_strategy
+
+
+class CopyStrategyTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.in_path = os.path.join(self.tmp_dir, "in.txt")
+        self.out_path = os.path.join(self.tmp_dir, "out.txt")
+        with open(self.in_path, "w") as f:
+            f.write("in")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_strategies(self):
+        for strategy in copy_strategy.COPY_STRATEGIES:
+            used = copy_strategy.copy_file(self.in_path, self.out_path, strategy)
+            self.assertIn(used, copy_strategy.FALLBACK_ORDER)
+            with open(self.out_path) as f:
+                self.assertEqual("in", f.read(), strategy)
+
+    def test_replace_link(self):
+        # Replacing a hard link must not write through to the input file.
+        os.link(self.in_path, self.out_path)
+        other_path = os.path.join(self.tmp_dir, "other.txt")
+        with open(other_path, "w") as f:
+            f.write("other")
+        copy_strategy.copy_file(other_path, self.out_path, "copy")
+        with open(self.in_path) as f:
+            self.assertEqual("in", f.read())
+        with open(self.out_path) as f:
+            self.assertEqual("other", f.read())
+
+    def test_shell_copy_command(self):
+        self.assertEqual("rm -f b && cp a b", copy_strategy.shell_copy_command("auto", "a", "b"))
+        self.assertEqual(
+            "rm -f b && ln a b 2>/dev/null || cp a b",
+            copy_strategy.shell_copy_command("hardlink", "a", "b"))
+
+    @unittest.skipIf(os.name != "posix", "needs a POSIX shell")
+    def test_shell_replace_link(self):
+        # An input file linked into place by an earlier build
+        os.symlink(self.in_path, self.out_path)
+        other_path = os.path.join(self.tmp_dir, "other.txt")
+        with open(other_path, "w") as f:
+            f.write("other")
+        for strategy in copy_strategy.COPY_STRATEGIES:
+            subprocess.check_call(copy_strategy.shell_copy_command(
+                strategy, other_path, self.out_path), shell = True)
+            with open(self.in_path) as f:
+                self.assertEqual("in", f.read(), strategy)
+            with open(self.out_path) as f:
+                self.assertEqual("other", f.read(), strategy)
+
+
+# Export the test for the runner
+suite = unittest.makeSuite(CopyStrategyTest)
@@ -0,0 +1,148 @@
+# Copyright (C) 2018 and later: Unicode, Inc. and others.
+# License & terms of use: http://www.unicode.org/copyright.html
+
+import io as pyio
+import os
+import shutil
+import tempfile
+import unittest
+
+from .. import *
+from ..explain import explain_filters, write_explanation
+from ..request_types import *
+from .fixtures import TestConfig, TestIO
+
+
+LOCALES = ["root", "de", "en", "en_GB", "fr"]
+
+COMMON_VARS = {
+    "SRC_DIR": "src",
+    "IN_DIR": "src",
+    "OUT_DIR": "out",
+    "TMP_DIR": "tmp",
+}
+
+
+class ExplainTest(unittest.TestCase):
+
+    def setUp(self):
+        self.out_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.out_dir)
+
+    def _requests(self):
+        return [
+            RepeatedOrSingleExecutionRequest(
+                name = "locales_res",
+                category = "locales_tree",
+                dep_targets = [],
+                input_files = [InFile("locales/%s.txt" % locale) for locale in LOCALES],
+                output_files = [OutFile("%s.res" % locale) for locale in LOCALES],
+                tool = IcuTool("genrb"),
+                args = "{INPUT_BASENAME}",
+                format_with = {},
+                repeat_with = {
+                    "INPUT_BASENAME": ["%s.txt" % locale for locale in LOCALES]
+                }
+            ),
+            SingleExecutionRequest(
+                name = "misc_a",
+                category = "misc",
+                dep_targets = [],
+                input_files = [InFile("misc/a.txt")],
+                output_files = [OutFile("a.res")],
+                tool = IcuTool("genrb"),
+                args = "a.txt",
+                format_with = {}
+            ),
+            SingleExecutionRequest(
+                name = "misc_b",
+                category = "misc",
+                dep_targets = [],
+                input_files = [InFile("misc/b.txt")],
+                output_files = [OutFile("b.res")],
+                tool = IcuTool("genrb"),
+                args = "b.txt",
+                format_with = {}
+            ),
+            PrintFileRequest(
+                name = "list",
+                output_file = TmpFile("list.txt"),
+                content = "a.res\nb.res"
+            ),
+        ]
+
+    def _write(self, filename, size):
+        with open(os.path.join(self.out_dir, filename), "wb") as f:
+            f.write(b"x" * size)
+
+    def test_explain(self):
+        config = TestConfig({
+            "localeFilter": {
+                "filterType": "language",
+                "includelist": ["en"]
+            },
+            "featureFilters": {
+                "misc": {
+                    "filterType": "union",
+                    "unionOf": [
+                        {"includelist": ["c"]},
+                        {"includelist": ["b"]}
+                    ]
+                }
+            },
+            "resourceFilters": [
+                {
+                    "categories": ["locales_tree"],
+                    "files": {"includelist": ["en_GB", "de"]},
+                    "rules": ["-/Ellipsis"]
+                }
+            ]
+        })
+        for locale in LOCALES:
+            self._write("%s.res" % locale, 10)
+        self._write("a.res", 100)
+        explanation = explain_filters(
+            self._requests(), config, TestIO(), COMMON_VARS, self.out_dir)
+
+        locales, misc = explanation.categories
+        self.assertEqual("locales_tree", locales.category)
+        self.assertEqual(
+            ["locales/root.txt", "locales/en.txt", "locales/en_GB.txt"],
+            [file.filename for file, _ in locales.kept])
+        self.assertEqual(
+            ["locales/de.txt", "locales/fr.txt"],
+            [file.filename for file, _ in locales.dropped])
+        self.assertEqual({"localeFilter"}, set(rule for _, rule in locales.kept + locales.dropped))
+        self.assertEqual(
+            [(InFile("misc/b.txt"), "featureFilters.misc.unionOf[1]")],
+            misc.kept)
+        self.assertEqual([(InFile("misc/a.txt"), "featureFilters.misc")], misc.dropped)
+
+        # de.txt was dropped before the resource filter applies.
+        resource_filter, = explanation.resource_filters
+        self.assertEqual([InFile("locales/en_GB.txt")], resource_filter.files)
+
+        locales_size, misc_size = explanation.sizes
+        self.assertEqual(("locales_tree", 3, 30, 2, 20, 0), locales_size)
+        # b.res is not in the previous build.
+        self.assertEqual(("misc", 1, 0, 1, 100, 1), misc_size)
+
+        out = pyio.StringIO()
+        write_explanation(out, explanation, self.out_dir)
+        self.assertIn("misc: kept 1 of 2 files\n", out.getvalue())
+        self.assertIn("  - misc/a.txt (featureFilters.misc)\n", out.getvalue())
+        self.assertIn("1 files are not in the previous build", out.getvalue())
+
+    def test_no_sizes(self):
+        explanation = explain_filters(self._requests(), TestConfig({}), TestIO(), COMMON_VARS)
+        self.assertIsNone(explanation.sizes)
+        self.assertEqual([], explanation.resource_filters)
+        for category in explanation.categories:
+            self.assertEqual([], category.dropped)
+            self.assertEqual({"strategy subtractive"}, set(rule for _, rule in category.kept))
+
+
+# Export the test for the runner
+suite = unittest.makeSuite(ExplainTest)
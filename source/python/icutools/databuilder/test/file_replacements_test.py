@@ -0,0 +1,57 @@
+# Copyright (C) 2018 and later: Unicode, Inc. and others.
+# License & terms of use: http://www.unicode.org/copyright.html
+
+import unittest
+
+from .. import *
+from ..planning import add_copy_input_requests
+from ..request_types import *
+from .fixtures import TestConfig
+
+
+class FileReplacementsTest(unittest.TestCase):
+
+    def _copy_requests(self, file_replacements):
+        requests = [
+            SingleExecutionRequest(
+                name = "res",
+                category = "locales",
+                dep_targets = [InFile("dep.txt")],
+                input_files = [InFile("a.txt"), InFile("b.txt")],
+                output_files = [OutFile("a.res")],
+                tool = IcuTool("genrb"),
+                args = "",
+                format_with = {}
+            )
+        ]
+        config = TestConfig({"fileReplacements": dict({
+            "directory": "/repl",
+            "replacements": ["a.txt", {"src": "c.txt", "dest": "b.txt"}]
+        }, **file_replacements)})
+        result = add_copy_input_requests(requests, config, {})
+        self.assertIs(requests[0], result[-1])
+        return {
+            request.output_file.filename: (request.input_file, request.symlink)
+            for request in result[:-1]
+        }
+
+    def test_copy(self):
+        expected = {
+            "a.txt": (LocalFile("/repl", "a.txt"), False),
+            "b.txt": (LocalFile("/repl", "c.txt"), False),
+            "dep.txt": (SrcFile("dep.txt"), False),
+        }
+        self.assertEqual(expected, self._copy_requests({}))
+        self.assertEqual(expected, self._copy_requests({"unreplacedFiles": "copy"}))
+
+    def test_symlink(self):
+        # Only the files that are not replaced are links.
+        self.assertEqual({
+            "a.txt": (LocalFile("/repl", "a.txt"), False),
+            "b.txt": (LocalFile("/repl", "c.txt"), False),
+            "dep.txt": (SrcFile("dep.txt"), True),
+        }, self._copy_requests({"unreplacedFiles": "symlink"}))
+
+
+# Export the test for the runner
+suite = unittest.makeSuite(FileReplacementsTest)
@@ -1,88 +1,12 @@
 # Copyright (C) 2018 and later: Unicode, Inc. and others.
 # License & terms of use: http://www.unicode.org/copyright.html
 
-import io as pyio
-import json
-import os
 import unittest
 
-from .. import InFile
-from ..comment_stripper import CommentStripper
-from ..filtration import Filter
-
-EXAMPLE_FILE_STEMS = [
-    "af_NA",
-    "af_VARIANT",
-    "af_ZA_VARIANT",
-    "af_ZA",
-    "af",
-    "ar",
-    "ar_SA",
-    "ars",
-    "bs_BA",
-    "bs_Cyrl_BA",
-    "bs_Cyrl",
-    "bs_Latn_BA",
-    "bs_Latn",
-    "bs",
-    "en_001",
-    "en_150",
-    "en_DE",
-    "en_GB",
-    "en_US",
-    "root",
-    "sr_BA",
-    "sr_CS",
-    "sr_Cyrl_BA",
-    "sr_Cyrl_CS",
-    "sr_Cyrl_ME",
-    "sr_Cyrl",
-    "sr_Latn_BA",
-    "sr_Latn_CS",
-    "sr_Latn_ME_VARIANT",
-    "sr_Latn_ME",
-    "sr_Latn",
-    "sr_ME",
-    "sr",
-    "vai_Latn_LR",
-    "vai_Latn",
-    "vai_LR",
-    "vai_Vaii_LR",
-    "vai_Vaii",
-    "vai",
-    "yue",
-    "zh_CN",
-    "zh_Hans_CN",
-    "zh_Hans_HK",
-    "zh_Hans_MO",
-    "zh_Hans_SG",
-    "zh_Hans",
-    "zh_Hant_HK",
-    "zh_Hant_MO",
-    "zh_Hant_TW",
-    "zh_Hant",
-    "zh_HK",
-    "zh_MO",
-    "zh_SG",
-    "zh_TW",
-    "zh"
-]
-
-
-class TestIO(object):
-    def __init__(self):
-        pass
-
-    def read_locale_deps(self, tree):
-        if tree not in ("brkitr", "locales", "rbnf"):
-            return None
-        with pyio.open(os.path.join(
-                os.path.dirname(__file__),
-                "sample_data",
-                tree,
-                "LOCALE_DEPS.json"
-                ), "r", encoding="utf-8-sig") as f:
-            return json.load(CommentStripper(f))
+from .. import *
+from ..filtration import Filter, InclusionFilter, ResourceFilterInfo, get_resource_keys
+from ..request_types import *
+from .fixtures import EXAMPLE_FILE_STEMS, TestIO
 
 
 class FiltrationTest(unittest.TestCase):
@@ -373,6 +297,82 @@ class FiltrationTest(unittest.TestCase):
             "zh"
         ])
 
+    def test_union_compiled(self):
+        filter = Filter.create_from_json({
+            "filterType": "union",
+            "unionOf": [
+                {
+                    "filterType": "locale",
+                    "whitelist": [
+                        "sr_Latn"
+                    ]
+                },
+                {
+                    "filterType": "union",
+                    "unionOf": [
+                        {
+                            "whitelist": [
+                                "ars"
+                            ]
+                        },
+                        {
+                            "filterType": "exclude"
+                        },
+                        {
+                            "filterType": "regex",
+                            "whitelist": [
+                                r"^vai_L",
+                                r"^(zh)_\1"
+                            ]
+                        }
+                    ]
+                },
+                {
+                    "filterType": "language",
+                    "blacklist": [
+                        "af", "ar", "bs", "en", "sr", "vai", "yue", "zh"
+                    ]
+                },
+                {
+                    "whitelist": [
+                        "zh_Hans"
+                    ]
+                },
+                {
+                    "filterType": "regex",
+                    "whitelist": [
+                        r"^bs_.*BA$",
+                        r"^en_\d+"
+                    ]
+                }
+            ]
+        }, TestIO())
+        compiled = filter.compile()
+        # The nested union is flattened, and the file-stem includelists and
+        # the regex includelists are merged.
+        self.assertEqual(
+            ["LanguageFilter", "FileStemFilter", "RegexFilter", "LocaleFilter"],
+            [type(sub_filter).__name__ for sub_filter in compiled.sub_filters])
+        self._check_filter(filter, [
+            "ars",
+            "zh_Hans",
+            "root",
+            "sr_Latn",
+            "sr_Latn_BA",
+            "sr_Latn_CS",
+            "sr_Latn_ME_VARIANT",
+            "sr_Latn_ME",
+            "sr_ME",
+            "vai_Latn_LR",
+            "vai_Latn",
+            "vai_LR",
+            "bs_BA",
+            "bs_Cyrl_BA",
+            "bs_Latn_BA",
+            "en_001",
+            "en_150",
+        ])
+
     def test_hk_deps_normal(self):
         self._check_filter(Filter.create_from_json({
             "filterType": "locale",
@@ -411,11 +411,97 @@ class FiltrationTest(unittest.TestCase):
             "zh",
         ], "brkitr")
 
+    def test_resource_keys(self):
+        self.assertEqual(
+            ["%%ALIAS", "a b", "k", "alias"],
+            get_resource_keys(
+                "// Copyright\n"
+                "en{\n"
+                "    \"%%ALIAS\"{\"en_GB\"}\n"
+                "    \"a b\"{\"}\\\"{\"}\n"
+                "    k:table(nofallback) // {\n"
+                "    /* { */ {\n"
+                "        x{\"//\"}\n"
+                "    }\n"
+                "    alias:alias{\"/x\"}\n"
+                "}\n"))
+        self.assertEqual([], get_resource_keys("en{}"))
+        self.assertIsNone(get_resource_keys("en{"))
+        self.assertIsNone(get_resource_keys("::NFC;"))
+
+    def test_drop_empty_resource_files(self):
+        keys = {
+            "root": ["NumberElements"],
+            "en": ["NumberElements"],
+            "en_GB": ["Currencies"],
+            "en_001": ["%%Parent", "Currencies"],
+            # The parent of sr_Latn_ME
+            "sr_Latn": ["Currencies"],
+            "sr_Latn_ME": ["NumberElements"],
+            "zh": ["Currencies", "NumberElements"],
+        }
+        locales = sorted(keys)
+        request = self._genrb_request(locales)
+        io = TestIO(dict(
+            ("locales/%s.txt" % locale, locale_keys)
+            for locale, locale_keys in keys.items()
+        ))
+        filter_info = ResourceFilterInfo("locales_tree", "additive")
+        filter_info.apply_to_requests([request])
+        filter_info.add_rules(InclusionFilter(), ["+/NumberElements/latn", "-/NumberElements/arab"])
+        requests = filter_info.drop_empty_files([request], io)
+
+        kept = ["en", "en_001", "root", "sr_Latn", "sr_Latn_ME", "zh"]
+        self.assertEqual([request], requests)
+        self.assertEqual([InFile("locales/%s.txt" % locale) for locale in kept], request.input_files)
+        self.assertEqual([OutFile("%s.res" % locale) for locale in kept], request.output_files)
+        self.assertEqual(
+            [TmpFile("filters/locales_tree/%s.txt" % locale) for locale in kept],
+            request.dep_targets[0])
+        self.assertEqual(request.input_files, filter_info.input_files)
+        self.assertEqual(request.dep_targets[0], filter_info.filter_files)
+
+        # The subtractive strategy keeps the resources without rules.
+        request = self._genrb_request(locales)
+        filter_info = ResourceFilterInfo("locales_tree", "subtractive")
+        filter_info.apply_to_requests([request])
+        filter_info.add_rules(InclusionFilter(), ["-/Currencies"])
+        filter_info.drop_empty_files([request], io)
+        self.assertEqual(
+            [InFile("locales/%s.txt" % locale) for locale in locales if locale != "en_GB"],
+            request.input_files)
+
+    def _genrb_request(self, locales):
+        return RepeatedOrSingleExecutionRequest(
+            name = "locales_res",
+            category = "locales_tree",
+            dep_targets = [],
+            input_files = [InFile("locales/%s.txt" % locale) for locale in locales],
+            output_files = [OutFile("%s.res" % locale) for locale in locales],
+            tool = IcuTool("genrb"),
+            args = "{INPUT_BASENAME}",
+            format_with = {},
+            repeat_with = {
+                "INPUT_BASENAME": ["%s.txt" % locale for locale in locales]
+            }
+        )
+
     def _check_filter(self, filter, expected_matches, tree="locales"):
-        for file_stem in EXAMPLE_FILE_STEMS:
-            is_match = filter.match(InFile("%s/%s.txt" % (tree, file_stem)))
+        files = [InFile("%s/%s.txt" % (tree, file_stem)) for file_stem in EXAMPLE_FILE_STEMS]
+        for file_stem, file in zip(EXAMPLE_FILE_STEMS, files):
+            is_match = filter.match(file)
             expected_match = file_stem in expected_matches
             self.assertEqual(is_match, expected_match, file_stem)
+        self.assertEqual(
+            [file_stem in expected_matches for file_stem in EXAMPLE_FILE_STEMS],
+            filter.match_many(files))
+        # The compiled filter must match the same files.
+        compiled = filter.compile()
+        for file_stem, file in zip(EXAMPLE_FILE_STEMS, files):
+            self.assertEqual(compiled.match(file), file_stem in expected_matches, file_stem)
+        self.assertEqual(
+            [file_stem in expected_matches for file_stem in EXAMPLE_FILE_STEMS],
+            compiled.match_many(files))
 
 # Export the test for the runner
 suite = unittest.makeSuite(FiltrationTest)
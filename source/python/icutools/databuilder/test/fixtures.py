@@ -0,0 +1,164 @@
+# Copyright (C) 2018 and later: Unicode, Inc. and others.
+# License & terms of use: http://www.unicode.org/copyright.html
+
+"""Fakes and sample requests shared by the tests."""
+
+import io as pyio
+import json
+import os
+
+from .. import *
+from .. import utils
+from ..comment_stripper import CommentStripper
+from ..request_types import *
+
+EXAMPLE_FILE_STEMS = [
+    "af_NA",
+    "af_VARIANT",
+    "af_ZA_VARIANT",
+    "af_ZA",
+    "af",
+    "ar",
+    "ar_SA",
+    "ars",
+    "bs_BA",
+    "bs_Cyrl_BA",
+    "bs_Cyrl",
+    "bs_Latn_BA",
+    "bs_Latn",
+    "bs",
+    "en_001",
+    "en_150",
+    "en_DE",
+    "en_GB",
+    "en_US",
+    "root",
+    "sr_BA",
+    "sr_CS",
+    "sr_Cyrl_BA",
+    "sr_Cyrl_CS",
+    "sr_Cyrl_ME",
+    "sr_Cyrl",
+    "sr_Latn_BA",
+    "sr_Latn_CS",
+    "sr_Latn_ME_VARIANT",
+    "sr_Latn_ME",
+    "sr_Latn",
+    "sr_ME",
+    "sr",
+    "vai_Latn_LR",
+    "vai_Latn",
+    "vai_LR",
+    "vai_Vaii_LR",
+    "vai_Vaii",
+    "vai",
+    "yue",
+    "zh_CN",
+    "zh_Hans_CN",
+    "zh_Hans_HK",
+    "zh_Hans_MO",
+    "zh_Hans_SG",
+    "zh_Hans",
+    "zh_Hant_HK",
+    "zh_Hant_MO",
+    "zh_Hant_TW",
+    "zh_Hant",
+    "zh_HK",
+    "zh_MO",
+    "zh_SG",
+    "zh_TW",
+    "zh"
+]
+
+
+class TestIO(object):
+    """
+    Reads LOCALE_DEPS.json from sample_data. The resource keys and the file
+    sizes come from the dicts given to the constructor.
+    """
+    def __init__(self, resource_keys=None, sizes=None):
+        self.resource_keys = resource_keys
+        self.sizes = sizes
+
+    def read_resource_keys(self, filename):
+        return self.resource_keys[filename]
+
+    def file_size(self, filename):
+        return self.sizes[filename]
+
+    def read_locale_deps(self, tree):
+        if tree not in ("brkitr", "locales", "rbnf"):
+            return None
+        with pyio.open(os.path.join(
+                os.path.dirname(__file__),
+                "sample_data",
+                tree,
+                "LOCALE_DEPS.json"
+                ), "r", encoding="utf-8-sig") as f:
+            return json.load(CommentStripper(f))
+
+
+class TestConfig(object):
+    def __init__(self, filters_json_data=None, io=None, max_parallel=False, num_shards=None):
+        self.filters_json_data = filters_json_data or {}
+        self.strategy = "subtractive"
+        self.io = io
+        self.max_parallel = max_parallel
+        self.num_shards = num_shards
+
+
+def sample_requests():
+    """
+    Returns one request of each type, with dependencies between them. The
+    copy has the same file name as the TmpFile of the PrintFileRequest but
+    a different directory.
+    """
+    return [
+        PrintFileRequest(
+            name = "print",
+            category = "filter",
+            output_file = TmpFile("filter.txt"),
+            content = "+/"
+        ),
+        SingleExecutionRequest(
+            name = "pool",
+            category = "pool",
+            input_files = [InFile("a.txt"), InFile("b.txt"), LocalFile("$SRC/x", "c.txt")],
+            output_files = [OutFile("pool.res")],
+            tool = IcuTool("genrb"),
+            args = "{INPUT_FILES[0]} {INPUT_FILES[1]}",
+            format_with = {}
+        ),
+        RepeatedExecutionRequest(
+            name = "res",
+            category = "locales",
+            input_files = [InFile("a.txt"), InFile("b.txt")],
+            output_files = [OutFile("a.res"), OutFile("b.res")],
+            dep_targets = [TmpFile("filter.txt"), OutFile("pool.res")],
+            tool = IcuTool("genrb"),
+            args = "-s {IN_DIR} '{{x}}' {INPUT_FILE}",
+            format_with = {}
+        ),
+        VariableRequest(
+            name = "all",
+            input_files = [OutFile("a.res"), OutFile("b.res")]
+        ),
+        CopyRequest(
+            name = "copy",
+            input_file = OutFile("filter.txt"),
+            output_file = OutFile("filter2.txt")
+        ),
+        CopyRequest(
+            name = "link",
+            input_file = OutFile("a.res"),
+            output_file = OutFile("c.res"),
+            symlink = True
+        ),
+    ]
+
+
+def flat_sample_requests(common_vars, requests=None):
+    """Returns the sample requests (or the given ones) flattened."""
+    if requests is None:
+        requests = sample_requests()
+    return utils.flatten_requests(requests, TestConfig(), common_vars)
@@ -0,0 +1,83 @@
+# Copyright (C) 2018 and later: Unicode, Inc. and others.
+# License & terms of use: http://www.unicode.org/copyright.html
+
+import io
+import json
+import unittest
+
+from .. import *
+from ..renderers import graph, makefile
+from .fixtures import flat_sample_requests
+
+COMMON_VARS = {
+    "SRC_DIR": "/src",
+    "IN_DIR": "/src",
+    "OUT_DIR": "/out",
+    "TMP_DIR": "/tmp",
+}
+
+
+class GraphTest(unittest.TestCase):
+
+    def test_nodes(self):
+        requests = flat_sample_requests(COMMON_VARS)
+        nodes = graph.get_graph_nodes(requests, COMMON_VARS, "bin")
+        self.assertEqual(
+            ["print", "exec", "exec", "exec", "variable", "copy", "copy"],
+            [node["type"] for node in nodes])
+        self.assertEqual({
+            "id": 3,
+            "name": "res_b",
+            "category": "locales",
+            "type": "exec",
+            "tool": "genrb",
+            "args": "-s /src '{x}' b.txt",
+            "argv": ["bin/genrb", "-s", "/src", "{x}", "b.txt"],
+            "inputs": ["/tmp/filter.txt", "/out/pool.res", "/src/b.txt"],
+            "outputs": ["/out/b.res"],
+            "deps": [0, 1],
+        }, nodes[3])
+        self.assertEqual(["/src/a.txt", "/src/b.txt", "/src/x/c.txt"], nodes[1]["inputs"])
+        self.assertEqual({
+            "id": 4,
+            "name": "all",
+            "category": None,
+            "type": "variable",
+            "inputs": ["/out/a.res", "/out/b.res"],
+            "outputs": [],
+            "deps": [2, 3],
+        }, nodes[4])
+        self.assertEqual([2], nodes[6]["deps"])
+        self.assertTrue(nodes[6]["symlink"])
+
+    def test_round_trip(self):
+        requests = flat_sample_requests(COMMON_VARS)
+        for graph_format in graph.GRAPH_FORMATS:
+            out = io.StringIO()
+            graph.write_graph(out, requests, COMMON_VARS, "bin", graph_format)
+            read_requests, common_vars = graph.read_graph(io.StringIO(out.getvalue()))
+            self.assertEqual("/out", common_vars["OUT_DIR"])
+            self.assertEqual(
+                graph.get_graph_nodes(requests, COMMON_VARS, "bin"),
+                graph.get_graph_nodes(read_requests, common_vars, "bin"),
+                graph_format)
+
+    def test_makefile_from_graph(self):
+        requests = flat_sample_requests(COMMON_VARS)
+        out = io.StringIO()
+        graph.write_graph(out, requests, COMMON_VARS, "bin")
+        read_requests, common_vars = graph.read_graph(io.StringIO(out.getvalue()))
+        # The Makefile has the same variables, but one rule per command.
+        for content in (
+                makefile.get_gnumake_rules([], requests, {}, common_vars = COMMON_VARS),
+                makefile.get_gnumake_rules([], read_requests, {}, common_vars = common_vars)):
+            self.assertIn("ALL = $(addprefix /out/,a.res b.res)\n", content)
+        self.assertIn("/out/b.res: /tmp/filter.txt", content)
+
+    def test_version(self):
+        with self.assertRaises(ValueError):
+            graph.read_graph(io.StringIO(json.dumps({"version": 0, "common_vars": {}})))
+
+
+# Export the test for the runner
+suite = unittest.makeSuite(GraphTest)
@@ -0,0 +1,78 @@
+# Copyright (C) 2018 and later: Unicode, Inc. and others.
+# License & terms of use: http://www.unicode.org/copyright.html
+
+import argparse
+import unittest
+
+from .. import *
+from ..locale_budget import budget_type, get_locale_files, select_locales
+from ..request_types import *
+from .fixtures import EXAMPLE_FILE_STEMS, TestConfig, TestIO
+
+
+class LocaleBudgetTest(unittest.TestCase):
+
+    def setUp(self):
+        self.locale_files = {
+            "locales_tree": [
+                (InFile("locales/%s.txt" % file_stem), OutFile("%s.res" % file_stem))
+                for file_stem in EXAMPLE_FILE_STEMS
+            ]
+        }
+        self.file_sizes = dict(
+            (output_file, 10)
+            for _, output_file in self.locale_files["locales_tree"]
+        )
+
+    def test_select_locales(self):
+        # Each locale adds itself and root, if root was not selected yet.
+        selected, costs = select_locales(
+            ["zh_Hant", "sr_Latn", "bs", "af"], 40, self.locale_files, self.file_sizes,
+            TestIO(), include_children = False)
+        self.assertEqual(["zh_Hant", "sr_Latn", "bs"], selected)
+        self.assertEqual([20, 10, 10, 10], [cost.size for cost in costs])
+        self.assertEqual([20, 30, 40, 40], [cost.total for cost in costs])
+
+    def test_select_locales_children(self):
+        # zh_Hant and its children do not fit, but sr_Latn and its children do.
+        selected, costs = select_locales(
+            ["zh_Hant", "sr_Latn", "bs"], 70, self.locale_files, self.file_sizes, TestIO())
+        self.assertEqual(["sr_Latn"], selected)
+        self.assertEqual([False, True, False], [cost.selected for cost in costs])
+        self.assertEqual(70, costs[-1].total)
+
+    def test_get_locale_files(self):
+        requests = [
+            RepeatedOrSingleExecutionRequest(
+                name = "%s_res" % tree,
+                category = "%s_tree" % tree,
+                dep_targets = [],
+                input_files = [InFile("%s/en.txt" % tree)],
+                output_files = [OutFile("%s/en.res" % tree)],
+                tool = IcuTool("genrb"),
+                args = "",
+                format_with = {},
+                repeat_with = {}
+            )
+            for tree in ("curr", "lang", "zone")
+        ]
+        config = TestConfig({
+            "featureFilters": {
+                "lang_tree": "exclude",
+                "zone_tree": "include"
+            }
+        })
+        self.assertEqual({
+            "curr_tree": [(InFile("curr/en.txt"), OutFile("curr/en.res"))],
+            "zone_tree": [(InFile("zone/en.txt"), OutFile("zone/en.res"))],
+        }, get_locale_files(requests, config))
+
+    def test_budget_type(self):
+        self.assertEqual(1000, budget_type("1000"))
+        self.assertEqual(2048, budget_type("2k"))
+        self.assertEqual(3 * 1024 * 1024, budget_type("3M"))
+        self.assertRaises(argparse.ArgumentTypeError, budget_type, "3G")
+
+
+# Export the test for the runner
+suite = unittest.makeSuite(LocaleBudgetTest)
@@ -0,0 +1,148 @@
+# Copyright (C) 2018 and later: Unicode, Inc. and others.
+# License & terms of use: http://www.unicode.org/copyright.html
+
+import io
+import os
+import shutil
+import subprocess
+import tempfile
+import unittest
+
+from .. import *
+from .. import utils
+from ..request_types import *
+from ..renderers import makefile
+from .fixtures import flat_sample_requests
+
+COMMON_VARS = {
+    "SRC_DIR": "$(srcdir)",
+    "IN_DIR": "$(srcdir)",
+    "OUT_DIR": "$(OUT_DIR)",
+    "TMP_DIR": "$(TMP_DIR)",
+}
+
+
+class MakefileTest(unittest.TestCase):
+
+    def test_stream(self):
+        requests = flat_sample_requests(COMMON_VARS)
+        build_dirs = utils.compute_directories(requests)
+        out = io.StringIO()
+        makefile.write_gnumake_rules(out, build_dirs, requests, {}, common_vars = COMMON_VARS)
+        content = makefile.get_gnumake_rules(build_dirs, requests, {}, common_vars = COMMON_VARS)
+        self.assertEqual(content, out.getvalue())
+        self.assertIn(
+            "$(OUT_DIR)/pool.res: $(srcdir)/a.txt \\\n\t\t$(srcdir)/b.txt \\\n\t\t$(srcdir)/x/c.txt",
+            content)
+        self.assertIn(
+            "\trm -f $(OUT_DIR)/filter2.txt && cp $(OUT_DIR)/filter.txt $(OUT_DIR)/filter2.txt\n",
+            content)
+        self.assertIn("\tln -sf $(abspath $(OUT_DIR)/a.res) $(OUT_DIR)/c.res\n", content)
+        # Without prerequisites, make runs the recipe only if the file is missing.
+        self.assertIn(
+            "$(TMP_DIR)/filter.txt:   | $(DIRS)\n"
+            "\techo \"$$PRINT_CONTENT\" > $(TMP_DIR)/filter.txt\n\n",
+            content)
+
+    def test_dir_cache(self):
+        dir_cache = {}
+        files = [InFile("a.txt"), LocalFile("$SRC/x", "b.txt"), LocalFile("$SRC/y", "c.txt")]
+        for _ in range(2):
+            self.assertEqual(
+                "$(srcdir)/a.txt $(srcdir)/x/b.txt $(srcdir)/y/c.txt",
+                makefile.files_to_makefile(files, COMMON_VARS, dir_cache = dir_cache))
+        self.assertEqual(3, len(dir_cache))
+
+    def test_static_pattern_rule(self):
+        request = RepeatedExecutionRequest(
+            name = "res",
+            input_files = [InFile("locales/af.txt"), InFile("locales/es.txt")],
+            output_files = [OutFile("af.res"), OutFile("es.res")],
+            tool = IcuTool("genrb"),
+            args = "-s {IN_DIR}/locales -d {OUT_DIR} {INPUT_FILE} {OUTPUT_FILE} {NAME}",
+            format_with = {},
+            repeat_with = {
+                "NAME": ["af", "es"]
+            }
+        )
+        content = makefile.get_gnumake_rules([], [request], {}, common_vars = COMMON_VARS)
+        self.assertIn(
+            "$(RES_OUTPUTS): $(OUT_DIR)/%.res: $(srcdir)/locales/%.txt  | $(DIRS)\n"
+            "\t$(INVOKE) $(TOOLBINDIR)/genrb -s $(srcdir)/locales -d $(OUT_DIR) locales/$*.txt $*.res $*\n",
+            content)
+
+        # The iterations differ by more than the stem
+        request.repeat_with["NAME"] = ["x", "y"]
+        content = makefile.get_gnumake_rules([], [request], {}, common_vars = COMMON_VARS)
+        self.assertNotIn("RES_OUTPUTS", content)
+        self.assertIn("$(OUT_DIR)/es.res: $(srcdir)/locales/es.txt", content)
+
+    def test_string_vars_file(self):
+        requests = flat_sample_requests(COMMON_VARS)
+        content = makefile.get_gnumake_rules(
+            [], requests, {}, common_vars = COMMON_VARS, string_vars = "file")
+        self.assertIn("define PRINT_CONTENT\n+/\nendef\n\n", content)
+        self.assertNotIn("export", content)
+        self.assertIn(
+            "$(TMP_DIR)/filter.txt:   | $(DIRS)\n"
+            "\t$(file >$(TMP_DIR)/filter.txt,$(PRINT_CONTENT))\n\n",
+            content)
+
+    def test_content_dir(self):
+        content_dir = tempfile.mkdtemp()
+        try:
+            requests = flat_sample_requests(COMMON_VARS) + [
+                PrintFileRequest(
+                    name = "index",
+                    output_file = TmpFile("index.txt"),
+                    content = "$(INDEX_NAME)"
+                )
+            ]
+            content = makefile.get_gnumake_rules(
+                [], requests, {}, common_vars = COMMON_VARS, content_dir = content_dir)
+            content_path = os.path.join(content_dir, "print.txt")
+            with open(content_path) as f:
+                self.assertEqual("+/\n", f.read())
+            self.assertIn(
+                "$(TMP_DIR)/filter.txt:  %s | $(DIRS)\n"
+                "\tcp %s $(TMP_DIR)/filter.txt\n\n" % (content_path, content_path),
+                content)
+            self.assertNotIn("PRINT_CONTENT", content)
+            # Content that refers to Makefile variables stays in the Makefile.
+            self.assertFalse(os.path.exists(os.path.join(content_dir, "index.txt")))
+            self.assertIn("define INDEX_CONTENT\n$(INDEX_NAME)\nendef\nexport INDEX_CONTENT\n", content)
+        finally:
+            shutil.rmtree(content_dir)
+
+    @unittest.skipIf(not shutil.which("make"), "needs GNU make")
+    def test_print_file_content(self):
+        # Unlike echo in some shells, $(file) and content_dir write
+        # backslashes as they are.
+        request = PrintFileRequest(
+            name = "print",
+            output_file = TmpFile("filter.txt"),
+            content = "a\\nb \\u0041"
+        )
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            for kwargs in ({"string_vars": "file"}, {"content_dir": os.path.join(tmp_dir, "content")}):
+                makefile_path = os.path.join(tmp_dir, "Makefile")
+                with open(makefile_path, "w") as out:
+                    makefile.write_gnumake_rules(
+                        out, ["{TMP_DIR}"], [request], {}, common_vars = COMMON_VARS, **kwargs)
+                out_dir = os.path.join(tmp_dir, "out")
+                subprocess.check_call([
+                    "make", "-s", "-f", makefile_path,
+                    "TMP_DIR=%s" % out_dir,
+                    "MKINSTALLDIRS=mkdir -p",
+                    "%s/filter.txt" % out_dir,
+                ])
+                with open(os.path.join(out_dir, "filter.txt")) as f:
+                    self.assertEqual("a\\nb \\u0041\n", f.read(), kwargs)
+                shutil.rmtree(out_dir)
+        finally:
+            shutil.rmtree(tmp_dir)
+
+
+# Export the test for the runner
+suite = unittest.makeSuite(MakefileTest)
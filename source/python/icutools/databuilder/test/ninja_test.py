@@ -0,0 +1,128 @@
+# Copyright (C) 2018 and later: Unicode, Inc. and others.
+# License & terms of use: http://www.unicode.org/copyright.html
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from .. import *
+from .. import utils
+from ..request_types import *
+from ..renderers import ninja
+from .fixtures import TestConfig, TestIO, flat_sample_requests
+
+
+class NinjaTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.common_vars = {
+            "SRC_DIR": "/src",
+            "IN_DIR": "/src",
+            "OUT_DIR": "/out",
+            "TMP_DIR": self.tmp_dir,
+        }
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def _get_rules(self, requests, **kwargs):
+        return ninja.get_ninja_rules([], requests, self.common_vars, "bin", **kwargs)
+
+    def test_rules(self):
+        content = self._get_rules(flat_sample_requests(self.common_vars))
+        self.assertIn(
+            "rule genrb\n"
+            "  command = bin/genrb $args\n"
+            "  description = GENRB $name\n",
+            content)
+        self.assertIn("rule copy\n  command = rm -f $out && cp $in $out\n", content)
+        self.assertIn("rule symlink\n  command = ln -sf $target $out\n", content)
+
+    def test_print_file(self):
+        content = self._get_rules(flat_sample_requests(self.common_vars))
+        content_path = os.path.join(self.tmp_dir, "ninja_content", "print.txt")
+        self.assertIn(
+            "build %s/filter.txt: print_file %s\n" % (self.tmp_dir, content_path),
+            content)
+        with open(content_path) as f:
+            self.assertEqual("+/", f.read())
+
+    def test_copy(self):
+        content = self._get_rules(flat_sample_requests(self.common_vars))
+        self.assertIn("build /out/filter2.txt: copy /out/filter.txt\n\n", content)
+        self.assertIn(
+            "build /out/c.res: symlink /out/a.res\n"
+            "  target = /out/a.res\n",
+            content)
+        content = self._get_rules(
+            flat_sample_requests(self.common_vars), copy_strategy = "hardlink")
+        self.assertIn(
+            "rule copy\n  command = rm -f $out && ln $in $out 2>/dev/null || cp $in $out\n",
+            content)
+
+    def test_execution(self):
+        content = self._get_rules(flat_sample_requests(self.common_vars))
+        self.assertIn(
+            "build /out/pool.res: genrb /src/a.txt /src/b.txt /src/x/c.txt\n"
+            "  name = pool\n"
+            "  args = a.txt b.txt\n\n",
+            content)
+        self.assertIn(
+            "build /out/b.res: genrb %s/filter.txt /out/pool.res /src/b.txt\n"
+            "  name = res b.txt\n"
+            "  args = -s /src '{x}' b.txt\n\n" % self.tmp_dir,
+            content)
+        self.assertIn("build all: phony /out/a.res /out/b.res\n", content)
+        self.assertNotIn("pool = heavy", content)
+
+    def test_sharded(self):
+        stems = ["root", "af", "de", "en", "fr"]
+        sizes = {"locales/%s.txt" % stem: size for stem, size in zip(stems, [1, 8, 4, 4, 1])}
+        request = RepeatedOrSingleExecutionRequest(
+            name = "locales_res",
+            category = "locales_tree",
+            dep_targets = [],
+            input_files = [InFile("locales/%s.txt" % stem) for stem in stems],
+            output_files = [OutFile("%s.res" % stem) for stem in stems],
+            tool = IcuTool("gendict"),
+            args = "-k {INPUT_BASENAME}",
+            format_with = {},
+            repeat_with = {
+                "INPUT_BASENAME": utils.SpaceSeparatedList("%s.txt" % stem for stem in stems)
+            }
+        )
+        requests = utils.flatten_requests(
+            [request], TestConfig(io = TestIO(sizes = sizes), num_shards = 2), self.common_vars)
+        content = self._get_rules(requests)
+        self.assertIn(
+            "build /out/root.res /out/af.res: gendict /src/locales/root.txt /src/locales/af.txt\n"
+            "  name = locales_res_0\n"
+            "  args = -k root.txt af.txt\n"
+            "  pool = heavy\n",
+            content)
+        self.assertIn(
+            "build /out/de.res /out/en.res /out/fr.res: gendict"
+            " /src/locales/de.txt /src/locales/en.txt /src/locales/fr.txt\n"
+            "  name = locales_res_1\n"
+            "  args = -k de.txt en.txt fr.txt\n"
+            "  pool = heavy\n",
+            content)
+
+    def test_escape(self):
+        request = SingleExecutionRequest(
+            name = "escape",
+            input_files = [LocalFile("/a b", "c:d.txt")],
+            output_files = [OutFile("e.res")],
+            tool = IcuTool("genrb"),
+            args = "$X",
+            format_with = {}
+        )
+        content = self._get_rules([request])
+        self.assertIn("build /out/e.res: genrb /a$ b/c$:d.txt\n", content)
+        self.assertIn("  args = $$X\n", content)
+
+
+# Export the test for the runner
+suite = unittest.makeSuite(NinjaTest)
@@ -0,0 +1,88 @@
+# Copyright (C) 2018 and later: Unicode, Inc. and others.
+# License & terms of use: http://www.unicode.org/copyright.html
+
+import argparse
+import os
+import shutil
+import tempfile
+import unittest
+
+from ..__main__ import PLANNING_ARGS, get_plan_key
+from ..planning import IO
+
+
+class PlanningCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.src_dir = tempfile.mkdtemp()
+        os.mkdir(os.path.join(self.src_dir, "locales"))
+        self._write("locales/LOCALE_DEPS.json", '{"aliases": {}}')
+        self._write("locales/en.txt", "en{}")
+        self._write("BUILDRULES.py", "")
+
+    def tearDown(self):
+        shutil.rmtree(self.src_dir)
+
+    def _write(self, filename, content):
+        with open(os.path.join(self.src_dir, filename), "w") as f:
+            f.write(content)
+
+    def test_dependencies(self):
+        io = IO(self.src_dir)
+        self.assertEqual(["locales/en.txt"], io.glob("locales/*.txt"))
+        self.assertEqual({"aliases": {}}, io.read_locale_deps("locales"))
+        io.file_size("locales/en.txt")
+        dependencies = io.dependencies
+        self.assertEqual(3, len(dependencies))
+        self.assertTrue(IO(self.src_dir).dependencies_unchanged(dependencies))
+
+        self._write("locales/de.txt", "de{}")
+        self.assertFalse(IO(self.src_dir).dependencies_unchanged(dependencies))
+        os.remove(os.path.join(self.src_dir, "locales/de.txt"))
+        self._write("locales/en.txt", "en{x{}}")
+        self.assertFalse(IO(self.src_dir).dependencies_unchanged(dependencies))
+        self._write("locales/en.txt", "en{}")
+        self._write("locales/LOCALE_DEPS.json", '{"aliases": {"x": "y"}}')
+        self.assertFalse(IO(self.src_dir).dependencies_unchanged(dependencies))
+
+    def test_resource_keys(self):
+        io = IO(self.src_dir)
+        self.assertEqual([], io.read_resource_keys("locales/en.txt"))
+        dependencies = io.dependencies
+        self.assertTrue(IO(self.src_dir).dependencies_unchanged(dependencies))
+        self._write("locales/en.txt", "en{x{}}")
+        self.assertFalse(IO(self.src_dir).dependencies_unchanged(dependencies))
+
+    def test_parsed_cache(self):
+        self._write("locales/en.txt", "en{a{}}")
+        self.assertEqual(["a"], IO(self.src_dir).read_resource_keys("locales/en.txt"))
+        self.assertEqual({"aliases": {}}, IO(self.src_dir).read_locale_deps("locales"))
+        self._write("locales/LOCALE_DEPS.json", '{"aliases": {"x": 1}}')
+        self.assertEqual({"aliases": {"x": 1}}, IO(self.src_dir).read_locale_deps("locales"))
+        # The same size, but a different modification time
+        self._write("locales/en.txt", "en{b{}}")
+        os.utime(os.path.join(self.src_dir, "locales/en.txt"), (1000, 1000))
+        self._write("locales/LOCALE_DEPS.json", '{"aliases": {"x": 2}}')
+        os.utime(os.path.join(self.src_dir, "locales/LOCALE_DEPS.json"), (1000, 1000))
+        io = IO(self.src_dir)
+        self.assertEqual(["b"], io.read_resource_keys("locales/en.txt"))
+        self.assertEqual({"aliases": {"x": 2}}, io.read_locale_deps("locales"))
+        # An IO object checks each file once, on its first read.
+        self._write("locales/LOCALE_DEPS.json", '{"aliases": {}}')
+        self.assertEqual({"aliases": {"x": 2}}, io.read_locale_deps("locales"))
+        self.assertEqual({"aliases": {}}, IO(self.src_dir).read_locale_deps("locales"))
+
+    def test_plan_key(self):
+        args = argparse.Namespace(**dict((attr, None) for attr in PLANNING_ARGS))
+        args.src_dir = self.src_dir
+        key = get_plan_key(args)
+        self.assertEqual(key, get_plan_key(args))
+        args.seqmode = "parallel"
+        self.assertNotEqual(key, get_plan_key(args))
+        args.seqmode = None
+        self._write("BUILDRULES.py", "# changed")
+        self.assertNotEqual(key, get_plan_key(args))
+
+
+# Export the test for the runner
+suite = unittest.makeSuite(PlanningCacheTest)
@@ -0,0 +1,122 @@
+# Copyright (C) 2018 and later: Unicode, Inc. and others.
+# License & terms of use: http://www.unicode.org/copyright.html
+
+import unittest
+
+from .. import *
+from .. import utils
+from ..request_graph import RequestGraph
+from ..request_types import *
+from .fixtures import TestConfig, TestIO
+
+
+class RequestTypesTest(unittest.TestCase):
+
+    def test_shard_indices(self):
+        self.assertEqual([[0], [1, 2, 3]], utils.shard_indices([6, 1, 2, 3], 2))
+        self.assertEqual([[0], [1]], utils.shard_indices([1, 1], 5))
+        self.assertEqual([], utils.shard_indices([], 3))
+
+    def test_request_graph(self):
+        requests = [
+            SingleExecutionRequest(
+                name = "b",
+                category = "test",
+                dep_targets = [],
+                input_files = [TmpFile("a.txt")],
+                output_files = [OutFile("b.res")],
+                tool = IcuTool("genrb"),
+                args = "",
+                format_with = {}
+            ),
+            PrintFileRequest(
+                name = "a",
+                output_file = TmpFile("a.txt"),
+                content = "a"
+            ),
+            CopyRequest(
+                name = "c",
+                input_file = OutFile("a.txt"),
+                output_file = OutFile("c.txt")
+            ),
+        ]
+        graph = RequestGraph(requests)
+        self.assertIs(requests[1], graph.find("a"))
+        self.assertIsNone(graph.find("d"))
+        # OutFile("a.txt") is not produced by anything; TmpFile("a.txt") is.
+        self.assertIs(requests[1], graph.producer(TmpFile("a.txt")))
+        self.assertIsNone(graph.producer(OutFile("a.txt")))
+        self.assertEqual([[1], [], []], graph.dependency_indices())
+        self.assertEqual([requests[0]], graph.dependents(requests[1]))
+        self.assertEqual([1, 0, 2], graph.topological_order())
+        self.assertEqual(
+            [OutFile("b.res"), OutFile("c.txt")],
+            sorted(graph.get_all_output_files()))
+
+    def test_sharded_flatten(self):
+        stems = ["root", "af", "de", "en", "fr"]
+        sizes = {"locales/%s.txt" % stem: size for stem, size in zip(stems, [1, 8, 4, 4, 1])}
+        request = RepeatedOrSingleExecutionRequest(
+            name = "locales_res",
+            category = "locales_tree",
+            dep_targets = [OutFile("pool.res"), [TmpFile("filters/%s.txt" % stem) for stem in stems]],
+            input_files = [InFile("locales/%s.txt" % stem) for stem in stems],
+            output_files = [OutFile("%s.res" % stem) for stem in stems],
+            tool = IcuTool("genrb"),
+            args = "-k {INPUT_BASENAME}",
+            format_with = {},
+            repeat_with = {
+                "INPUT_BASENAME": utils.SpaceSeparatedList("%s.txt" % stem for stem in stems)
+            }
+        )
+        requests = request.flatten(TestConfig(io = TestIO(sizes = sizes), num_shards = 2), RequestGraph([request]), {})
+        self.assertEqual(["locales_res_0", "locales_res_1"], [r.name for r in requests])
+        self.assertEqual(
+            [OutFile("root.res"), OutFile("af.res")],
+            requests[0].output_files)
+        self.assertEqual(
+            [OutFile("de.res"), OutFile("en.res"), OutFile("fr.res")],
+            requests[1].output_files)
+        self.assertEqual(
+            [OutFile("pool.res"), TmpFile("filters/de.txt"),
+                TmpFile("filters/en.txt"), TmpFile("filters/fr.txt")],
+            requests[1].common_dep_files)
+        self.assertEqual(
+            "genrb -k de.txt en.txt fr.txt",
+            utils.format_single_request_command(requests[1], "genrb {ARGS}", {}))
+
+    def test_apply_file_filter(self):
+        class StemFilter(object):
+            def match_many(self, files):
+                return [file.filename in ("b.txt", "d.txt") for file in files]
+        request = RepeatedExecutionRequest(
+            name = "res",
+            category = "test",
+            dep_targets = [[TmpFile("a.dep"), TmpFile("b.dep"), TmpFile("c.dep"), TmpFile("d.dep")]],
+            input_files = [InFile("a.txt"), InFile("b.txt"), InFile("c.txt"), InFile("d.txt")],
+            output_files = [OutFile("a.res"), OutFile("b.res"), OutFile("c.res"), OutFile("d.res")],
+            tool = IcuTool("genrb"),
+            args = "{INPUT_FILE} {X} {Y}",
+            format_with = {"X": ["a", "b", "c", "d"]},
+            repeat_with = {"Y": utils.SpaceSeparatedList(["A", "B", "C", "D"])}
+        )
+        self.assertTrue(request.apply_file_filter(StemFilter()))
+        self.assertEqual([InFile("b.txt"), InFile("d.txt")], request.input_files)
+        self.assertEqual([OutFile("b.res"), OutFile("d.res")], request.output_files)
+        self.assertEqual([[TmpFile("b.dep"), TmpFile("d.dep")]], request.dep_targets)
+        self.assertEqual(["b", "d"], request.format_with["X"])
+        self.assertEqual("B D", str(request.repeat_with["Y"]))
+        self.assertEqual(2, len(request.specific_dep_files))
+
+        request.input_files = [InFile("a.txt")]
+        request.output_files = [OutFile("a.res")]
+        request.dep_targets = []
+        request.format_with = {}
+        request.repeat_with = {}
+        request.specific_dep_files = [[]]
+        self.assertFalse(request.apply_file_filter(StemFilter()))
+        self.assertEqual([], request.input_files)
+
+
+# Export the test for the runner
+suite = unittest.makeSuite(RequestTypesTest)
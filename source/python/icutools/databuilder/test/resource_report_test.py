@@ -0,0 +1,128 @@
+# Copyright (C) 2018 and later: Unicode, Inc. and others.
+# License & terms of use: http://www.unicode.org/copyright.html
+
+import json
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+from .. import *
+from ..request_types import *
+from ..renderers import common_exec
+from ..resource_report import ResourceReport, ResourceUsage
+
+
+def _request(name, category, tool):
+    return SingleExecutionRequest(
+        name = name,
+        category = category,
+        input_files = [],
+        output_files = [],
+        tool = IcuTool(tool),
+        args = "",
+        format_with = {}
+    )
+
+
+class ResourceReportTest(unittest.TestCase):
+
+    def setUp(self):
+        self.report = ResourceReport()
+        self.report.add(_request("res_a", "locales", "genrb"), "genrb a", ResourceUsage(
+            wall_time = 1.5, user_time = 1.0, sys_time = 0.25, max_rss = 300))
+        self.report.add(_request("res_b", "locales", "genrb"), "genrb b", ResourceUsage(
+            wall_time = 2.0, user_time = 1.5, sys_time = 0.5, max_rss = 200))
+        # Where the platform does not report CPU time and memory
+        self.report.add(_request("cnv", "conversion_mappings", "makeconv"), "makeconv", ResourceUsage(
+            wall_time = 0.5, user_time = None, sys_time = None, max_rss = None))
+
+    def test_add(self):
+        self.assertEqual({
+            "request": "res_a",
+            "category": "locales",
+            "tool": "genrb",
+            "command": "genrb a",
+            "wall_time": 1.5,
+            "user_time": 1.0,
+            "sys_time": 0.25,
+            "max_rss": 300,
+        }, self.report.commands[0])
+        self.assertEqual(3, len(self.report.commands))
+
+    def test_aggregate(self):
+        self.assertEqual({
+            "genrb": {
+                "count": 2,
+                "wall_time": 3.5,
+                "user_time": 2.5,
+                "sys_time": 0.75,
+                "max_rss": 300,
+            },
+            "makeconv": {
+                "count": 1,
+                "wall_time": 0.5,
+                "user_time": 0.0,
+                "sys_time": 0.0,
+                "max_rss": 0,
+            },
+        }, self.report.aggregate("tool"))
+        self.assertEqual(
+            ["cnv", "res_a", "res_b"],
+            sorted(self.report.aggregate("request").keys()))
+        self.assertEqual(2, self.report.aggregate("category")["locales"]["count"])
+
+    def test_write_json(self):
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            path = os.path.join(tmp_dir, "report.json")
+            self.report.write_json(path)
+            with open(path) as f:
+                json_data = json.load(f)
+        finally:
+            shutil.rmtree(tmp_dir)
+        self.assertEqual(1, json_data["version"])
+        self.assertEqual(self.report.commands, json_data["commands"])
+        for grouping in ResourceReport.GROUPINGS:
+            self.assertEqual(self.report.aggregate(grouping), json_data["by_%s" % grouping])
+
+    def test_format_text(self):
+        lines = self.report.format_text(limit = 1).split("\n")
+        self.assertEqual("Resource usage by tool (top 1 by wall time):", lines[0])
+        self.assertEqual(
+            "  genrb                                 2       3.50       2.50       0.75          300",
+            lines[2])
+        # Only the group with the largest wall time is listed.
+        self.assertEqual("", lines[3])
+        self.assertEqual("Resource usage by category (top 1 by wall time):", lines[4])
+        self.assertEqual(12, len(lines))
+
+
+class CallShellCommandTest(unittest.TestCase):
+
+    @unittest.skipIf(not hasattr(os, "wait4"), "needs os.wait4")
+    def test_rusage(self):
+        # Allocate some memory and use some CPU time in a child process.
+        command_line = "\"%s\" -c \"x = bytearray(20 * 1024 * 1024); sum(range(2000000))\"" % (
+            sys.executable)
+        returncode, usage = common_exec.call_shell_command(command_line, None)
+        self.assertEqual(0, returncode)
+        self.assertGreater(usage.wall_time, 0)
+        self.assertGreater(usage.user_time + usage.sys_time, 0)
+        self.assertGreater(usage.max_rss, 20 * 1024)
+
+    @unittest.skipIf(os.name != "posix", "needs a POSIX shell")
+    def test_returncode(self):
+        with tempfile.TemporaryFile() as output:
+            returncode, _ = common_exec.call_shell_command("echo out; exit 3", output)
+            output.seek(0)
+            self.assertEqual(b"out\n", output.read())
+        self.assertEqual(3, returncode)
+
+
+# Export the test for the runner
+suite = unittest.TestSuite([
+    unittest.makeSuite(ResourceReportTest),
+    unittest.makeSuite(CallShellCommandTest),
+])
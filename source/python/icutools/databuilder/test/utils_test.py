@@ -0,0 +1,34 @@
+# Copyright (C) 2018 and later: Unicode, Inc. and others.
+# License & terms of use: http://www.unicode.org/copyright.html
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from .. import utils
+
+
+class UtilsTest(unittest.TestCase):
+
+    def test_write_file_if_changed(self):
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            path = os.path.join(tmp_dir, "filter.txt")
+            self.assertTrue(utils.write_file_if_changed(path, "+/\n"))
+            os.utime(path, (1000, 1000))
+
+            # The same content keeps the modification time.
+            self.assertFalse(utils.write_file_if_changed(path, "+/\n"))
+            self.assertEqual(1000, os.path.getmtime(path))
+
+            self.assertTrue(utils.write_file_if_changed(path, "-/\n"))
+            self.assertNotEqual(1000, os.path.getmtime(path))
+            with open(path) as f:
+                self.assertEqual("-/\n", f.read())
+        finally:
+            shutil.rmtree(tmp_dir)
+
+
+# Export the test for the runner
+suite = unittest.makeSuite(UtilsTest)
@@ -0,0 +1,76 @@
+# Copyright (C) 2018 and later: Unicode, Inc. and others.
+# License & terms of use: http://www.unicode.org/copyright.html
+
+# Python 2/3 Compatibility (ICU-20299)
+# TODO(ICU-20301): Remove this.
+from __future__ import print_function
+
+from contextlib import contextmanager
+import json
+import os
+import threading
+import time
+
+
+class Tracer(object):
+    """
+    Records events in the Chrome trace event format, which can be opened in
+    Perfetto (ui.perfetto.dev) or chrome://tracing.
+
+    If the tracer is not enabled, all methods are no-ops.
+    """
+
+    def __init__(self, enabled):
+        self.enabled = enabled
+        self.events = []
+        self._start = time.time()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.set_thread_name(0, "main")
+
+    def set_thread_name(self, tid, name):
+        """Assigns the calling thread to the track with the given id."""
+        self._local.tid = tid
+        self._add_event({
+            "name": "thread_name",
+            "ph": "M",
+            "pid": os.getpid(),
+            "tid": tid,
+            "args": {"name": name}
+        })
+
+    @contextmanager
+    def span(self, name, category, args=None):
+        """Records a complete event around the body of the with statement."""
+        start = self._now()
+        try:
+            yield
+        finally:
+            self._add_event({
+                "name": name,
+                "cat": category,
+                "ph": "X",
+                "ts": start,
+                "dur": self._now() - start,
+                "pid": os.getpid(),
+                "tid": getattr(self._local, "tid", 0),
+                "args": args or {}
+            })
+
+    def write(self, path):
+        if not self.enabled:
+            return
+        with open(path, "w") as f:
+            json.dump({
+                "traceEvents": self.events,
+                "displayTimeUnit": "ms"
+            }, f)
+
+    def _now(self):
+        return int((time.time() - self._start) * 1e6)
+
+    def _add_event(self, event):
+        if not self.enabled:
+            return
+        with self._lock:
+            self.events.append(event)
@@ -5,9 +5,12 @@
 # TODO(ICU-20301): Remove this.
 from __future__ import print_function
 
+import heapq
+import io
 import sys
 
 from . import *
+from .request_graph import RequestGraph
 
 
 def dir_for(file):
@@ -106,27 +109,34 @@ def format_repeated_request_command(request, cmd_template, loop_vars, common_var
     )
 
 
+def shard_indices(sizes, num_shards):
+    """
+    Partitions range(len(sizes)) into at most num_shards lists of indices,
+    balancing the sum of sizes in each list. Indices within a list are
+    sorted, and empty lists are omitted.
+    """
+    shards = [[] for _ in range(min(num_shards, len(sizes)))]
+    if not shards:
+        return []
+    # Greedy: assign the largest remaining item to the smallest shard.
+    heap = [(0, shard_id) for shard_id in range(len(shards))]
+    for i in sorted(range(len(sizes)), key=lambda i: (-sizes[i], i)):
+        total, shard_id = heapq.heappop(heap)
+        shards[shard_id].append(i)
+        heapq.heappush(heap, (total + sizes[i], shard_id))
+    return [sorted(shard) for shard in shards]
+
+
 def flatten_requests(requests, config, common_vars):
+    graph = RequestGraph(requests)
     result = []
     for request in requests:
-        result += request.flatten(config, requests, common_vars)
+        result += request.flatten(config, graph, common_vars)
     return result
 
 
 def get_all_output_files(requests, include_tmp=False):
-    files = []
-    for request in requests:
-        files += request.all_output_files()
-
-    # Filter out all files but those in OUT_DIR if necessary.
-    # It is also easy to filter for uniqueness; do it right now and return.
-    if not include_tmp:
-        files = (file for file in files if isinstance(file, OutFile))
-        return list(set(files))
-
-    # Filter for unique values.  NOTE: Cannot use set() because we need to accept same filename as
-    # OutFile and TmpFile as different, and by default they evaluate as equal.
-    return [f for _, f in set((type(f), f) for f in files)]
+    return RequestGraph(requests).get_all_output_files(include_tmp)
 
 
 def compute_directories(requests):
@@ -137,6 +147,23 @@ def compute_directories(requests):
     return list(sorted(dirs))
 
 
+def write_file_if_changed(path, content):
+    """
+    Writes content to the file at path, unless the file already has that
+    content, so that its mtime only changes if its content changes.
+    Returns True if the file was written.
+    """
+    try:
+        with io.open(path, "r", encoding="utf-8") as f:
+            if f.read() == content:
+                return False
+    except (IOError, OSError, UnicodeDecodeError):
+        pass
+    with io.open(path, "w", encoding="utf-8") as f:
+        f.write(content)
+    return True
+
+
 class SpaceSeparatedList(list):
     """A list that joins itself with spaces when converted to a string."""
     def __str__(self):